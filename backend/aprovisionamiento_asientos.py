@@ -0,0 +1,141 @@
+"""
+Aprovisionamiento de la disposición de asientos de los vuelos.
+
+La configuración de cabina (CONFIGURACION_CABINA) fija la capacidad por clase
+de cada vuelo; por defecto es la de las columnas de instancias_vuelo y se
+ajusta con CABINA_PRIMERA, CABINA_EJECUTIVA y CABINA_ECONOMICA. A partir de
+ella se genera la disposición completa: primera, ejecutiva y económica en
+bloques de filas contiguos, cada clase desde una fila nueva y seis letras por
+fila. Se insertan en bloque los asientos de la disposición que falten; nunca
+se borran asientos, así que las posiciones del inventario por instancia se
+mantienen estables.
+
+Es idempotente (ON CONFLICT DO NOTHING sobre (vuelo_id, numero_asiento)) y se
+ejecuta al confirmar vuelos o instancias nuevas, tras cada pasada del
+materializador y como tarea programada propia cada
+APROVISIONAMIENTO_INTERVALO_SEGUNDOS (vuelos creados fuera del ORM).
+"""
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, insert_ignorando_duplicados
+from models import Vuelo, InstanciaVuelo, Asiento
+from inventario_asientos import invalidar_disposiciones
+
+INTERVALO_SEGUNDOS = int(os.getenv("APROVISIONAMIENTO_INTERVALO_SEGUNDOS", str(6 * 3600)))
+LETRAS = ["A", "B", "C", "D", "E", "F"]
+ORDEN_CLASES = ["PRIMERA", "EJECUTIVA", "ECONOMICA"]
+
+_columnas = InstanciaVuelo.__table__.c
+CONFIGURACION_CABINA = {
+    "PRIMERA": int(os.getenv("CABINA_PRIMERA", str(_columnas.asientos_disponibles_primera.default.arg))),
+    "EJECUTIVA": int(os.getenv("CABINA_EJECUTIVA", str(_columnas.asientos_disponibles_ejecutiva.default.arg))),
+    "ECONOMICA": int(os.getenv("CABINA_ECONOMICA", str(_columnas.asientos_disponibles_economica.default.arg))),
+}
+
+_lock = threading.Lock()
+
+
+def disposicion_cabina(configuracion: Dict[str, int] = CONFIGURACION_CABINA) -> List[Tuple[str, str]]:
+    """(numero_asiento, clase) de la cabina, cada clase en su bloque de filas"""
+    asientos = []
+    fila = 1
+    for clase in ORDEN_CLASES:
+        cantidad = configuracion.get(clase, 0)
+        while cantidad > 0:
+            asientos.extend((f"{fila}{letra}", clase) for letra in LETRAS[:cantidad])
+            cantidad -= len(LETRAS)
+            fila += 1
+    return asientos
+
+
+def aprovisionar_asientos(db: Session, vuelo_ids: Optional[Iterable[int]] = None) -> int:
+    """Crear los asientos que faltan según la configuración de cabina; devuelve los creados"""
+    disposicion = disposicion_cabina()
+    with _lock:
+        consulta = db.query(Vuelo.id, func.count(Asiento.id)).outerjoin(
+            Asiento, Asiento.vuelo_id == Vuelo.id
+        )
+        if vuelo_ids is not None:
+            consulta = consulta.filter(Vuelo.id.in_(list(vuelo_ids)))
+        # Solo se miran en detalle los vuelos con menos asientos que la cabina
+        incompletos = [
+            vuelo_id for vuelo_id, cantidad in consulta.group_by(Vuelo.id).all() if cantidad < len(disposicion)
+        ]
+        if not incompletos:
+            return 0
+
+        existentes: Dict[int, set] = {vuelo_id: set() for vuelo_id in incompletos}
+        for vuelo_id, numero in db.query(Asiento.vuelo_id, Asiento.numero_asiento).filter(
+            Asiento.vuelo_id.in_(incompletos)
+        ).all():
+            existentes[vuelo_id].add(numero)
+
+        filas_nuevas = [
+            {"vuelo_id": vuelo_id, "numero_asiento": numero, "clase": clase, "disponible": True}
+            for vuelo_id, numeros in existentes.items()
+            for numero, clase in disposicion
+            if numero not in numeros
+        ]
+        if not filas_nuevas:
+            return 0
+
+        stmt = insert_ignorando_duplicados(
+            db, Asiento.__table__, ["vuelo_id", "numero_asiento"]
+        ).returning(Asiento.__table__.c.id)
+        creados = len(db.execute(stmt, filas_nuevas).all())
+        db.commit()
+
+    # Las inserciones en bloque no pasan por los eventos del ORM
+    invalidar_disposiciones(incompletos)
+    print(f"💺 Aprovisionamiento: {creados} asientos creados en {len(incompletos)} vuelos")
+    return creados
+
+
+def ejecutar_aprovisionamiento(vuelo_ids: Optional[Iterable[int]] = None) -> int:
+    """Ejecución en segundo plano con su propia sesión"""
+    db = SessionLocal()
+    try:
+        return aprovisionar_asientos(db, vuelo_ids)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def _aprovisionar_en_segundo_plano(vuelo_ids):
+    try:
+        ejecutar_aprovisionamiento(vuelo_ids)
+    except Exception as e:
+        print(f"❌ Error aprovisionando asientos de los vuelos {sorted(vuelo_ids)}: {e}")
+
+
+# ---------------------------------------------------------------------------
+# Vuelos o instancias nuevas confirmadas a través del ORM
+# ---------------------------------------------------------------------------
+
+@event.listens_for(Session, "after_flush")
+def _registrar_nuevos(session, flush_context):
+    nuevos = session.info.setdefault("aprovisionamiento_vuelos", set())
+    for obj in session.new:
+        if isinstance(obj, Vuelo) and obj.id is not None:
+            nuevos.add(obj.id)
+        elif isinstance(obj, InstanciaVuelo) and obj.vuelo_id is not None:
+            nuevos.add(obj.vuelo_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _aplicar_nuevos(session):
+    nuevos = session.info.pop("aprovisionamiento_vuelos", None)
+    if nuevos:
+        threading.Thread(target=_aprovisionar_en_segundo_plano, args=(nuevos,), daemon=True).start()
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_nuevos(session):
+    session.info.pop("aprovisionamiento_vuelos", None)
@@ -0,0 +1,164 @@
+"""
+Asignación automática de asientos para grupos.
+
+Trabaja sobre la disposición en memoria del vuelo (filas y letras, como el
+mapa de asientos) y el mapa de bits de ocupación de la instancia, sin
+consultas. Para un grupo de N pasajeros de una clase busca, en este orden:
+
+1. N asientos contiguos de una fila sin cruzar el pasillo.
+2. N asientos contiguos de una fila cruzando el pasillo.
+3. N asientos libres de una misma fila.
+4. El menor bloque de filas consecutivas con N asientos libres, de adelante
+   hacia atrás.
+
+Cada fila se representa como una máscara de bits por letra, así que revisar
+una cabina de 300 asientos son unas pocas operaciones por fila.
+"""
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from inventario_asientos import DisposicionAsientos
+
+# Letra después de la cual está el pasillo (cabina 3-3, ver aprovisionamiento_asientos)
+PASILLO_DESPUES_DE = {"C"}
+
+
+class _FilasClase:
+    """Filas de una clase: letras y posiciones de bit de cada asiento"""
+    __slots__ = ("filas", "desplazamientos", "corridas_bloque", "corridas_fila")
+
+    def __init__(self, filas: List[Tuple[int, List[Tuple[str, int]]]]):
+        self.filas = filas  # (numero_fila, [(letra, posicion)] ordenadas por letra)
+        # Primer bit de cada fila si sus asientos ocupan bits consecutivos (lo habitual), o None
+        self.desplazamientos = [
+            letras[0][1] if [p for _, p in letras] == list(range(letras[0][1], letras[0][1] + len(letras))) else None
+            for _, letras in filas
+        ]
+        self.corridas_bloque: Dict[Tuple[int, int], List[int]] = {}
+        self.corridas_fila: Dict[Tuple[int, int], List[int]] = {}
+
+    def corridas(self, indice: int, cantidad: int, cruzar_pasillo: bool) -> List[int]:
+        """Máscaras de `cantidad` letras contiguas de la fila (por índice de letra)"""
+        cache = self.corridas_fila if cruzar_pasillo else self.corridas_bloque
+        letras = self.filas[indice][1]
+        clave = (len(letras), cantidad) if cruzar_pasillo else (indice, cantidad)
+        mascaras = cache.get(clave)
+        if mascaras is None:
+            mascaras = []
+            for inicio in range(len(letras) - cantidad + 1):
+                tramo = letras[inicio:inicio + cantidad]
+                if not cruzar_pasillo and any(letra in PASILLO_DESPUES_DE for letra, _ in tramo[:-1]):
+                    continue
+                mascaras.append(((1 << cantidad) - 1) << inicio)
+            cache[clave] = mascaras
+        return mascaras
+
+
+_filas: Dict[Tuple[int, str], Tuple[DisposicionAsientos, _FilasClase]] = {}
+_lock = threading.Lock()
+
+
+def _separar(numero: str) -> Tuple[int, str]:
+    digitos = "".join(c for c in numero if c.isdigit())
+    letras = "".join(c for c in numero if not c.isdigit())
+    return int(digitos or 0), letras
+
+
+def filas_de_clase(disp: DisposicionAsientos, clase: str) -> _FilasClase:
+    """Filas de la clase en la disposición (se calculan una vez por disposición)"""
+    clave = (disp.vuelo_id, clase)
+    with _lock:
+        encontrada = _filas.get(clave)
+    if encontrada is not None and encontrada[0] is disp:
+        return encontrada[1]
+    por_fila: Dict[int, List[Tuple[str, int]]] = {}
+    for posicion, (_, numero, clase_asiento) in enumerate(disp.asientos):
+        if clase_asiento == clase:
+            fila, letra = _separar(numero)
+            por_fila.setdefault(fila, []).append((letra, posicion))
+    nuevas = _FilasClase([(fila, sorted(letras)) for fila, letras in sorted(por_fila.items())])
+    with _lock:
+        _filas[clave] = (disp, nuevas)
+    return nuevas
+
+
+def _libres(letras: List[Tuple[str, int]], desplazamiento: Optional[int], ocupados: int) -> int:
+    if desplazamiento is not None:
+        return ~(ocupados >> desplazamiento) & ((1 << len(letras)) - 1)
+    mascara = 0
+    for i, (_, posicion) in enumerate(letras):
+        if not ocupados >> posicion & 1:
+            mascara |= 1 << i
+    return mascara
+
+
+def _posiciones(letras: List[Tuple[str, int]], mascara: int, cantidad: int) -> List[int]:
+    elegidas = [posicion for i, (_, posicion) in enumerate(letras) if mascara >> i & 1]
+    return elegidas[:cantidad]
+
+
+def asignar_grupo(
+    disp: DisposicionAsientos,
+    ocupados: int,
+    clase: str,
+    cantidad: int,
+    bloqueados: Iterable[str] = ()
+) -> Optional[List[str]]:
+    """
+    Elegir `cantidad` asientos libres de la clase, juntos si es posible.
+    `ocupados` es el mapa de bits de la instancia; `bloqueados` son números de
+    asiento que tampoco se pueden usar (retenidos o ya pedidos). Devuelve los
+    números de asiento o None si no hay suficientes.
+    """
+    if cantidad <= 0:
+        return []
+    for numero in bloqueados:
+        posicion = disp.por_numero.get(numero)
+        if posicion is not None:
+            ocupados |= 1 << posicion
+
+    clase_filas = filas_de_clase(disp, clase)
+    libres = [
+        _libres(letras, desplazamiento, ocupados)
+        for (_, letras), desplazamiento in zip(clase_filas.filas, clase_filas.desplazamientos)
+    ]
+
+    elegidas = None
+    # 1 y 2: contiguos en una fila, primero sin cruzar el pasillo
+    for cruzar_pasillo in (False, True):
+        for indice, libre in enumerate(libres):
+            for mascara in clase_filas.corridas(indice, cantidad, cruzar_pasillo):
+                if libre & mascara == mascara:
+                    elegidas = _posiciones(clase_filas.filas[indice][1], mascara, cantidad)
+                    break
+            if elegidas:
+                break
+        if elegidas:
+            break
+
+    # 3: cualquier combinación dentro de una misma fila
+    if not elegidas:
+        for indice, libre in enumerate(libres):
+            if bin(libre).count("1") >= cantidad:
+                elegidas = _posiciones(clase_filas.filas[indice][1], libre, cantidad)
+                break
+
+    # 4: el bloque de filas consecutivas más corto, de adelante hacia atrás
+    if not elegidas:
+        conteos = [bin(libre).count("1") for libre in libres]
+        mejor = None
+        inicio, suma = 0, 0
+        for fin, conteo in enumerate(conteos):
+            suma += conteo
+            while suma - conteos[inicio] >= cantidad:
+                suma -= conteos[inicio]
+                inicio += 1
+            if suma >= cantidad and (mejor is None or fin - inicio < mejor[1] - mejor[0]):
+                mejor = (inicio, fin)
+        if mejor is None:
+            return None
+        elegidas = []
+        for indice in range(mejor[0], mejor[1] + 1):
+            elegidas += _posiciones(clase_filas.filas[indice][1], libres[indice], cantidad - len(elegidas))
+
+    return [disp.asientos[posicion][1] for posicion in elegidas]
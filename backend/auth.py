@@ -18,6 +18,8 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY", "tu_clave_secreta_super_segura")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+# Emails con permisos de operación (separados por comas); vacío = nadie
+ADMIN_EMAILS = {e.strip().lower() for e in os.getenv("ADMIN_EMAILS", "").split(",") if e.strip()}
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
@@ -75,8 +77,9 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     """Obtener usuario actual desde token"""
+    # Síncrona a propósito: consulta la base de datos y FastAPI la ejecuta en el pool de hilos
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="No se pudieron validar las credenciales",
@@ -101,3 +104,12 @@ async def get_current_active_user(current_user: Usuario = Depends(get_current_us
     if not current_user.activo:
         raise HTTPException(status_code=400, detail="Usuario inactivo")
     return current_user
+
+async def get_current_admin_user(current_user: Usuario = Depends(get_current_active_user)):
+    """Verificar que el usuario tenga permisos de operación (ADMIN_EMAILS)"""
+    if current_user.email.lower() not in ADMIN_EMAILS:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Se requieren permisos de administrador"
+        )
+    return current_user
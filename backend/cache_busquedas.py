@@ -0,0 +1,211 @@
+"""
+Caché de resultados de búsqueda de vuelos.
+
+Las entradas se indexan por la búsqueda normalizada y recuerdan las instancias
+de vuelo que contienen. Cada instancia tiene una marca de inventario que se
+actualiza cuando una transacción confirmada modifica sus asientos (reservas,
+cancelaciones) y cada entrada registra la marca vigente cuando se empezó a
+calcular. Si alguna de sus instancias cambió después, la entrada se descarta.
+Los cambios de horarios o tarifas invalidan todo a través de la versión del
+índice de vuelos.
+
+Una marca solo importa a las entradas que ya invalida y a los resultados que
+se están calculando. Cuando hay más marcas que MAX_ENTRADAS se podan: se
+descartan las entradas vencidas o invalidadas, se olvidan todas las marcas y
+los resultados que empezaron a calcularse antes de la poda ya no se guardan.
+
+Las marcas son locales al proceso; con varios workers, los cambios hechos por
+otro proceso se cubren con un TTL corto (CACHE_BUSQUEDAS_TTL_SEGUNDOS).
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import InstanciaVuelo
+
+MAX_ENTRADAS = int(os.getenv("CACHE_BUSQUEDAS_MAX_ENTRADAS", "2000"))
+MAX_BYTES = int(os.getenv("CACHE_BUSQUEDAS_MAX_BYTES", str(32 * 1024 * 1024)))
+TTL_SEGUNDOS = float(os.getenv("CACHE_BUSQUEDAS_TTL_SEGUNDOS", "30"))
+
+
+class _Entrada:
+    __slots__ = ("resultado", "instancias", "marca", "version_indice", "tamano", "expira")
+
+    def __init__(self, resultado, instancias, marca, version_indice, tamano, expira):
+        self.resultado = resultado
+        self.instancias = instancias
+        self.marca = marca
+        self.version_indice = version_indice
+        self.tamano = tamano
+        self.expira = expira
+
+
+class CacheBusquedas:
+    """Caché LRU limitada por número de entradas y por memoria aproximada"""
+
+    def __init__(self, max_entradas: int = MAX_ENTRADAS, max_bytes: int = MAX_BYTES, ttl: float = TTL_SEGUNDOS):
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entradas: "OrderedDict[Hashable, _Entrada]" = OrderedDict()
+        self._bytes = 0
+        self._secuencia = 0
+        self._marcas_instancia: Dict[int, int] = {}
+        self._marca_sin_instancia = 0
+        self._marca_podada = 0
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsiones = 0
+        self.invalidaciones = 0
+
+    def marca(self) -> int:
+        """Marca actual; tomarla antes de consultar la base de datos"""
+        with self._lock:
+            return self._secuencia
+
+    def _invalidada(self, entrada: _Entrada) -> bool:
+        """Alguna de sus instancias cambió después de calcularla"""
+        if None in entrada.instancias and self._marca_sin_instancia > entrada.marca:
+            return True
+        return any(
+            self._marcas_instancia.get(instancia_id, 0) > entrada.marca
+            for instancia_id in entrada.instancias if instancia_id is not None
+        )
+
+    def _vigente(self, entrada: _Entrada, version_indice: int) -> bool:
+        if entrada.version_indice != version_indice or entrada.expira < time.monotonic():
+            return False
+        return not self._invalidada(entrada)
+
+    def _eliminar(self, clave):
+        entrada = self._entradas.pop(clave)
+        self._bytes -= entrada.tamano
+
+    def _podar_marcas(self):
+        """Olvidar las marcas de instancia cuando superan MAX_ENTRADAS"""
+        # Una poda cada MAX_ENTRADAS marcas: coste amortizado constante
+        if len(self._marcas_instancia) <= self.max_entradas:
+            return
+        ahora = time.monotonic()
+        for clave in [c for c, e in self._entradas.items() if e.expira < ahora or self._invalidada(e)]:
+            self._eliminar(clave)
+            self.invalidaciones += 1
+        # Las entradas que quedan no dependen de ninguna marca
+        self._marcas_instancia.clear()
+        self._marca_podada = self._secuencia
+
+    def obtener(self, clave: Hashable, version_indice: int):
+        """Devolver el resultado guardado si sigue vigente (no debe modificarse)"""
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                self.fallos += 1
+                return None
+            if not self._vigente(entrada, version_indice):
+                self._eliminar(clave)
+                self.invalidaciones += 1
+                self.fallos += 1
+                self._podar_marcas()
+                return None
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return entrada.resultado
+
+    def guardar(self, clave: Hashable, resultado, instancias: Iterable[Optional[int]],
+                marca: int, version_indice: int, tamano: int):
+        """Guardar un resultado calculado a partir de la marca indicada"""
+        if tamano > self.max_bytes:
+            return
+        with self._lock:
+            # Sin las marcas podadas no se sabría si alguna instancia cambió desde `marca`
+            if marca < self._marca_podada:
+                return
+            if clave in self._entradas:
+                self._eliminar(clave)
+            self._entradas[clave] = _Entrada(
+                resultado, frozenset(instancias), marca, version_indice,
+                tamano, time.monotonic() + self.ttl
+            )
+            self._bytes += tamano
+            while len(self._entradas) > self.max_entradas or self._bytes > self.max_bytes:
+                self._eliminar(next(iter(self._entradas)))
+                self.expulsiones += 1
+            self._podar_marcas()
+
+    def invalidar_instancias(self, instancia_ids: Iterable[int]):
+        """Registrar cambios de inventario en las instancias indicadas"""
+        with self._lock:
+            self._secuencia += 1
+            for instancia_id in instancia_ids:
+                self._marcas_instancia[instancia_id] = self._secuencia
+            self._podar_marcas()
+
+    def invalidar_sin_instancia(self):
+        """Registrar que se crearon instancias nuevas (afecta a resultados sin instancia)"""
+        with self._lock:
+            self._secuencia += 1
+            self._marca_sin_instancia = self._secuencia
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+            self._bytes = 0
+            self._marcas_instancia.clear()
+            self._marca_podada = self._secuencia
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                "entradas": len(self._entradas),
+                "bytes_aproximados": self._bytes,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "tasa_aciertos": round(self.aciertos / consultas, 4) if consultas else 0.0,
+                "expulsiones": self.expulsiones,
+                "invalidaciones": self.invalidaciones,
+                "marcas_instancia": len(self._marcas_instancia)
+            }
+
+
+cache_busquedas = CacheBusquedas()
+
+
+# ---------------------------------------------------------------------------
+# Invalidación por cambios de inventario confirmados a través del ORM
+# ---------------------------------------------------------------------------
+
+def marcar_instancia_modificada(session: Session, instancia_id: int):
+    """Para cambios de inventario hechos con UPDATE directos, que no pasan por el ORM"""
+    session.info.setdefault("cache_busquedas_instancias", set()).add(instancia_id)
+
+
+@event.listens_for(Session, "after_flush")
+def _registrar_instancias(session, flush_context):
+    modificadas = session.info.setdefault("cache_busquedas_instancias", set())
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, InstanciaVuelo) and obj.id is not None:
+            modificadas.add(obj.id)
+    if any(isinstance(obj, InstanciaVuelo) for obj in session.new):
+        session.info["cache_busquedas_nuevas"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _aplicar_invalidaciones(session):
+    modificadas = session.info.pop("cache_busquedas_instancias", None)
+    if modificadas:
+        cache_busquedas.invalidar_instancias(modificadas)
+    if session.info.pop("cache_busquedas_nuevas", False):
+        cache_busquedas.invalidar_sin_instancia()
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_invalidaciones(session):
+    session.info.pop("cache_busquedas_instancias", None)
+    session.info.pop("cache_busquedas_nuevas", None)
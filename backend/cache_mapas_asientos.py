@@ -0,0 +1,156 @@
+"""
+Caché de mapas de asientos.
+
+Guarda la respuesta de /vuelos/asientos/{vuelo_id}/{fecha} por instancia y
+filtro de clase, junto con su ETag (instancia, versión del inventario y
+filtro, más la firma de sus asientos retenidos). Las entradas de una
+instancia se descartan en cuanto se confirma una ocupación o liberación de
+asientos en ella (ver inventario_asientos) o cambian sus retenciones.
+
+Como otros procesos también pueden cambiar el inventario, las entradas viven
+como máximo CACHE_MAPAS_TTL_SEGUNDOS; pasado ese tiempo la respuesta se
+recalcula y, si nada cambió, conserva el mismo ETag.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+import zlib
+from typing import Dict, Hashable, Iterable, Optional, Set
+
+from inventario_asientos import al_confirmar_cambios, CambioInventario
+from retenciones_asientos import al_cambiar_retenciones
+
+MAX_ENTRADAS = int(os.getenv("CACHE_MAPAS_MAX_ENTRADAS", "5000"))
+TTL_SEGUNDOS = float(os.getenv("CACHE_MAPAS_TTL_SEGUNDOS", "5"))
+
+
+def calcular_etag(instancia_id: int, version: int, clase: Optional[str], retenidos: Iterable[str] = ()) -> str:
+    """ETag del mapa: versión del inventario más una firma de los asientos retenidos"""
+    firma = zlib.crc32(",".join(sorted(retenidos)).encode())
+    return f'"{instancia_id}-{version}-{firma:x}-{clase or "TODAS"}"'
+
+
+class _Entrada:
+    __slots__ = ("instancia_id", "etag", "respuesta", "expira")
+
+    def __init__(self, instancia_id, etag, respuesta, expira):
+        self.instancia_id = instancia_id
+        self.etag = etag
+        self.respuesta = respuesta
+        self.expira = expira
+
+
+class CacheMapasAsientos:
+    """Caché LRU de mapas de asientos invalidada por cambios de inventario"""
+
+    def __init__(self, max_entradas: int = MAX_ENTRADAS, ttl: float = TTL_SEGUNDOS):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entradas: "OrderedDict[Hashable, _Entrada]" = OrderedDict()
+        self._por_instancia: Dict[int, Set[Hashable]] = {}
+        self._secuencia = 0
+        self._invalidada_en: Dict[int, int] = {}
+        self._marca_podada = 0
+        self.aciertos = 0
+        self.fallos = 0
+        self.no_modificados = 0
+        self.invalidaciones = 0
+
+    def _eliminar(self, clave):
+        entrada = self._entradas.pop(clave)
+        claves = self._por_instancia.get(entrada.instancia_id)
+        if claves is not None:
+            claves.discard(clave)
+            if not claves:
+                del self._por_instancia[entrada.instancia_id]
+
+    def _podar_marcas(self):
+        """Olvidar las marcas de invalidación cuando superan MAX_ENTRADAS"""
+        # Las entradas de una instancia invalidada ya se descartaron: ninguna depende de las marcas
+        if len(self._invalidada_en) <= self.max_entradas:
+            return
+        self._invalidada_en.clear()
+        self._marca_podada = self._secuencia
+
+    def marca(self) -> int:
+        """Marca actual; tomarla antes de leer el inventario"""
+        with self._lock:
+            return self._secuencia
+
+    def obtener(self, vuelo_id: int, fecha: date, clase: Optional[str]) -> Optional[_Entrada]:
+        """Entrada vigente (etag y respuesta, que no debe modificarse) o None"""
+        clave = (vuelo_id, fecha, clase)
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None or entrada.expira < time.monotonic():
+                if entrada is not None:
+                    self._eliminar(clave)
+                self.fallos += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return entrada
+
+    def guardar(self, vuelo_id: int, fecha: date, clase: Optional[str], instancia_id: int,
+                etag: str, respuesta, marca: int):
+        """Guardar una respuesta calculada a partir de la marca indicada"""
+        clave = (vuelo_id, fecha, clase)
+        with self._lock:
+            if self._invalidada_en.get(instancia_id, 0) > marca or marca < self._marca_podada:
+                # El inventario cambió mientras se calculaba la respuesta (o ya no se puede saber)
+                return
+            if clave in self._entradas:
+                self._eliminar(clave)
+            self._entradas[clave] = _Entrada(instancia_id, etag, respuesta, time.monotonic() + self.ttl)
+            self._por_instancia.setdefault(instancia_id, set()).add(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._eliminar(next(iter(self._entradas)))
+
+    def registrar_no_modificado(self):
+        with self._lock:
+            self.no_modificados += 1
+
+    def invalidar_instancia(self, instancia_id: int):
+        with self._lock:
+            self._secuencia += 1
+            self._invalidada_en[instancia_id] = self._secuencia
+            for clave in list(self._por_instancia.get(instancia_id, ())):
+                self._eliminar(clave)
+                self.invalidaciones += 1
+            self._podar_marcas()
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+            self._por_instancia.clear()
+            self._invalidada_en.clear()
+            self._marca_podada = self._secuencia
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                "entradas": len(self._entradas),
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "tasa_aciertos": round(self.aciertos / consultas, 4) if consultas else 0.0,
+                "respuestas_304": self.no_modificados,
+                "invalidaciones": self.invalidaciones,
+                "marcas_instancia": len(self._invalidada_en)
+            }
+
+
+cache_mapas_asientos = CacheMapasAsientos()
+
+
+@al_confirmar_cambios
+def _invalidar_por_cambio(cambio: CambioInventario):
+    cache_mapas_asientos.invalidar_instancia(cambio.instancia_id)
+
+
+@al_cambiar_retenciones
+def _invalidar_por_retencion(instancia_id: int):
+    cache_mapas_asientos.invalidar_instancia(instancia_id)
@@ -0,0 +1,69 @@
+"""
+Cancelación de reservas por conjuntos.
+
+cancelar_reservas() cancela todas las reservas que cumplan las condiciones con
+un número fijo de sentencias, sin importar cuántas sean ni cuántos pasajeros
+tengan:
+
+1. UPDATE condicional de reservas a CANCELADA (solo las que no lo estaban,
+   así que una cancelación concurrente no devuelve el inventario dos veces).
+2. devolver_inventario: un UPDATE por (instancia, clase) y una liberación
+   de asientos por instancia.
+3. UPDATE de sus billetes a CANCELADO.
+4. Los asientos devueltos pasan a la lista de espera (promover_lista_espera).
+
+Todo queda en la transacción de la sesión; quien llama confirma.
+"""
+from typing import Dict, Iterable
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from models import Reserva, DetalleReserva, Billete
+from disponibilidad_asientos import devolver_inventario
+from lista_espera import promover_lista_espera
+
+
+def cancelar_reservas(db: Session, *condiciones, instancias_cerradas: Iterable[int] = ()) -> Dict[str, int]:
+    """
+    Cancelar las reservas no canceladas que cumplan `condiciones`; devuelve lo procesado.
+    Los asientos de `instancias_cerradas` no vuelven a la venta.
+    """
+    canceladas = db.execute(
+        update(Reserva).where(
+            Reserva.estado != "CANCELADA",
+            *condiciones
+        ).values(estado="CANCELADA").returning(Reserva.id).execution_options(synchronize_session=False)
+    ).scalars().all()
+    if not canceladas:
+        return {"reservas_canceladas": 0, "asientos_devueltos": 0, "asientos_liberados": 0,
+                "billetes_cancelados": 0, "lista_espera_promovidas": 0}
+
+    devuelto = devolver_inventario(db, canceladas, instancias_cerradas)
+    billetes = db.execute(
+        update(Billete).where(
+            Billete.detalle_reserva_id.in_(
+                select(DetalleReserva.id).where(DetalleReserva.reserva_id.in_(canceladas))
+            ),
+            Billete.estado != "CANCELADO"
+        ).values(estado="CANCELADO").execution_options(synchronize_session=False)
+    ).rowcount
+    promovidas = promover_lista_espera(db)
+
+    return {"reservas_canceladas": len(canceladas), **devuelto, "billetes_cancelados": billetes,
+            "lista_espera_promovidas": promovidas}
+
+
+def cancelar_reservas_de_instancia(db: Session, instancia_id: int, cerrada: bool = True) -> Dict[str, int]:
+    """
+    Cancelar todas las reservas con algún tramo en la instancia (vuelo interrumpido).
+    Los asientos de los demás tramos vuelven a la venta; los de la instancia solo si no
+    está `cerrada`.
+    """
+    return cancelar_reservas(
+        db,
+        Reserva.id.in_(
+            select(DetalleReserva.reserva_id).where(DetalleReserva.instancia_vuelo_id == instancia_id)
+        ),
+        instancias_cerradas=(instancia_id,) if cerrada else ()
+    )
@@ -0,0 +1,155 @@
+"""
+Prueba de carga de la búsqueda de vuelos.
+
+Levanta la aplicación con uvicorn (un solo proceso, un worker) sobre una base
+desechable con --vuelos vuelos en una ruta e instancias para los próximos
+--dias días, y lanza --concurrentes búsquedas a la vez por
+POST /vuelos/buscar/horarios, en varias rondas. Cada búsqueda lleva un
+precio_maximo distinto para que no se resuelva desde la caché: todas pasan
+por el índice de vuelos y la consulta de instancias.
+
+Los endpoints son síncronos: corren en el pool de hilos de la aplicación
+(HILOS_TRABAJO) y get_db admite como mucho CONEXIONES_BD sesiones a la vez
+(database.py). Las búsquedas por encima de ese límite esperan turno en el
+bucle de eventos, sin ocupar hilo ni conexión. El informe muestra el
+rendimiento y la latencia que resultan de ese límite.
+
+    python carga_busquedas.py --concurrentes 500 --rondas 3
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import date, time as hora, timedelta
+
+import httpx
+
+
+def preparar_base(vuelos: int, dias: int):
+    """Ruta UIO-GYE con `vuelos` vuelos diarios e instancias para `dias` días"""
+    from database import Base, SessionLocal, engine
+    from models import Ciudad, Aerolinea, Vuelo, Tarifa
+    from materializador import materializar_instancias
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        origen = Ciudad(nombre="Quito", codigo_iata="UIO", pais="Ecuador")
+        destino = Ciudad(nombre="Guayaquil", codigo_iata="GYE", pais="Ecuador")
+        aerolinea = Aerolinea(nombre="Carga", codigo_iata="CG", activa=True)
+        db.add_all([origen, destino, aerolinea])
+        db.flush()
+        for i in range(vuelos):
+            salida = hora(5 + i * 17 // vuelos, (i * 7) % 60)
+            vuelo = Vuelo(numero_vuelo=f"CG{100 + i}", aerolinea_id=aerolinea.id, ciudad_origen_id=origen.id,
+                          ciudad_destino_id=destino.id, hora_salida=salida, hora_llegada=salida,
+                          duracion_minutos=50, dias_operacion="1111111", activo=True)
+            db.add(vuelo)
+            db.flush()
+            db.add(Tarifa(vuelo_id=vuelo.id, clase="ECONOMICA", precio=80 + i, fecha_inicio=date.today()))
+        # Las búsquedas no necesitan mapa de asientos
+        db.info.pop("aprovisionamiento_vuelos", None)
+        db.commit()
+        materializar_instancias(db, horizonte_dias=dias)
+    finally:
+        db.close()
+    engine.dispose()
+
+
+def _puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _rondas(url: str, concurrentes: int, rondas: int, dias: int):
+    resultados = Counter()
+    latencias = []
+
+    async def buscar(cliente):
+        cuerpo = {
+            "origen": "UIO",
+            "destino": "GYE",
+            "fecha": (date.today() + timedelta(days=random.randrange(dias))).isoformat(),
+            "precio_maximo": round(random.uniform(500, 1000), 4)
+        }
+        inicio = time.perf_counter()
+        try:
+            respuesta = await cliente.post("/vuelos/buscar/horarios", json=cuerpo)
+        except httpx.HTTPError as e:
+            resultados[f"error: {type(e).__name__}"] += 1
+            return
+        latencias.append(time.perf_counter() - inicio)
+        resultados["exitosas" if respuesta.status_code == 200 else f"HTTP {respuesta.status_code}"] += 1
+
+    inicio = time.perf_counter()
+    for _ in range(rondas):
+        # Conexiones nuevas en cada ronda: el servidor cierra las inactivas entre rondas
+        async with httpx.AsyncClient(base_url=url, timeout=120,
+                                     limits=httpx.Limits(max_connections=concurrentes)) as cliente:
+            await asyncio.gather(*(buscar(cliente) for _ in range(concurrentes)))
+    duracion = time.perf_counter() - inicio
+
+    return resultados, latencias, duracion
+
+
+def correr(args) -> bool:
+    with tempfile.TemporaryDirectory() as directorio:
+        os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(directorio, 'carga.db')}"
+        os.environ["MATERIALIZADOR_ACTIVO"] = "false"
+        preparar_base(args.vuelos, args.dias)
+        from database import HILOS_TRABAJO
+
+        puerto = _puerto_libre()
+        servidor = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(puerto),
+             "--workers", "1", "--log-level", "warning", "--no-access-log"],
+            cwd=os.path.dirname(os.path.abspath(__file__)), env=os.environ.copy(),
+            stdout=subprocess.DEVNULL
+        )
+        url = f"http://127.0.0.1:{puerto}"
+        try:
+            for _ in range(100):
+                try:
+                    if httpx.get(f"{url}/health").status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    time.sleep(0.2)
+            else:
+                raise SystemExit("❌ La aplicación no arrancó")
+
+            total = args.concurrentes * args.rondas
+            print(f"🏁 {args.rondas} rondas de {args.concurrentes} búsquedas simultáneas "
+                  f"({args.vuelos} vuelos, {args.dias} días, HILOS_TRABAJO={HILOS_TRABAJO})")
+            resultados, latencias, duracion = asyncio.run(
+                _rondas(url, args.concurrentes, args.rondas, args.dias)
+            )
+        finally:
+            servidor.terminate()
+            servidor.wait()
+
+    latencias.sort()
+    percentil = lambda p: latencias[min(len(latencias) - 1, int(len(latencias) * p))] * 1000 if latencias else 0.0
+    print(f"⏱️  {duracion:.2f}s, {total / duracion:.0f} búsquedas/s, p50 {percentil(0.5):.1f}ms, "
+          f"p99 {percentil(0.99):.1f}ms, máx {percentil(1):.1f}ms")
+    print(f"📊 {dict(resultados)}")
+    correcto = resultados["exitosas"] == total
+    print("✅ Todas las búsquedas atendidas" if correcto else "❌ Búsquedas fallidas")
+    return correcto
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prueba de carga de búsquedas concurrentes")
+    parser.add_argument("--database-url", help="Base de pruebas vacía (por defecto, SQLite temporal)")
+    parser.add_argument("--concurrentes", type=int, default=500)
+    parser.add_argument("--rondas", type=int, default=3)
+    parser.add_argument("--vuelos", type=int, default=40)
+    parser.add_argument("--dias", type=int, default=30)
+    args = parser.parse_args()
+    raise SystemExit(0 if correr(args) else 1)
@@ -0,0 +1,263 @@
+"""
+Difusión en tiempo real de cambios de asientos por instancia de vuelo.
+
+Cada instancia con suscriptores tiene un canal en memoria con su ocupación,
+sus retenciones y la disponibilidad por clase. El canal se carga una sola vez
+de la base de datos y después se actualiza con los cambios confirmados
+(al_confirmar_cambios) y con los cambios de retenciones
+(al_cambiar_retenciones): cada cambio se calcula una vez por canal y se
+entrega a todos sus suscriptores sin más consultas.
+
+Los suscriptores son colas asyncio; la publicación llega desde hilos de
+trabajo y se entrega con call_soon_threadsafe. Un suscriptor que no consume
+sus eventos a tiempo descarta los pendientes y recibe un evento "estado"
+completo. Si cambia la disposición del vuelo el canal se cierra y los
+clientes deben volver a suscribirse. Los cambios hechos por otros procesos
+no se difunden.
+"""
+import asyncio
+import os
+import threading
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy.orm import Session
+
+from models import InstanciaVuelo
+from inventario_asientos import (
+    al_confirmar_cambios, estado_inventario, CambioInventario, DisposicionAsientos
+)
+from retenciones_asientos import al_cambiar_retenciones, retenciones
+
+MAX_EVENTOS_PENDIENTES = int(os.getenv("DIFUSION_MAX_EVENTOS_PENDIENTES", "256"))
+LATIDO_SEGUNDOS = float(os.getenv("DIFUSION_LATIDO_SEGUNDOS", "15"))
+
+CLASES = ["PRIMERA", "EJECUTIVA", "ECONOMICA"]
+
+
+class Suscriptor:
+    """Cola de eventos de un cliente conectado"""
+
+    def __init__(self, canal: "CanalAsientos", loop: asyncio.AbstractEventLoop):
+        self.canal = canal
+        self.loop = loop
+        self.cola: asyncio.Queue = asyncio.Queue(maxsize=MAX_EVENTOS_PENDIENTES)
+        self.desbordado = False
+
+    def _encolar(self, evento: dict):
+        # Se ejecuta en el loop del suscriptor
+        if evento["tipo"] == "cerrar":
+            while not self.cola.empty():
+                self.cola.get_nowait()
+        elif self.desbordado:
+            return
+        try:
+            self.cola.put_nowait(evento)
+        except asyncio.QueueFull:
+            self.desbordado = True
+            while not self.cola.empty():
+                self.cola.get_nowait()
+            self.cola.put_nowait({"tipo": "desbordado"})
+
+    def publicar(self, evento: dict):
+        try:
+            self.loop.call_soon_threadsafe(self._encolar, evento)
+        except RuntimeError:
+            # El loop ya se cerró
+            self.canal.desuscribir(self)
+
+    async def siguiente(self, timeout: float) -> Optional[dict]:
+        """Siguiente evento, o None si no hubo ninguno en `timeout` segundos"""
+        try:
+            evento = await asyncio.wait_for(self.cola.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        if evento["tipo"] == "desbordado":
+            self.desbordado = False
+            return self.canal.estado()
+        return evento
+
+
+class CanalAsientos:
+    """Estado en memoria de una instancia y sus suscriptores"""
+
+    def __init__(self, instancia_id: int):
+        self.instancia_id = instancia_id
+        self.disposicion: Optional[DisposicionAsientos] = None
+        self.ocupados: Set[int] = set()  # asiento_id
+        self.retenidos: Set[str] = set()  # numero_asiento
+        self.version = -1
+        self.suscriptores: List[Suscriptor] = []
+        self._pendientes: List[CambioInventario] = []
+        self._lock = threading.Lock()
+
+    def cargar(self, instancia: InstanciaVuelo, db: Session):
+        """Cargar la ocupación desde la base de datos (una vez por canal)"""
+        inventario = estado_inventario(db, instancia, solo_lectura=True)
+        disp = inventario.disposicion
+        with self._lock:
+            self.disposicion = disp
+            self.ocupados = {disp.asientos[p][0] for p in range(disp.total) if inventario.ocupado(p)}
+            self.version = inventario.version
+            self.retenidos = set(retenciones.retenidos(self.instancia_id))
+            # Cambios confirmados mientras se leía
+            for cambio in self._pendientes:
+                self._aplicar(cambio)
+            self._pendientes.clear()
+
+    @property
+    def cargado(self) -> bool:
+        return self.disposicion is not None
+
+    def _numeros(self, asiento_ids) -> List[str]:
+        por_id = self.disposicion.por_id
+        return sorted(self.disposicion.asientos[por_id[a]][1] for a in asiento_ids if a in por_id)
+
+    def _disponibles(self) -> Dict[str, int]:
+        disponibles = {clase: 0 for clase in CLASES}
+        for asiento_id, numero, clase in self.disposicion.asientos:
+            if asiento_id not in self.ocupados and numero not in self.retenidos:
+                disponibles[clase] = disponibles.get(clase, 0) + 1
+        return disponibles
+
+    def _estado(self) -> dict:
+        return {
+            "tipo": "estado",
+            "instancia_vuelo_id": self.instancia_id,
+            "version": self.version,
+            "ocupados": self._numeros(self.ocupados),
+            "retenidos": sorted(self.retenidos),
+            "disponibles": self._disponibles()
+        }
+
+    def estado(self) -> dict:
+        with self._lock:
+            return self._estado()
+
+    def _aplicar(self, cambio: CambioInventario) -> Optional[dict]:
+        if cambio.version <= self.version:
+            return None
+        desconocidos = (cambio.ocupados | cambio.liberados) - set(self.disposicion.por_id)
+        if desconocidos:
+            # Cambió la disposición del vuelo: los suscriptores deben volver a cargar el mapa
+            return {"tipo": "cerrar"}
+        self.version = cambio.version
+        self.ocupados |= cambio.ocupados
+        self.ocupados -= cambio.liberados
+        return {
+            "tipo": "asientos",
+            "version": self.version,
+            "ocupados": self._numeros(cambio.ocupados),
+            "liberados": self._numeros(cambio.liberados),
+            "disponibles": self._disponibles()
+        }
+
+    def aplicar_cambio(self, cambio: CambioInventario):
+        with self._lock:
+            if not self.cargado:
+                self._pendientes.append(cambio)
+                return
+            evento = self._aplicar(cambio)
+            suscriptores = list(self.suscriptores)
+        if evento and evento["tipo"] == "cerrar":
+            difusion_asientos.cerrar(self)
+        if evento:
+            for suscriptor in suscriptores:
+                suscriptor.publicar(evento)
+
+    def aplicar_retenciones(self):
+        actuales = set(retenciones.retenidos(self.instancia_id))
+        with self._lock:
+            if not self.cargado or actuales == self.retenidos:
+                return
+            nuevos, vencidos = actuales - self.retenidos, self.retenidos - actuales
+            self.retenidos = actuales
+            evento = {
+                "tipo": "retenciones",
+                "version": self.version,
+                "retenidos": sorted(nuevos),
+                "liberados": sorted(vencidos),
+                "disponibles": self._disponibles()
+            }
+            suscriptores = list(self.suscriptores)
+        for suscriptor in suscriptores:
+            suscriptor.publicar(evento)
+
+    def suscribir(self, loop: asyncio.AbstractEventLoop):
+        """Devolver el estado actual y un suscriptor que recibe los cambios posteriores"""
+        suscriptor = Suscriptor(self, loop)
+        with self._lock:
+            self.suscriptores.append(suscriptor)
+            return self._estado(), suscriptor
+
+    def desuscribir(self, suscriptor: Suscriptor):
+        with self._lock:
+            if suscriptor in self.suscriptores:
+                self.suscriptores.remove(suscriptor)
+            vacio = not self.suscriptores
+        if vacio:
+            difusion_asientos._cerrar_si_vacio(self)
+
+
+class DifusionAsientos:
+    """Canales por instancia de vuelo"""
+
+    def __init__(self):
+        self._canales: Dict[int, CanalAsientos] = {}
+        self._lock = threading.Lock()
+
+    def abrir(self, db: Session, instancia: InstanciaVuelo, loop: asyncio.AbstractEventLoop):
+        """
+        Suscribirse a la instancia: devuelve (canal, estado actual, suscriptor).
+        Bloquea mientras carga el canal: llamar desde un hilo de trabajo.
+        """
+        while True:
+            with self._lock:
+                canal = self._canales.get(instancia.id)
+                if canal is None:
+                    canal = self._canales[instancia.id] = CanalAsientos(instancia.id)
+            if not canal.cargado:
+                canal.cargar(instancia, db)
+            with self._lock:
+                # Si el último suscriptor se fue mientras tanto, el canal ya no recibe cambios
+                if self._canales.get(instancia.id) is canal:
+                    estado, suscriptor = canal.suscribir(loop)
+                    return canal, estado, suscriptor
+
+    def _cerrar_si_vacio(self, canal: CanalAsientos):
+        with self._lock:
+            if not canal.suscriptores and self._canales.get(canal.instancia_id) is canal:
+                del self._canales[canal.instancia_id]
+
+    def cerrar(self, canal: CanalAsientos):
+        """Quitar el canal; la próxima suscripción crea uno nuevo"""
+        with self._lock:
+            if self._canales.get(canal.instancia_id) is canal:
+                del self._canales[canal.instancia_id]
+
+    def canal(self, instancia_id: int) -> Optional[CanalAsientos]:
+        with self._lock:
+            return self._canales.get(instancia_id)
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {
+                "canales": len(self._canales),
+                "suscriptores": sum(len(c.suscriptores) for c in self._canales.values())
+            }
+
+
+difusion_asientos = DifusionAsientos()
+
+
+@al_confirmar_cambios
+def _difundir_cambio(cambio: CambioInventario):
+    canal = difusion_asientos.canal(cambio.instancia_id)
+    if canal is not None:
+        canal.aplicar_cambio(cambio)
+
+
+@al_cambiar_retenciones
+def _difundir_retenciones(instancia_id: int):
+    canal = difusion_asientos.canal(instancia_id)
+    if canal is not None:
+        canal.aplicar_retenciones()
@@ -0,0 +1,135 @@
+"""
+Asientos disponibles por clase de cada instancia de vuelo.
+
+Las columnas asientos_disponibles_* de `instancias_vuelo` solo las cambia la
+aplicación, y siempre con un UPDATE condicional y atómico:
+
+    UPDATE instancias_vuelo SET x = x - n WHERE id = :id AND x >= n RETURNING x
+
+La comprobación y el descuento son una sola sentencia, así que reservas
+concurrentes nunca dejan el contador negativo (no hay sobreventa) aunque no
+se bloquee la fila antes de leerla. El descuento también exige que la
+instancia siga en venta (estado fuera de ESTADOS_SIN_VENTA). La base de datos
+no tiene triggers que los modifiquen.
+
+devolver_inventario() devuelve a la venta, por lotes, todo lo que ocupaban
+un conjunto de reservas (contadores por clase y asientos del inventario), y
+anota en session.info[CAPACIDAD_LIBERADA] las (instancia, clase) devueltas
+para que la lista de espera las reparta antes del commit.
+"""
+from collections import Counter
+from typing import Dict, Iterable, List
+
+from sqlalchemy import or_, update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
+
+from models import InstanciaVuelo, DetalleReserva, Asiento
+from cache_busquedas import marcar_instancia_modificada
+from inventario_asientos import liberar_asientos
+
+COLUMNAS = {
+    "ECONOMICA": InstanciaVuelo.asientos_disponibles_economica,
+    "EJECUTIVA": InstanciaVuelo.asientos_disponibles_ejecutiva,
+    "PRIMERA": InstanciaVuelo.asientos_disponibles_primera,
+}
+
+# Instancias que ya no se venden: no admiten reservas ni aparecen en las búsquedas
+ESTADOS_SIN_VENTA = ("CANCELADO", "COMPLETADO")
+
+# Clave de session.info con las (instancia, clase) que recuperaron asientos en la transacción
+CAPACIDAD_LIBERADA = "capacidad_liberada"
+
+
+class SinDisponibilidad(Exception):
+    """No quedan suficientes asientos de la clase en la instancia"""
+
+    def __init__(self, clase: str):
+        super().__init__(f"No hay suficientes asientos disponibles en clase {clase}")
+        self.clase = clase
+
+
+def _actualizar(db: Session, instancia_id: int, clase: str, cantidad: int):
+    columna = COLUMNAS.get(clase)
+    if columna is None:
+        raise SinDisponibilidad(clase)
+    condicion = [InstanciaVuelo.id == instancia_id]
+    if cantidad < 0:
+        condicion.append(columna >= -cantidad)
+        condicion.append(or_(InstanciaVuelo.estado.is_(None), InstanciaVuelo.estado.notin_(ESTADOS_SIN_VENTA)))
+    stmt = update(InstanciaVuelo).where(*condicion).values(
+        {columna: columna + cantidad}
+    ).returning(columna).execution_options(synchronize_session=False)
+    restantes = db.execute(stmt).scalar()
+    if restantes is None:
+        return None
+
+    # Reflejar el valor en el objeto cargado en la sesión y avisar a la caché de búsquedas
+    instancia = db.identity_map.get(identity_key(InstanciaVuelo, instancia_id))
+    if instancia is not None:
+        set_committed_value(instancia, columna.key, restantes)
+    marcar_instancia_modificada(db, instancia_id)
+    return restantes
+
+
+def descontar_asientos(db: Session, instancia_id: int, clase: str, cantidad: int) -> int:
+    """
+    Descontar `cantidad` asientos de la clase si quedan suficientes; devuelve los restantes.
+    Lanza SinDisponibilidad si no alcanzan o la instancia ya no se vende. Se confirma con
+    la transacción de la sesión.
+    """
+    restantes = _actualizar(db, instancia_id, clase, -cantidad)
+    if restantes is None:
+        raise SinDisponibilidad(clase)
+    return restantes
+
+
+def reponer_asientos(db: Session, instancia_id: int, clase: str, cantidad: int) -> int:
+    """Devolver `cantidad` asientos de la clase (cancelaciones); devuelve los disponibles"""
+    restantes = _actualizar(db, instancia_id, clase, cantidad)
+    if restantes is None:
+        raise ValueError(f"Instancia de vuelo {instancia_id} no encontrada")
+    return restantes
+
+
+def devolver_inventario(db: Session, reserva_ids: Iterable[int],
+                        instancias_cerradas: Iterable[int] = ()) -> Dict[str, int]:
+    """
+    Devolver los asientos de las reservas indicadas, que ya deben estar marcadas como
+    canceladas en esta transacción: una consulta para sus detalles, un UPDATE por
+    (instancia, clase) y una liberación por instancia. Los tramos de `instancias_cerradas`
+    (instancias que se están cancelando) no se devuelven. Devuelve lo devuelto.
+    """
+    reserva_ids = list(reserva_ids)
+    instancias_cerradas = set(instancias_cerradas)
+    if not reserva_ids:
+        return {"asientos_devueltos": 0, "asientos_liberados": 0}
+    cantidades = Counter()
+    asientos_por_instancia: Dict[int, List[int]] = {}
+    for instancia_id, clase, asiento_id in db.query(
+        DetalleReserva.instancia_vuelo_id, DetalleReserva.clase, DetalleReserva.asiento_id
+    ).filter(DetalleReserva.reserva_id.in_(reserva_ids)).all():
+        if instancia_id in instancias_cerradas:
+            continue
+        cantidades[(instancia_id, clase)] += 1
+        if asiento_id is not None:
+            asientos_por_instancia.setdefault(instancia_id, []).append(asiento_id)
+
+    # Siempre en el mismo orden para que lotes concurrentes no se bloqueen mutuamente
+    for (instancia_id, clase), cantidad in sorted(cantidades.items()):
+        reponer_asientos(db, instancia_id, clase, cantidad)
+    db.info.setdefault(CAPACIDAD_LIBERADA, set()).update(cantidades)
+
+    liberados = 0
+    if asientos_por_instancia:
+        instancias = db.query(InstanciaVuelo).filter(InstanciaVuelo.id.in_(list(asientos_por_instancia))).all()
+        for instancia in sorted(instancias, key=lambda i: i.id):
+            liberados += liberar_asientos(db, instancia, asientos_por_instancia[instancia.id])
+        # Marcas heredadas del trigger anterior
+        db.query(Asiento).filter(
+            Asiento.id.in_([a for ids in asientos_por_instancia.values() for a in ids]),
+            Asiento.disponible == False
+        ).update({"disponible": True}, synchronize_session=False)
+
+    return {"asientos_devueltos": sum(cantidades.values()), "asientos_liberados": liberados}
@@ -5,6 +5,7 @@ from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from pydantic import EmailStr
 from typing import List
+import threading
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -67,6 +68,17 @@ def _send_email(to_email: str, subject: str, html_content: str):
         print(f"{'='*60}\n")
         raise e
 
+def send_in_background(send_function, **kwargs):
+    """Enviar un email en un hilo aparte para no bloquear la petición"""
+    def _worker():
+        try:
+            send_function(**kwargs)
+        except Exception as e:
+            # Los send_* ya registran el detalle; el usuario puede solicitar reenvío
+            print(f"⚠️ Email en segundo plano no enviado ({send_function.__name__}): {str(e)}")
+    
+    threading.Thread(target=_worker, daemon=True).start()
+
 def send_verification_email(email: EmailStr, token: str, nombre: str):
     """Enviar email de verificación"""
     
@@ -0,0 +1,191 @@
+"""
+Prueba de estrés del inventario de reservas.
+
+Lanza muchos hilos que reservan a la vez sobre una misma instancia de vuelo
+por el endpoint real POST /reservas/ (TestClient sobre la aplicación), así
+que mide y verifica el código que se despliega. Al terminar comprueba que no
+hubo sobreventa:
+
+- lo vendido no supera lo que había disponible,
+- el contador final es exactamente el inicial menos lo vendido, y coincide
+  con los pasajeros registrados en la instancia,
+- ningún asiento quedó asignado dos veces y el mapa de bits lo refleja.
+
+Se ejecuta sobre una base desechable: por defecto SQLite en un directorio
+temporal que se borra al terminar, o la de --database-url, que debe ser una
+base de pruebas vacía. No se restaura nada después.
+
+    python estres_reservas.py --hilos 64 --reservas 2000
+
+tests/test_estres_reservas.py usa ejecutar() con la base de las pruebas.
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+
+
+def preparar_base(clase: str, asientos: int):
+    """Vuelo, instancia con `asientos` disponibles en `clase`, su cabina y un usuario; devuelve (instancia_id, headers)"""
+    from datetime import date, time as hora, timedelta
+    from database import SessionLocal
+    from models import Ciudad, Aerolinea, Vuelo, Tarifa, InstanciaVuelo, Usuario
+    from auth import create_access_token, get_password_hash
+    from aprovisionamiento_asientos import aprovisionar_asientos
+    from disponibilidad_asientos import COLUMNAS
+
+    db = SessionLocal()
+    try:
+        origen = Ciudad(nombre="Quito", codigo_iata="UIO", pais="Ecuador")
+        destino = Ciudad(nombre="Guayaquil", codigo_iata="GYE", pais="Ecuador")
+        aerolinea = Aerolinea(nombre="Estrés", codigo_iata="ES", activa=True)
+        db.add_all([origen, destino, aerolinea])
+        db.flush()
+        vuelo = Vuelo(numero_vuelo="ES100", aerolinea_id=aerolinea.id, ciudad_origen_id=origen.id,
+                      ciudad_destino_id=destino.id, hora_salida=hora(8, 0), hora_llegada=hora(9, 0),
+                      duracion_minutos=60, dias_operacion="1111111", activo=True)
+        db.add(vuelo)
+        db.flush()
+        db.add(Tarifa(vuelo_id=vuelo.id, clase=clase, precio=100, fecha_inicio=date.today()))
+        instancia = InstanciaVuelo(vuelo_id=vuelo.id, fecha=date.today() + timedelta(days=7),
+                                   **{columna.key: 0 for columna in COLUMNAS.values()})
+        setattr(instancia, COLUMNAS[clase].key, asientos)
+        usuario = Usuario(email="estres@pruebas.com", password_hash=get_password_hash("estres"),
+                          nombre="Estrés", apellido="Reservas", email_verificado=True, activo=True)
+        db.add_all([instancia, usuario])
+        db.flush()
+        # La cabina se aprovisiona aquí y no en el hilo que se lanza al confirmar
+        db.info.pop("aprovisionamiento_vuelos", None)
+        db.commit()
+        aprovisionar_asientos(db, [vuelo.id])
+        token = create_access_token(data={"sub": usuario.email})
+        return instancia.id, {"Authorization": f"Bearer {token}"}
+    finally:
+        db.close()
+
+
+def ejecutar(cliente, headers: dict, instancia_id: int, clase: str, hilos: int, reservas: int,
+             grupo_max: int) -> bool:
+    """Reservar concurrentemente por POST /reservas/ y verificar el inventario; True si no hubo sobreventa"""
+    from sqlalchemy import func
+    from database import SessionLocal
+    from models import InstanciaVuelo, DetalleReserva
+    from inventario_asientos import estado_inventario
+    from disponibilidad_asientos import COLUMNAS
+
+    columna = COLUMNAS[clase]
+    db = SessionLocal()
+    inicial = db.query(columna).filter(InstanciaVuelo.id == instancia_id).scalar()
+    db.close()
+    if inicial is None:
+        raise SystemExit(f"Instancia de vuelo {instancia_id} no encontrada")
+
+    pendientes = iter(range(reservas))
+    lock = threading.Lock()
+    resultados = Counter()
+    vendidos = []
+    asientos = []
+    latencias = []
+
+    def trabajador():
+        while True:
+            with lock:
+                if next(pendientes, None) is None:
+                    return
+            cantidad = random.randint(1, grupo_max)
+            cuerpo = {"detalles": [{
+                "instancia_vuelo_id": instancia_id,
+                "clase": clase,
+                "pasajeros": [{"nombre": f"Pasajero{i}", "apellido": "Estrés"} for i in range(cantidad)]
+            }]}
+            inicio = time.perf_counter()
+            try:
+                respuesta = cliente.post("/reservas/", headers=headers, json=cuerpo)
+            except Exception as e:
+                with lock:
+                    resultados["errores"] += 1
+                    resultados[f"error: {type(e).__name__}"] += 1
+                continue
+            with lock:
+                latencias.append(time.perf_counter() - inicio)
+                if respuesta.status_code == 201:
+                    resultados["exitosas"] += 1
+                    vendidos.append(cantidad)
+                    asientos.extend(d["asiento_id"] for d in respuesta.json()["detalles"] if d["asiento_id"])
+                elif respuesta.status_code == 400:
+                    resultados["rechazadas"] += 1
+                else:
+                    resultados["errores"] += 1
+                    resultados[f"HTTP {respuesta.status_code}"] += 1
+
+    print(f"🏁 {reservas} reservas con {hilos} hilos sobre la instancia {instancia_id} ({clase}, {inicial} disponibles)")
+    inicio = time.perf_counter()
+    trabajadores = [threading.Thread(target=trabajador) for _ in range(hilos)]
+    for t in trabajadores:
+        t.start()
+    for t in trabajadores:
+        t.join()
+    duracion = time.perf_counter() - inicio
+
+    db = SessionLocal()
+    try:
+        instancia = db.get(InstanciaVuelo, instancia_id)
+        final = getattr(instancia, columna.key)
+        registrados = db.query(func.count(DetalleReserva.id)).filter(
+            DetalleReserva.instancia_vuelo_id == instancia_id,
+            DetalleReserva.clase == clase
+        ).scalar()
+        inventario = estado_inventario(db, instancia, solo_lectura=True)
+    finally:
+        db.close()
+
+    total_vendido = sum(vendidos)
+    repetidos = [a for a, n in Counter(asientos).items() if n > 1]
+    sin_ocupar = [a for a in asientos if not inventario.asiento_ocupado(a)]
+    correcto = (total_vendido <= inicial and final == inicial - total_vendido and registrados == total_vendido
+                and not repetidos and not sin_ocupar and not resultados["errores"])
+
+    latencias.sort()
+    percentil = lambda p: latencias[min(len(latencias) - 1, int(len(latencias) * p))] * 1000 if latencias else 0.0
+    print(f"⏱️  {duracion:.2f}s, {reservas / duracion:.0f} reservas/s, p50 {percentil(0.5):.1f}ms, p99 {percentil(0.99):.1f}ms")
+    print(f"📊 {dict(resultados)}")
+    print(f"💺 Vendidos {total_vendido} de {inicial}; contador final {final} (esperado {inicial - total_vendido}); "
+          f"pasajeros registrados {registrados}")
+    print(f"🔁 Asientos repetidos: {len(repetidos)}; asignados sin ocupar en el inventario: {len(sin_ocupar)}")
+    print("✅ Sin sobreventa" if correcto else "❌ SOBREVENTA O INVENTARIO INCONSISTENTE")
+    return correcto
+
+
+def correr(args) -> bool:
+    with tempfile.TemporaryDirectory() as directorio:
+        # La aplicación lee la configuración al importarse
+        os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(directorio, 'estres.db')}"
+        os.environ["MATERIALIZADOR_ACTIVO"] = "false"
+        from fastapi.testclient import TestClient
+        from database import Base, engine
+        from aprovisionamiento_asientos import CONFIGURACION_CABINA
+        import main
+
+        Base.metadata.create_all(bind=engine)
+        asientos = args.asientos if args.asientos is not None else CONFIGURACION_CABINA[args.clase]
+        instancia_id, headers = preparar_base(args.clase, asientos)
+        try:
+            return ejecutar(TestClient(main.app), headers, instancia_id, args.clase, args.hilos,
+                            args.reservas, args.grupo_max)
+        finally:
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prueba de estrés de reservas concurrentes")
+    parser.add_argument("--database-url", help="Base de pruebas vacía (por defecto, SQLite temporal)")
+    parser.add_argument("--clase", default="ECONOMICA", choices=["ECONOMICA", "EJECUTIVA", "PRIMERA"])
+    parser.add_argument("--asientos", type=int, help="Disponibles al empezar (por defecto, la cabina)")
+    parser.add_argument("--hilos", type=int, default=64)
+    parser.add_argument("--reservas", type=int, default=2000)
+    parser.add_argument("--grupo-max", type=int, default=4, help="Pasajeros máximos por reserva")
+    args = parser.parse_args()
+    raise SystemExit(0 if correr(args) else 1)
@@ -0,0 +1,97 @@
+"""
+Expiración de reservas pendientes de pago.
+
+Una reserva PENDIENTE que no se paga en RESERVAS_PENDIENTES_TTL_MINUTOS se
+cancela y sus asientos vuelven a la venta. La tarea programada busca las
+vencidas por el índice (estado, fecha_reserva) y las procesa en lotes de
+EXPIRACION_RESERVAS_LOTE: un UPDATE condicional marca el lote (solo las que
+siguen PENDIENTE, así que un pago concurrente gana o pierde limpiamente) y
+devolver_inventario repone contadores y asientos, que pasan primero a la
+lista de espera; cada lote se confirma en su propia transacción.
+
+La hora de corte se toma del reloj de la base de datos, el mismo que fija
+fecha_reserva.
+"""
+import os
+import threading
+from datetime import timedelta
+from typing import Dict
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import Reserva
+from disponibilidad_asientos import devolver_inventario
+from lista_espera import promover_lista_espera
+
+TTL_MINUTOS = int(os.getenv("RESERVAS_PENDIENTES_TTL_MINUTOS", "30"))
+INTERVALO_SEGUNDOS = int(os.getenv("EXPIRACION_RESERVAS_INTERVALO_SEGUNDOS", "60"))
+TAMANO_LOTE = int(os.getenv("EXPIRACION_RESERVAS_LOTE", "500"))
+
+_lock = threading.Lock()
+_metricas: Dict[str, int] = {
+    "reservas_expiradas": 0,
+    "asientos_devueltos": 0,  # Contadores por clase repuestos
+    "asientos_liberados": 0,  # Asientos del mapa liberados
+    "lista_espera_promovidas": 0,
+    "lotes": 0,
+}
+
+
+def expirar_reservas(db: Session, ttl_minutos: int = TTL_MINUTOS, tamano_lote: int = TAMANO_LOTE) -> Dict[str, int]:
+    """Cancelar las reservas pendientes vencidas y devolver su inventario; devuelve lo procesado"""
+    corte = db.scalar(select(func.now())) - timedelta(minutes=ttl_minutos)
+    resumen = {"reservas_expiradas": 0, "asientos_devueltos": 0, "asientos_liberados": 0,
+               "lista_espera_promovidas": 0, "lotes": 0}
+
+    while True:
+        candidatas = [reserva_id for (reserva_id,) in db.query(Reserva.id).filter(
+            Reserva.estado == "PENDIENTE",
+            Reserva.fecha_reserva < corte
+        ).order_by(Reserva.fecha_reserva).limit(tamano_lote).with_for_update(skip_locked=True).all()]
+        if not candidatas:
+            break
+
+        expiradas = db.execute(
+            update(Reserva).where(
+                Reserva.id.in_(candidatas),
+                Reserva.estado == "PENDIENTE"
+            ).values(estado="CANCELADA").returning(Reserva.id).execution_options(synchronize_session=False)
+        ).scalars().all()
+        devuelto = devolver_inventario(db, expiradas)
+        promovidas = promover_lista_espera(db)
+        db.commit()
+
+        resumen["reservas_expiradas"] += len(expiradas)
+        resumen["asientos_devueltos"] += devuelto["asientos_devueltos"]
+        resumen["asientos_liberados"] += devuelto["asientos_liberados"]
+        resumen["lista_espera_promovidas"] += promovidas
+        resumen["lotes"] += 1
+        if len(candidatas) < tamano_lote:
+            break
+
+    with _lock:
+        for clave, valor in resumen.items():
+            _metricas[clave] += valor
+    if resumen["reservas_expiradas"]:
+        print(f"⌛ Expiración: {resumen['reservas_expiradas']} reservas canceladas, "
+              f"{resumen['asientos_devueltos']} asientos devueltos ({resumen['lotes']} lotes)")
+    return resumen
+
+
+def ejecutar_expiracion() -> Dict[str, int]:
+    """Ejecución programada con su propia sesión"""
+    db = SessionLocal()
+    try:
+        return expirar_reservas(db)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def estadisticas() -> dict:
+    with _lock:
+        return {"ttl_minutos": TTL_MINUTOS, **_metricas}
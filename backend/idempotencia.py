@@ -0,0 +1,137 @@
+"""
+Idempotency-Key para operaciones que no deben repetirse (reservas y pagos).
+
+La clave se reclama insertando su fila en `claves_idempotencia` dentro de la
+misma transacción de la operación, y la respuesta se guarda en esa fila antes
+de confirmar. Así:
+
+- un reintento con la misma clave devuelve la respuesta guardada sin volver
+  a ejecutar la operación (cabecera Idempotent-Replayed: true);
+- una solicitud concurrente con la misma clave queda esperando en el índice
+  único hasta que la primera confirme (y entonces repite su respuesta) o
+  falle (y entonces se ejecuta ella);
+- si la operación falla, su transacción se deshace junto con la clave y el
+  cliente puede reintentar.
+
+La misma clave con otro cuerpo se rechaza. Las claves vencen a los
+IDEMPOTENCIA_TTL_HORAS y se borran con una tarea programada.
+"""
+import hashlib
+import os
+from datetime import datetime, timedelta
+from typing import Optional, Type
+
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, insert_ignorando_duplicados
+from models import ClaveIdempotencia
+
+TTL_HORAS = int(os.getenv("IDEMPOTENCIA_TTL_HORAS", "24"))
+INTERVALO_LIMPIEZA_SEGUNDOS = int(os.getenv("IDEMPOTENCIA_INTERVALO_LIMPIEZA_SEGUNDOS", "3600"))
+MAX_LONGITUD_CLAVE = 255
+
+
+class ReclamoIdempotencia:
+    """Resultado de reclamar una clave: respuesta previa a repetir o fila donde guardar la nueva"""
+
+    def __init__(self, fila_id: Optional[int] = None, previa: Optional[ClaveIdempotencia] = None):
+        self.fila_id = fila_id
+        self.previa = previa
+
+    @property
+    def repetida(self) -> bool:
+        return self.previa is not None
+
+    def respuesta_previa(self) -> JSONResponse:
+        return JSONResponse(
+            status_code=self.previa.codigo_estado,
+            content=self.previa.respuesta,
+            headers={"Idempotent-Replayed": "true"}
+        )
+
+    def guardar(self, db: Session, codigo_estado: int, modelo: Type[BaseModel], objeto):
+        """Guardar la respuesta en la transacción actual (antes del commit); sin clave no hace nada"""
+        if self.fila_id is None:
+            return
+        db.query(ClaveIdempotencia).filter(ClaveIdempotencia.id == self.fila_id).update({
+            "codigo_estado": codigo_estado,
+            "respuesta": modelo.model_validate(objeto).model_dump(mode="json")
+        }, synchronize_session=False)
+
+
+def _huella(solicitud: BaseModel) -> str:
+    return hashlib.sha256(solicitud.model_dump_json().encode()).hexdigest()
+
+
+def reclamar_clave(db: Session, usuario_id: int, ruta: str, clave: Optional[str],
+                   solicitud: BaseModel) -> ReclamoIdempotencia:
+    """
+    Reclamar la Idempotency-Key para esta operación (primera escritura de la transacción).
+    Si ya se completó, el reclamo trae la respuesta previa.
+    """
+    if not clave:
+        return ReclamoIdempotencia()
+    if len(clave) > MAX_LONGITUD_CLAVE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Idempotency-Key no puede superar {MAX_LONGITUD_CLAVE} caracteres"
+        )
+
+    huella = _huella(solicitud)
+    stmt = insert_ignorando_duplicados(
+        db, ClaveIdempotencia.__table__, ["usuario_id", "ruta", "clave"]
+    ).returning(ClaveIdempotencia.__table__.c.id)
+    for _ in range(2):
+        # Si otra solicitud con la misma clave está en curso, esto espera a que termine
+        fila_id = db.execute(stmt, {
+            "usuario_id": usuario_id,
+            "ruta": ruta,
+            "clave": clave,
+            "huella": huella,
+            "expira_en": datetime.utcnow() + timedelta(hours=TTL_HORAS)
+        }).scalar()
+        if fila_id is not None:
+            return ReclamoIdempotencia(fila_id=fila_id)
+
+        previa = db.query(ClaveIdempotencia).filter(
+            ClaveIdempotencia.usuario_id == usuario_id,
+            ClaveIdempotencia.ruta == ruta,
+            ClaveIdempotencia.clave == clave
+        ).first()
+        if previa is None:
+            continue
+        if previa.expira_en < datetime.utcnow():
+            # Vencida: se descarta y se vuelve a reclamar
+            db.delete(previa)
+            db.flush()
+            continue
+        if previa.huella != huella:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency-Key ya usada con una solicitud distinta"
+            )
+        return ReclamoIdempotencia(previa=previa)
+
+    raise HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="No se pudo reclamar la Idempotency-Key; reintente"
+    )
+
+
+def limpiar_claves_vencidas() -> int:
+    """Tarea programada: borrar las claves vencidas; devuelve cuántas"""
+    db = SessionLocal()
+    try:
+        borradas = db.query(ClaveIdempotencia).filter(
+            ClaveIdempotencia.expira_en < datetime.utcnow()
+        ).delete(synchronize_session=False)
+        db.commit()
+        return borradas
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
@@ -0,0 +1,227 @@
+"""
+Índice en memoria de horarios de vuelos.
+
+Mantiene, por par de códigos IATA (origen, destino), los vuelos activos con su
+máscara de días de operación, horarios, aerolínea y tarifas. Las búsquedas se
+resuelven desde este índice y solo consultan la base de datos para obtener los
+asientos disponibles de cada instancia.
+
+El índice se construye al iniciar la aplicación y se actualiza de forma
+incremental cuando se confirman cambios sobre `vuelos`, `tarifas`, `ciudades`
+o `aerolineas` en esta misma aplicación. Como otros procesos también pueden
+modificar esas tablas, se reconstruye por completo cada cierto tiempo
+(INDICE_VUELOS_REFRESCO_SEGUNDOS).
+"""
+import os
+import threading
+import time as _time
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event, or_, tuple_
+from sqlalchemy.orm import Session, joinedload, selectinload
+
+from models import Vuelo, Tarifa, Ciudad, Aerolinea, InstanciaVuelo, calcular_mascara_dias
+
+REFRESCO_SEGUNDOS = int(os.getenv("INDICE_VUELOS_REFRESCO_SEGUNDOS", "300"))
+
+
+class TarifaIndexada:
+    __slots__ = ("tarifa_id", "clase", "precio", "fecha_inicio", "fecha_fin")
+
+    def __init__(self, tarifa: Tarifa):
+        self.tarifa_id = tarifa.id
+        self.clase = tarifa.clase
+        self.precio = tarifa.precio
+        self.fecha_inicio = tarifa.fecha_inicio
+        self.fecha_fin = tarifa.fecha_fin
+
+    def vigente(self, fecha: date) -> bool:
+        return self.fecha_inicio <= fecha and (self.fecha_fin is None or self.fecha_fin >= fecha)
+
+
+def tarifas_de_tramos(db: Session, tramos: List[Tuple[InstanciaVuelo, str]]) -> Dict[Tuple[int, str], Tarifa]:
+    """
+    Tarifa que se cobra en cada (instancia, clase), con la misma regla que las búsquedas:
+    la más baja entre las vigentes en la fecha (fecha_inicio <= fecha <= fecha_fin).
+    Una sola consulta; devuelve {(instancia_id, clase): tarifa} solo para las que tienen.
+    """
+    if not tramos:
+        return {}
+    pares = {(instancia.vuelo_id, clase) for instancia, clase in tramos}
+    fechas = [instancia.fecha for instancia, _ in tramos]
+    candidatas: Dict[Tuple[int, str], List[Tarifa]] = {}
+    for tarifa in db.query(Tarifa).filter(
+        tuple_(Tarifa.vuelo_id, Tarifa.clase).in_(list(pares)),
+        Tarifa.fecha_inicio <= max(fechas),
+        or_(Tarifa.fecha_fin.is_(None), Tarifa.fecha_fin >= min(fechas))
+    ).all():
+        candidatas.setdefault((tarifa.vuelo_id, tarifa.clase), []).append(tarifa)
+
+    elegidas = {}
+    for instancia, clase in tramos:
+        vigentes = [t for t in candidatas.get((instancia.vuelo_id, clase), []) if TarifaIndexada(t).vigente(instancia.fecha)]
+        if vigentes:
+            elegidas[(instancia.id, clase)] = min(vigentes, key=lambda t: (t.precio, t.id))
+    return elegidas
+
+
+class VueloIndexado:
+    __slots__ = (
+        "vuelo_id", "numero_vuelo", "aerolinea", "aerolinea_codigo",
+        "origen", "destino", "hora_salida", "hora_llegada",
+        "duracion_minutos", "mascara_dias", "tarifas"
+    )
+
+    def __init__(self, vuelo: Vuelo):
+        self.vuelo_id = vuelo.id
+        self.numero_vuelo = vuelo.numero_vuelo
+        self.aerolinea = vuelo.aerolinea.nombre
+        self.aerolinea_codigo = vuelo.aerolinea.codigo_iata
+        self.origen = vuelo.ciudad_origen.codigo_iata
+        self.destino = vuelo.ciudad_destino.codigo_iata
+        self.hora_salida = vuelo.hora_salida
+        self.hora_llegada = vuelo.hora_llegada
+        self.duracion_minutos = vuelo.duracion_minutos
+        self.mascara_dias = (
+            vuelo.mascara_dias if vuelo.mascara_dias is not None
+            else calcular_mascara_dias(vuelo.dias_operacion)
+        )
+        self.tarifas = [TarifaIndexada(t) for t in vuelo.tarifas]
+
+    def opera_el(self, fecha: date) -> bool:
+        return bool(self.mascara_dias & (1 << fecha.weekday()))
+
+    def tarifas_vigentes(self, clase: str, fecha: date) -> List[TarifaIndexada]:
+        return [t for t in self.tarifas if t.clase == clase and t.vigente(fecha)]
+
+
+class IndiceVuelos:
+    """Índice de vuelos activos por ruta (origen, destino)"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._ciudades: Dict[str, Tuple[int, str]] = {}
+        self._vuelos: Dict[int, VueloIndexado] = {}
+        self._rutas: Dict[Tuple[str, str], List[VueloIndexado]] = {}
+        self._rutas_dia: Dict[Tuple[str, str, int], List[VueloIndexado]] = {}
+        self._pendientes: set = set()
+        self._reconstruir = True
+        self._construido_en = 0.0
+        self.version = 0
+
+    def _query_vuelos(self, db: Session):
+        return db.query(Vuelo).options(
+            joinedload(Vuelo.aerolinea),
+            joinedload(Vuelo.ciudad_origen),
+            joinedload(Vuelo.ciudad_destino),
+            selectinload(Vuelo.tarifas)
+        ).filter(Vuelo.activo == True, Vuelo.mascara_dias != 0)
+
+    def _indexar_rutas(self):
+        rutas: Dict[Tuple[str, str], List[VueloIndexado]] = {}
+        for vuelo in self._vuelos.values():
+            rutas.setdefault((vuelo.origen, vuelo.destino), []).append(vuelo)
+        rutas_dia: Dict[Tuple[str, str, int], List[VueloIndexado]] = {}
+        for (origen, destino), lista in rutas.items():
+            lista.sort(key=lambda v: (v.hora_salida, v.vuelo_id))
+            for dia in range(7):
+                del_dia = [v for v in lista if v.mascara_dias & (1 << dia)]
+                if del_dia:
+                    rutas_dia[(origen, destino, dia)] = del_dia
+        self._rutas = rutas
+        self._rutas_dia = rutas_dia
+
+    def construir(self, db: Session):
+        """Cargar todas las ciudades y vuelos activos desde la base de datos"""
+        ciudades = {c.codigo_iata: (c.id, c.nombre) for c in db.query(Ciudad).all()}
+        vuelos = {v.id: VueloIndexado(v) for v in self._query_vuelos(db).all()}
+
+        with self._lock:
+            self._ciudades = ciudades
+            self._vuelos = vuelos
+            self._indexar_rutas()
+            self._pendientes.clear()
+            self._reconstruir = False
+            self._construido_en = _time.monotonic()
+            self.version += 1
+
+        print(f"🗂️ Índice de vuelos construido: {len(vuelos)} vuelos, {len(self._rutas)} rutas")
+
+    def marcar_vuelos(self, vuelo_ids):
+        """Marcar vuelos para recargarlos en la próxima sincronización"""
+        with self._lock:
+            self._pendientes.update(vuelo_ids)
+
+    def marcar_reconstruccion(self):
+        """Forzar una reconstrucción completa en la próxima sincronización"""
+        with self._lock:
+            self._reconstruir = True
+
+    def sincronizar(self, db: Session):
+        """Aplicar cambios pendientes antes de responder una búsqueda"""
+        with self._lock:
+            expirado = _time.monotonic() - self._construido_en > REFRESCO_SEGUNDOS
+            if self._reconstruir or expirado:
+                self.construir(db)
+                return
+            if not self._pendientes:
+                return
+            pendientes = list(self._pendientes)
+            self._pendientes.clear()
+
+            recargados = self._query_vuelos(db).filter(Vuelo.id.in_(pendientes)).all()
+            for vuelo_id in pendientes:
+                self._vuelos.pop(vuelo_id, None)
+            for vuelo in recargados:
+                self._vuelos[vuelo.id] = VueloIndexado(vuelo)
+            self._indexar_rutas()
+            self.version += 1
+
+    def ciudad(self, codigo_iata: str) -> Optional[Tuple[int, str]]:
+        """Obtener (id, nombre) de una ciudad por su código IATA"""
+        return self._ciudades.get(codigo_iata)
+
+    def vuelos(self) -> List[VueloIndexado]:
+        """Todos los vuelos activos del índice"""
+        return list(self._vuelos.values())
+
+    def vuelos_ruta(self, origen: str, destino: str, dia_semana: Optional[int] = None) -> List[VueloIndexado]:
+        """Vuelos activos de una ruta ordenados por hora de salida (opcionalmente solo los que operan ese día)"""
+        if dia_semana is None:
+            return self._rutas.get((origen, destino), [])
+        return self._rutas_dia.get((origen, destino, dia_semana), [])
+
+
+indice_vuelos = IndiceVuelos()
+
+
+# ---------------------------------------------------------------------------
+# Detección de cambios: se acumulan en la sesión y se aplican al confirmar
+# ---------------------------------------------------------------------------
+
+@event.listens_for(Session, "after_flush")
+def _registrar_cambios(session, flush_context):
+    cambios = session.info.setdefault("indice_vuelos", set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Vuelo) and obj.id is not None:
+            cambios.add(obj.id)
+        elif isinstance(obj, Tarifa) and obj.vuelo_id is not None:
+            cambios.add(obj.vuelo_id)
+        elif isinstance(obj, (Ciudad, Aerolinea)):
+            session.info["indice_vuelos_reconstruir"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _aplicar_cambios(session):
+    cambios = session.info.pop("indice_vuelos", None)
+    if session.info.pop("indice_vuelos_reconstruir", False):
+        indice_vuelos.marcar_reconstruccion()
+    elif cambios:
+        indice_vuelos.marcar_vuelos(cambios)
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_cambios(session):
+    session.info.pop("indice_vuelos", None)
+    session.info.pop("indice_vuelos_reconstruir", None)
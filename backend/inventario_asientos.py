@@ -0,0 +1,361 @@
+"""
+Inventario de asientos por instancia de vuelo.
+
+La disposición de cabina de un vuelo son sus filas de `asientos` ordenadas por
+id: la posición de cada asiento en esa lista es su bit en el mapa de bits de
+`inventario_asientos`. Cada instancia guarda en una sola fila qué asientos
+están ocupados y una versión que aumenta con cada cambio.
+
+Ocupar y liberar son operaciones de comparar-y-actualizar sobre la versión:
+si otra transacción cambió la fila entre la lectura y la escritura, se relee y
+se reintenta. La fila de una instancia se crea la primera vez que se usa, a
+partir de los detalles de reservas no canceladas, y se reconstruye igual si
+la disposición del vuelo cambió (los asientos solo se agregan, nunca se borran,
+ver aprovisionamiento_asientos).
+
+La disposición se guarda en memoria por vuelo. Los asientos que agrega este
+proceso la descartan al confirmar; los que agrega otro proceso se detectan
+comparando el número de asientos del vuelo cada DISPOSICION_TTL_SEGUNDOS, o
+antes si la fila de inventario ya tiene más asientos que la disposición.
+
+Cada transacción confirmada que cambió la ocupación se notifica como un
+CambioInventario a las funciones registradas con al_confirmar_cambios, y se
+guarda en un historial corto por instancia (HISTORIAL_CAMBIOS_POR_INSTANCIA)
+para responder qué asientos cambiaron desde una versión (ver cambios_desde).
+"""
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+from database import insert_ignorando_duplicados
+from models import Asiento, InstanciaVuelo, InventarioAsientos, DetalleReserva, Reserva
+
+MAX_REINTENTOS = 20
+HISTORIAL_CAMBIOS_POR_INSTANCIA = int(os.getenv("HISTORIAL_CAMBIOS_POR_INSTANCIA", "64"))
+MAX_INSTANCIAS_HISTORIAL = int(os.getenv("MAX_INSTANCIAS_HISTORIAL", "10000"))
+DISPOSICION_TTL_SEGUNDOS = float(os.getenv("DISPOSICION_TTL_SEGUNDOS", "60"))
+
+
+class AsientosNoDisponibles(Exception):
+    """Alguno de los asientos pedidos no existe en la clase o ya está ocupado"""
+
+    def __init__(self, numero: str, clase: str):
+        super().__init__(f"Asiento {numero} no disponible en clase {clase}")
+        self.numero = numero
+        self.clase = clase
+
+
+class DisposicionAsientos:
+    """Asientos de un vuelo en el orden de sus bits"""
+    __slots__ = ("vuelo_id", "asientos", "por_numero", "por_id", "validada_en")
+
+    def __init__(self, vuelo_id: int, asientos: List[Tuple[int, str, str]]):
+        self.vuelo_id = vuelo_id
+        self.asientos = asientos  # (asiento_id, numero_asiento, clase)
+        self.por_numero = {numero: i for i, (_, numero, _) in enumerate(asientos)}
+        self.por_id = {asiento_id: i for i, (asiento_id, _, _) in enumerate(asientos)}
+        self.validada_en = time.monotonic()
+
+    @property
+    def total(self) -> int:
+        return len(self.asientos)
+
+
+class EstadoInventario:
+    """Foto de la ocupación de una instancia"""
+    __slots__ = ("disposicion", "ocupados", "version")
+
+    def __init__(self, disposicion: DisposicionAsientos, ocupados: int, version: int):
+        self.disposicion = disposicion
+        self.ocupados = ocupados
+        self.version = version
+
+    def ocupado(self, posicion: int) -> bool:
+        return bool(self.ocupados >> posicion & 1)
+
+    def asiento_ocupado(self, asiento_id: int) -> bool:
+        posicion = self.disposicion.por_id.get(asiento_id)
+        return posicion is not None and self.ocupado(posicion)
+
+    def cantidad_ocupados(self) -> int:
+        return bin(self.ocupados).count("1")
+
+
+class CambioInventario:
+    """Asientos ocupados y liberados en una instancia por una transacción confirmada"""
+    __slots__ = ("instancia_id", "vuelo_id", "version_inicial", "version", "ocupados", "liberados")
+
+    def __init__(self, instancia_id: int, vuelo_id: int, version_inicial: int = 0):
+        self.instancia_id = instancia_id
+        self.vuelo_id = vuelo_id
+        self.version_inicial = version_inicial
+        self.version = version_inicial
+        self.ocupados: Set[int] = set()  # asiento_id
+        self.liberados: Set[int] = set()
+
+
+_disposiciones: Dict[int, DisposicionAsientos] = {}
+_observadores: List[Callable[[CambioInventario], None]] = []
+_lock = threading.Lock()
+# instancia_id -> cambios recientes (version_inicial, version, asiento_ids)
+_historial: "OrderedDict[int, deque]" = OrderedDict()
+
+
+def al_confirmar_cambios(funcion: Callable[[CambioInventario], None]):
+    """Registrar una función que recibe cada CambioInventario confirmado"""
+    _observadores.append(funcion)
+    return funcion
+
+
+def notificar_cambio(cambio: CambioInventario):
+    for funcion in _observadores:
+        try:
+            funcion(cambio)
+        except Exception as e:
+            print(f"⚠️ Error notificando cambio de inventario de la instancia {cambio.instancia_id}: {e}")
+
+
+def _registrar_en_historial(cambio: CambioInventario):
+    with _lock:
+        cambios = _historial.get(cambio.instancia_id)
+        if cambios is None:
+            cambios = _historial[cambio.instancia_id] = deque(maxlen=HISTORIAL_CAMBIOS_POR_INSTANCIA)
+            while len(_historial) > MAX_INSTANCIAS_HISTORIAL:
+                _historial.popitem(last=False)
+        else:
+            _historial.move_to_end(cambio.instancia_id)
+        cambios.append((cambio.version_inicial, cambio.version, frozenset(cambio.ocupados | cambio.liberados)))
+
+
+def cambios_desde(instancia_id: int, desde: int, hasta: int) -> Optional[Set[int]]:
+    """
+    Asientos (ids) que cambiaron entre las versiones `desde` y `hasta`.
+    None si el historial no cubre todo el intervalo (el cliente necesita el mapa completo).
+    """
+    if desde == hasta:
+        return set()
+    if desde > hasta:
+        return None
+    with _lock:
+        cambios = list(_historial.get(instancia_id, ()))
+    asiento_ids: Set[int] = set()
+    version = desde
+    for inicial, final, ids in sorted(cambios):
+        if final <= version:
+            continue
+        if inicial != version:
+            # Falta algún cambio (otro proceso o fuera del historial)
+            return None
+        asiento_ids |= ids
+        version = final
+    return asiento_ids if version == hasta else None
+
+
+def disposicion(db: Session, vuelo_id: int, validar: bool = False) -> DisposicionAsientos:
+    """
+    Disposición de asientos del vuelo (se guarda en memoria hasta que cambien sus asientos).
+    Pasado DISPOSICION_TTL_SEGUNDOS, o con validar=True, se comprueba que el vuelo no
+    tenga asientos nuevos antes de devolverla.
+    """
+    with _lock:
+        encontrada = _disposiciones.get(vuelo_id)
+    if encontrada is not None:
+        if not validar and time.monotonic() - encontrada.validada_en < DISPOSICION_TTL_SEGUNDOS:
+            return encontrada
+        total = db.query(func.count(Asiento.id)).filter(Asiento.vuelo_id == vuelo_id).scalar()
+        if total == encontrada.total:
+            encontrada.validada_en = time.monotonic()
+            return encontrada
+    filas = db.query(Asiento.id, Asiento.numero_asiento, Asiento.clase).filter(
+        Asiento.vuelo_id == vuelo_id
+    ).order_by(Asiento.id).all()
+    nueva = DisposicionAsientos(vuelo_id, [tuple(f) for f in filas])
+    with _lock:
+        _disposiciones[vuelo_id] = nueva
+    return nueva
+
+
+def invalidar_disposiciones(vuelo_ids: Iterable[int]):
+    with _lock:
+        for vuelo_id in vuelo_ids:
+            _disposiciones.pop(vuelo_id, None)
+
+
+def _a_bytes(ocupados: int, total: int) -> bytes:
+    return ocupados.to_bytes((total + 7) // 8, "little")
+
+
+def _desde_detalles(db: Session, instancia_id: int, disp: DisposicionAsientos) -> int:
+    """Ocupación según los detalles de reservas no canceladas de la instancia"""
+    ocupados = 0
+    for (asiento_id,) in db.query(DetalleReserva.asiento_id).join(Reserva).filter(
+        DetalleReserva.instancia_vuelo_id == instancia_id,
+        DetalleReserva.asiento_id.isnot(None),
+        Reserva.estado != "CANCELADA"
+    ).all():
+        posicion = disp.por_id.get(asiento_id)
+        if posicion is not None:
+            ocupados |= 1 << posicion
+    return ocupados
+
+
+def _guardar(db: Session, instancia_id: int, disp: DisposicionAsientos, anterior: int, ocupados: int, version: int) -> bool:
+    """Escribir la ocupación solo si la versión no cambió desde la lectura"""
+    actualizadas = db.query(InventarioAsientos).filter(
+        InventarioAsientos.instancia_vuelo_id == instancia_id,
+        InventarioAsientos.version == version
+    ).update({
+        "ocupados": _a_bytes(ocupados, disp.total),
+        "total_asientos": disp.total,
+        "version": version + 1
+    }, synchronize_session=False)
+    if actualizadas != 1:
+        return False
+
+    # Registrar el cambio para notificarlo cuando la transacción se confirme
+    cambio = db.info.setdefault("inventario_asientos_cambios", {}).get(instancia_id)
+    if cambio is None:
+        cambio = CambioInventario(instancia_id, disp.vuelo_id, version)
+        db.info["inventario_asientos_cambios"][instancia_id] = cambio
+    cambio.version = version + 1
+    diferencia = anterior ^ ocupados
+    posicion = 0
+    while diferencia >> posicion:
+        if diferencia >> posicion & 1:
+            asiento_id = disp.asientos[posicion][0]
+            if ocupados >> posicion & 1:
+                cambio.liberados.discard(asiento_id)
+                cambio.ocupados.add(asiento_id)
+            else:
+                cambio.ocupados.discard(asiento_id)
+                cambio.liberados.add(asiento_id)
+        posicion += 1
+    return True
+
+
+def estado_inventario(db: Session, instancia: InstanciaVuelo, solo_lectura: bool = False) -> EstadoInventario:
+    """
+    Leer la ocupación de una instancia, creando o reconstruyendo su fila si hace falta.
+    Con solo_lectura=True no escribe: si la fila falta o está desactualizada, la calcula en memoria.
+    """
+    disp = disposicion(db, instancia.vuelo_id)
+    for _ in range(MAX_REINTENTOS):
+        fila = db.query(
+            InventarioAsientos.ocupados,
+            InventarioAsientos.total_asientos,
+            InventarioAsientos.version
+        ).filter(InventarioAsientos.instancia_vuelo_id == instancia.id).first()
+
+        if fila is not None and fila.total_asientos > disp.total:
+            # Otro proceso ya usa una disposición con más asientos
+            disp = disposicion(db, instancia.vuelo_id, validar=True)
+
+        if solo_lectura and (fila is None or fila.total_asientos != disp.total):
+            return EstadoInventario(disp, _desde_detalles(db, instancia.id, disp), fila.version if fila else 0)
+
+        if fila is None:
+            ocupados = _desde_detalles(db, instancia.id, disp)
+            db.execute(
+                insert_ignorando_duplicados(db, InventarioAsientos.__table__, ["instancia_vuelo_id"]),
+                {
+                    "instancia_vuelo_id": instancia.id,
+                    "ocupados": _a_bytes(ocupados, disp.total),
+                    "total_asientos": disp.total,
+                    "version": 0
+                }
+            )
+            continue
+
+        if fila.total_asientos != disp.total:
+            # Cambió la disposición del vuelo: las posiciones ya no son válidas
+            print(f"🔄 Reconstruyendo inventario de la instancia {instancia.id} ({fila.total_asientos} → {disp.total} asientos)")
+            anterior = int.from_bytes(fila.ocupados, "little") & ((1 << disp.total) - 1)
+            _guardar(db, instancia.id, disp, anterior, _desde_detalles(db, instancia.id, disp), fila.version)
+            continue
+
+        return EstadoInventario(disp, int.from_bytes(fila.ocupados, "little"), fila.version)
+
+    raise RuntimeError(f"No se pudo leer el inventario de la instancia {instancia.id}")
+
+
+def ocupar_asientos(db: Session, instancia: InstanciaVuelo, asientos: List[Tuple[str, str]],
+                    estado: Optional[EstadoInventario] = None) -> Dict[str, int]:
+    """
+    Ocupar de forma atómica los asientos (numero_asiento, clase) indicados.
+    Devuelve {numero_asiento: asiento_id}; lanza AsientosNoDisponibles si alguno no se puede ocupar.
+    `estado` evita releer el inventario en el primer intento si ya se leyó.
+    Los cambios se confirman con la transacción de la sesión.
+    """
+    if not asientos:
+        return {}
+    for _ in range(MAX_REINTENTOS):
+        if estado is None:
+            estado = estado_inventario(db, instancia)
+        disp = estado.disposicion
+        ocupados = estado.ocupados
+        asignados = {}
+        for numero, clase in asientos:
+            posicion = disp.por_numero.get(numero)
+            if posicion is None or disp.asientos[posicion][2] != clase or ocupados >> posicion & 1:
+                raise AsientosNoDisponibles(numero, clase)
+            ocupados |= 1 << posicion
+            asignados[numero] = disp.asientos[posicion][0]
+        if _guardar(db, instancia.id, disp, estado.ocupados, ocupados, estado.version):
+            return asignados
+        estado = None
+    raise RuntimeError(f"Demasiada concurrencia sobre el inventario de la instancia {instancia.id}")
+
+
+def liberar_asientos(db: Session, instancia: InstanciaVuelo, asiento_ids: Iterable[int]) -> int:
+    """Liberar de forma atómica los asientos indicados; devuelve cuántos estaban ocupados"""
+    asiento_ids = list(asiento_ids)
+    if not asiento_ids:
+        return 0
+    for _ in range(MAX_REINTENTOS):
+        estado = estado_inventario(db, instancia)
+        disp = estado.disposicion
+        ocupados = estado.ocupados
+        liberados = 0
+        for asiento_id in asiento_ids:
+            posicion = disp.por_id.get(asiento_id)
+            if posicion is not None and ocupados >> posicion & 1:
+                ocupados &= ~(1 << posicion)
+                liberados += 1
+        if not liberados or _guardar(db, instancia.id, disp, estado.ocupados, ocupados, estado.version):
+            return liberados
+    raise RuntimeError(f"Demasiada concurrencia sobre el inventario de la instancia {instancia.id}")
+
+
+# ---------------------------------------------------------------------------
+# Al confirmar: descartar disposiciones de vuelos cuyos asientos cambiaron y
+# notificar los cambios de ocupación a los observadores
+# ---------------------------------------------------------------------------
+
+@event.listens_for(Session, "after_flush")
+def _registrar_asientos(session, flush_context):
+    vuelos = session.info.setdefault("inventario_asientos_vuelos", set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Asiento) and obj.vuelo_id is not None:
+            vuelos.add(obj.vuelo_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _aplicar_asientos(session):
+    vuelos = session.info.pop("inventario_asientos_vuelos", None)
+    if vuelos:
+        invalidar_disposiciones(vuelos)
+    cambios = session.info.pop("inventario_asientos_cambios", None)
+    for cambio in (cambios or {}).values():
+        _registrar_en_historial(cambio)
+        notificar_cambio(cambio)
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_asientos(session):
+    session.info.pop("inventario_asientos_vuelos", None)
+    session.info.pop("inventario_asientos_cambios", None)
@@ -0,0 +1,191 @@
+"""
+Motor de itinerarios con conexiones (hasta 2 escalas).
+
+Construye, a partir del índice de vuelos, una tabla de salidas por ciudad
+ordenada por hora. Cada búsqueda recorre el grafo expandido en el tiempo
+(vuelo + fecha concreta) con una búsqueda acotada:
+
+- como máximo MAX_ESCALAS escalas,
+- conexiones entre TIEMPO_MINIMO_CONEXION y TIEMPO_MAXIMO_CONEXION minutos,
+- sin volver a pasar por una ciudad ya visitada,
+- descartando ciudades desde las que no se llega al destino con los tramos
+  restantes.
+
+La tabla se recalcula solo cuando cambia la versión del índice.
+"""
+import os
+import threading
+from bisect import bisect_left
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional
+
+from indice_vuelos import indice_vuelos, VueloIndexado, TarifaIndexada
+
+TIEMPO_MINIMO_CONEXION = int(os.getenv("TIEMPO_MINIMO_CONEXION_MINUTOS", "45"))
+TIEMPO_MAXIMO_CONEXION = int(os.getenv("TIEMPO_MAXIMO_CONEXION_MINUTOS", "720"))
+MAX_ESCALAS = 2
+MAX_ITINERARIOS = 20
+
+
+class Tramo:
+    __slots__ = ("vuelo", "salida", "llegada", "tarifa")
+
+    def __init__(self, vuelo: VueloIndexado, salida: datetime, tarifa: TarifaIndexada):
+        self.vuelo = vuelo
+        self.salida = salida
+        self.llegada = salida + timedelta(minutes=vuelo.duracion_minutos)
+        self.tarifa = tarifa
+
+
+class Itinerario:
+    __slots__ = ("tramos", "duracion_minutos", "precio_total")
+
+    def __init__(self, tramos: List[Tramo]):
+        self.tramos = tramos
+        self.duracion_minutos = int((tramos[-1].llegada - tramos[0].salida).total_seconds() // 60)
+        self.precio_total = sum(t.tarifa.precio for t in tramos)
+
+    @property
+    def escalas(self) -> int:
+        return len(self.tramos) - 1
+
+
+class TablaConexiones:
+    """Salidas por ciudad ordenadas por minuto del día y red inversa de rutas"""
+
+    def __init__(self, vuelos: List[VueloIndexado], version: int):
+        self.version = version
+        # Salidas por ciudad y por ruta (para el último tramo), ordenadas por hora
+        self.salidas: Dict[object, List[VueloIndexado]] = {}
+        self.minutos: Dict[object, List[int]] = {}
+        self.llegan_a: Dict[str, set] = {}
+
+        for vuelo in vuelos:
+            self.salidas.setdefault(vuelo.origen, []).append(vuelo)
+            self.salidas.setdefault((vuelo.origen, vuelo.destino), []).append(vuelo)
+            self.llegan_a.setdefault(vuelo.destino, set()).add(vuelo.origen)
+
+        for clave, lista in self.salidas.items():
+            lista.sort(key=lambda v: (v.hora_salida, v.vuelo_id))
+            self.minutos[clave] = [v.hora_salida.hour * 60 + v.hora_salida.minute for v in lista]
+
+    def saltos_hasta(self, destino: str, maximo: int) -> Dict[str, int]:
+        """Mínimo de tramos necesarios desde cada ciudad hasta el destino"""
+        saltos = {destino: 0}
+        frontera = [destino]
+        for distancia in range(1, maximo + 1):
+            siguiente = []
+            for ciudad in frontera:
+                for origen in self.llegan_a.get(ciudad, ()):
+                    if origen not in saltos:
+                        saltos[origen] = distancia
+                        siguiente.append(origen)
+            frontera = siguiente
+        return saltos
+
+    def salidas_entre(self, ciudad: str, desde: datetime, hasta: datetime, destino: Optional[str] = None):
+        """Generar (vuelo, salida) que operan en la ventana [desde, hasta]"""
+        clave = (ciudad, destino) if destino else ciudad
+        lista = self.salidas.get(clave)
+        if not lista:
+            return
+        minutos = self.minutos[clave]
+        dia = desde.date()
+        while datetime.combine(dia, time.min) <= hasta:
+            inicio = 0
+            if dia == desde.date():
+                inicio = bisect_left(minutos, desde.hour * 60 + desde.minute)
+            for i in range(inicio, len(lista)):
+                vuelo = lista[i]
+                salida = datetime.combine(dia, vuelo.hora_salida)
+                if salida > hasta:
+                    break
+                if salida >= desde and vuelo.opera_el(dia):
+                    yield vuelo, salida
+            dia += timedelta(days=1)
+
+
+_tabla: Optional[TablaConexiones] = None
+_tabla_lock = threading.Lock()
+
+
+def _tabla_conexiones() -> TablaConexiones:
+    global _tabla
+    with _tabla_lock:
+        if _tabla is None or _tabla.version != indice_vuelos.version:
+            _tabla = TablaConexiones(indice_vuelos.vuelos(), indice_vuelos.version)
+        return _tabla
+
+
+def _tarifa_mas_baja(vuelo: VueloIndexado, clase: str, fecha: date) -> Optional[TarifaIndexada]:
+    tarifas = vuelo.tarifas_vigentes(clase, fecha)
+    return min(tarifas, key=lambda t: t.precio) if tarifas else None
+
+
+def buscar_itinerarios(
+    origen: str,
+    destino: str,
+    fecha: date,
+    clase: str,
+    max_escalas: int = MAX_ESCALAS,
+    aerolinea_codigo: Optional[str] = None,
+    salida_minima: Optional[datetime] = None
+) -> List[Itinerario]:
+    """
+    Buscar itinerarios directos y con conexiones que salen en la fecha indicada.
+    Devuelve los más rápidos y los más baratos (hasta MAX_ITINERARIOS).
+    El índice debe estar sincronizado antes de llamar a esta función.
+    """
+    tabla = _tabla_conexiones()
+    max_escalas = max(0, min(max_escalas, MAX_ESCALAS))
+    saltos = tabla.saltos_hasta(destino, max_escalas + 1)
+    if origen not in saltos:
+        return []
+
+    minimo_conexion = timedelta(minutes=TIEMPO_MINIMO_CONEXION)
+    maximo_conexion = timedelta(minutes=TIEMPO_MAXIMO_CONEXION)
+    encontrados: List[Itinerario] = []
+
+    def extender(tramos: List[Tramo], ciudad: str, desde: datetime, hasta: datetime, visitadas: set):
+        tramos_restantes = max_escalas + 1 - len(tramos)
+        # En el último tramo solo sirven los vuelos directos al destino
+        solo_hacia = destino if tramos_restantes == 1 else None
+        for vuelo, salida in tabla.salidas_entre(ciudad, desde, hasta, solo_hacia):
+            siguiente = vuelo.destino
+            if siguiente in visitadas or saltos.get(siguiente, tramos_restantes) >= tramos_restantes:
+                continue
+            if aerolinea_codigo and vuelo.aerolinea_codigo != aerolinea_codigo:
+                continue
+            tarifa = _tarifa_mas_baja(vuelo, clase, salida.date())
+            if not tarifa:
+                continue
+
+            tramo = Tramo(vuelo, salida, tarifa)
+            if siguiente == destino:
+                encontrados.append(Itinerario(tramos + [tramo]))
+            else:
+                visitadas.add(siguiente)
+                extender(
+                    tramos + [tramo], siguiente,
+                    tramo.llegada + minimo_conexion, tramo.llegada + maximo_conexion,
+                    visitadas
+                )
+                visitadas.discard(siguiente)
+
+    inicio_dia = datetime.combine(fecha, time.min)
+    desde = max(inicio_dia, salida_minima) if salida_minima else inicio_dia
+    extender([], origen, desde, datetime.combine(fecha, time.max), {origen})
+
+    # Conservar los más rápidos y los más baratos
+    mas_rapidos = sorted(encontrados, key=lambda i: (i.duracion_minutos, i.precio_total))
+    mas_baratos = sorted(encontrados, key=lambda i: (i.precio_total, i.duracion_minutos))
+    seleccion = []
+    vistos = set()
+    for itinerario in mas_rapidos[:MAX_ITINERARIOS // 2] + mas_baratos[:MAX_ITINERARIOS // 2]:
+        clave = tuple((t.vuelo.vuelo_id, t.salida) for t in itinerario.tramos)
+        if clave not in vistos:
+            vistos.add(clave)
+            seleccion.append(itinerario)
+
+    seleccion.sort(key=lambda i: (i.tramos[0].salida, i.duracion_minutos))
+    return seleccion
@@ -0,0 +1,157 @@
+"""
+Lista de espera por instancia de vuelo y clase.
+
+Cuando una clase está agotada el usuario puede anotar a su grupo. Los asientos
+que devuelve devolver_inventario (cancelaciones y expiración de pendientes)
+quedan anotados en la sesión; antes de confirmar, quien los devolvió llama a
+promover_lista_espera() y, en la misma transacción, esos asientos pasan al
+siguiente grupo que quepa, por prioridad y orden de llegada. Así nadie que
+consulte antes puede quedarse con ellos.
+
+Promover un grupo es crearle una reserva PENDIENTE con asientos juntos y
+avisarle con una notificación: si no la paga a tiempo, la expiración de
+reservas la cancela y los asientos siguen al próximo de la lista.
+
+Solo se miran las (instancia, clase) que liberaron asientos, y por cada una
+el índice (instancia_vuelo_id, clase, estado, prioridad, id) entrega el
+siguiente grupo: nunca se recorre la tabla.
+"""
+import random
+import string
+import threading
+from datetime import datetime
+from typing import Dict
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from models import InstanciaVuelo, ListaEspera, Reserva, DetalleReserva, Tarifa, Notificacion
+from disponibilidad_asientos import (
+    COLUMNAS, CAPACIDAD_LIBERADA, ESTADOS_SIN_VENTA, descontar_asientos, SinDisponibilidad
+)
+from inventario_asientos import estado_inventario, ocupar_asientos, AsientosNoDisponibles
+from asignacion_asientos import asignar_grupo
+from indice_vuelos import tarifas_de_tramos
+from retenciones_asientos import retenciones
+
+MAX_INTENTOS_ASIGNACION = 3
+
+_lock = threading.Lock()
+_metricas: Dict[str, int] = {"promociones": 0, "pasajeros_promovidos": 0}
+
+
+def promover_lista_espera(db: Session) -> int:
+    """
+    Pasar los asientos liberados en esta transacción a los grupos en espera.
+    Se llama antes del commit; devuelve cuántos grupos se promovieron.
+    """
+    pares = db.info.pop(CAPACIDAD_LIBERADA, None)
+    if not pares:
+        return 0
+    return sum(promover(db, instancia_id, clase) for instancia_id, clase in sorted(pares))
+
+
+def promover(db: Session, instancia_id: int, clase: str) -> int:
+    """Promover en orden los grupos en espera de la (instancia, clase) mientras quepan"""
+    instancia = db.get(InstanciaVuelo, instancia_id)
+    if instancia is None or instancia.estado in ESTADOS_SIN_VENTA or clase not in COLUMNAS:
+        return 0
+    tarifa = None
+    promovidas = 0
+    while True:
+        # El contador está al día: descontar/reponer lo reflejan en el objeto de la sesión
+        disponibles = getattr(instancia, COLUMNAS[clase].key)
+        if disponibles <= 0:
+            break
+        # El primero en turno que quepa; los grupos tomados por otra transacción se saltan
+        entrada = db.query(ListaEspera).filter(
+            ListaEspera.instancia_vuelo_id == instancia_id,
+            ListaEspera.clase == clase,
+            ListaEspera.estado == "ESPERANDO",
+            ListaEspera.cantidad <= disponibles
+        ).order_by(
+            ListaEspera.prioridad.desc(), ListaEspera.id
+        ).with_for_update(skip_locked=True).first()
+        if entrada is None:
+            break
+        tarifa = tarifa or tarifas_de_tramos(db, [(instancia, clase)]).get((instancia.id, clase))
+        if tarifa is None:
+            break
+        try:
+            descontar_asientos(db, instancia_id, clase, entrada.cantidad)
+        except SinDisponibilidad:
+            break
+        _crear_reserva(db, instancia, entrada, tarifa)
+        promovidas += 1
+
+    if promovidas:
+        print(f"⏫ Lista de espera: {promovidas} grupos promovidos en la instancia {instancia_id} ({clase})")
+    return promovidas
+
+
+def _crear_reserva(db: Session, instancia: InstanciaVuelo, entrada: ListaEspera, tarifa: Tarifa):
+    """Reserva PENDIENTE para el grupo, con asientos juntos si los hay, y su notificación"""
+    bloqueados = set(retenciones.retenidos(instancia.id))
+    asignados, numeros = {}, []
+    for _ in range(MAX_INTENTOS_ASIGNACION):
+        inventario = estado_inventario(db, instancia)
+        # Sin asientos suficientes en el mapa quedan sin asignar hasta el check-in
+        numeros = asignar_grupo(
+            inventario.disposicion, inventario.ocupados, entrada.clase, entrada.cantidad, bloqueados
+        ) or []
+        try:
+            asignados = ocupar_asientos(db, instancia, [(numero, entrada.clase) for numero in numeros], inventario)
+            break
+        except AsientosNoDisponibles:
+            asignados, numeros = {}, []
+
+    reserva = Reserva(
+        codigo_reserva="".join(random.choices(string.ascii_uppercase + string.digits, k=10)),
+        usuario_id=entrada.usuario_id,
+        total=tarifa.precio * entrada.cantidad,
+        estado="PENDIENTE"
+    )
+    db.add(reserva)
+    db.flush()
+    numeros = iter(numeros)
+    db.execute(insert(DetalleReserva), [
+        {
+            "reserva_id": reserva.id,
+            "instancia_vuelo_id": instancia.id,
+            "pasajero_nombre": pasajero["nombre"],
+            "pasajero_apellido": pasajero["apellido"],
+            "asiento_id": asignados.get(next(numeros, None)),
+            "clase": entrada.clase,
+            "precio": tarifa.precio
+        }
+        for pasajero in entrada.pasajeros
+    ])
+
+    entrada.estado = "PROMOVIDA"
+    entrada.reserva_id = reserva.id
+    entrada.fecha_promocion = datetime.utcnow()
+    db.add(Notificacion(
+        usuario_id=entrada.usuario_id,
+        tipo="CONFIRMACION",
+        titulo="Asientos disponibles desde la lista de espera",
+        mensaje=f"Reservamos {entrada.cantidad} asiento(s) en clase {entrada.clase} para su vuelo del "
+                f"{instancia.fecha}. Complete el pago de la reserva {reserva.codigo_reserva} antes de que expire.",
+        datos_extra={"reserva_codigo": reserva.codigo_reserva, "lista_espera_id": entrada.id,
+                     "instancia_vuelo_id": instancia.id}
+    ))
+    with _lock:
+        _metricas["promociones"] += 1
+        _metricas["pasajeros_promovidos"] += entrada.cantidad
+
+
+def cerrar_lista(db: Session, instancia_id: int) -> int:
+    """Cancelar la espera de todos los grupos de una instancia que ya no se vende"""
+    return db.query(ListaEspera).filter(
+        ListaEspera.instancia_vuelo_id == instancia_id,
+        ListaEspera.estado == "ESPERANDO"
+    ).update({"estado": "CANCELADA"}, synchronize_session=False)
+
+
+def estadisticas() -> dict:
+    with _lock:
+        return dict(_metricas)
@@ -2,9 +2,22 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 import os
+import anyio
 from dotenv import load_dotenv
 
 from routers import auth_router, vuelos_router, reservas_router, pagos_router, notificaciones_router
+from database import SessionLocal, HILOS_TRABAJO
+from indice_vuelos import indice_vuelos
+from cache_busquedas import cache_busquedas
+from cache_mapas_asientos import cache_mapas_asientos
+from retenciones_asientos import retenciones
+from difusion_asientos import difusion_asientos
+from materializador import ejecutar_materializador, INTERVALO_SEGUNDOS as INTERVALO_MATERIALIZADOR
+from aprovisionamiento_asientos import ejecutar_aprovisionamiento, INTERVALO_SEGUNDOS as INTERVALO_APROVISIONAMIENTO
+from tareas_programadas import programar_tarea, detener_tareas, estado_tareas
+from expiracion_reservas import ejecutar_expiracion, estadisticas as estadisticas_expiracion, INTERVALO_SEGUNDOS as INTERVALO_EXPIRACION
+from lista_espera import estadisticas as estadisticas_lista_espera
+from idempotencia import limpiar_claves_vencidas, INTERVALO_LIMPIEZA_SEGUNDOS as INTERVALO_LIMPIEZA_IDEMPOTENCIA
 
 load_dotenv()
 
@@ -21,6 +34,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Siguiente-Cursor", "ETag"],
 )
 
 # Incluir routers
@@ -30,6 +44,36 @@ app.include_router(reservas_router.router)
 app.include_router(pagos_router.router)
 app.include_router(notificaciones_router.router)
 
+@app.on_event("startup")
+async def configurar_pool_de_hilos():
+    """Ajustar el pool de hilos donde corren los endpoints síncronos al pool de conexiones"""
+    anyio.to_thread.current_default_thread_limiter().total_tokens = HILOS_TRABAJO
+
+@app.on_event("startup")
+def construir_indice_vuelos():
+    """Cargar el índice de horarios en memoria al iniciar"""
+    db = SessionLocal()
+    try:
+        indice_vuelos.construir(db)
+    except Exception as e:
+        # Si la base no está disponible, el índice se construye en la primera búsqueda
+        print(f"⚠️ No se pudo construir el índice de vuelos al iniciar: {e}")
+    finally:
+        db.close()
+
+@app.on_event("startup")
+def iniciar_tareas_programadas():
+    """Iniciar las tareas periódicas en segundo plano"""
+    if os.getenv("MATERIALIZADOR_ACTIVO", "true").lower() == "true":
+        programar_tarea("materializador_instancias", ejecutar_materializador, INTERVALO_MATERIALIZADOR)
+    programar_tarea("aprovisionamiento_asientos", ejecutar_aprovisionamiento, INTERVALO_APROVISIONAMIENTO)
+    programar_tarea("limpieza_idempotencia", limpiar_claves_vencidas, INTERVALO_LIMPIEZA_IDEMPOTENCIA)
+    programar_tarea("expiracion_reservas", ejecutar_expiracion, INTERVALO_EXPIRACION)
+
+@app.on_event("shutdown")
+def finalizar_tareas_programadas():
+    detener_tareas()
+
 @app.get("/")
 def read_root():
     """Endpoint raíz con información de la API"""
@@ -50,6 +94,19 @@ def health_check():
     """Verificar estado de la API"""
     return {"status": "ok"}
 
+@app.get("/metricas")
+def obtener_metricas():
+    """Métricas internas de cachés y tareas en segundo plano"""
+    return {
+        "cache_busquedas": cache_busquedas.estadisticas(),
+        "cache_mapas_asientos": cache_mapas_asientos.estadisticas(),
+        "retenciones_asientos": retenciones.estadisticas(),
+        "difusion_asientos": difusion_asientos.estadisticas(),
+        "expiracion_reservas": estadisticas_expiracion(),
+        "lista_espera": estadisticas_lista_espera(),
+        "tareas": estado_tareas()
+    }
+
 if __name__ == "__main__":
     host = os.getenv("API_HOST", "0.0.0.0")
     port = int(os.getenv("API_PORT", 8000))
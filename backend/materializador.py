@@ -0,0 +1,126 @@
+"""
+Materialización de instancias de vuelo para fechas futuras.
+
+Crea en bloque las filas de `instancias_vuelo` de los próximos
+MATERIALIZADOR_HORIZONTE_DIAS días según la máscara de días de operación de
+cada vuelo activo. Las inserciones usan ON CONFLICT DO NOTHING sobre
+(vuelo_id, fecha), por lo que repetir una ejecución no duplica ni modifica
+instancias existentes.
+
+La ejecución es incremental: el proceso recuerda hasta qué fecha materializó
+cada vuelo (y con qué máscara) y en las siguientes pasadas solo genera los
+días nuevos del horizonte. Los vuelos nuevos o cuya máscara cambió se
+materializan completos.
+"""
+import os
+import threading
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, insert_ignorando_duplicados
+from models import Vuelo, InstanciaVuelo, Asiento
+from cache_busquedas import cache_busquedas
+from aprovisionamiento_asientos import aprovisionar_asientos, CONFIGURACION_CABINA
+
+HORIZONTE_DIAS = int(os.getenv("MATERIALIZADOR_HORIZONTE_DIAS", "330"))
+INTERVALO_SEGUNDOS = int(os.getenv("MATERIALIZADOR_INTERVALO_SEGUNDOS", str(6 * 3600)))
+TAMANO_LOTE = 5000
+
+# vuelo_id -> (máscara materializada, última fecha materializada)
+_materializado: Dict[int, Tuple[int, date]] = {}
+_lock = threading.Lock()
+
+
+def _capacidades(db: Session, vuelo_ids: List[int]) -> Dict[int, Dict[str, int]]:
+    """Asientos por clase de cada vuelo según su mapa de asientos (si lo tiene)"""
+    capacidades: Dict[int, Dict[str, int]] = {}
+    filas = db.query(Asiento.vuelo_id, Asiento.clase, func.count(Asiento.id)).filter(
+        Asiento.vuelo_id.in_(vuelo_ids)
+    ).group_by(Asiento.vuelo_id, Asiento.clase).all()
+    for vuelo_id, clase, cantidad in filas:
+        capacidades.setdefault(vuelo_id, {})[clase] = cantidad
+    return capacidades
+
+
+def materializar_instancias(db: Session, hoy: Optional[date] = None, horizonte_dias: int = HORIZONTE_DIAS) -> int:
+    """Crear las instancias que faltan hasta el horizonte; devuelve las filas insertadas"""
+    hoy = hoy or date.today()
+    hasta = hoy + timedelta(days=horizonte_dias - 1)
+
+    vuelos = db.query(Vuelo.id, Vuelo.mascara_dias).filter(
+        Vuelo.activo == True, Vuelo.mascara_dias != 0
+    ).all()
+    if not vuelos:
+        return 0
+
+    with _lock:
+        pendientes = []
+        for vuelo_id, mascara in vuelos:
+            previo = _materializado.get(vuelo_id)
+            desde = hoy
+            if previo and previo[0] == mascara:
+                desde = max(hoy, previo[1] + timedelta(days=1))
+            if desde <= hasta:
+                pendientes.append((vuelo_id, mascara, desde))
+
+        if not pendientes:
+            return 0
+
+        capacidades = _capacidades(db, [vuelo_id for vuelo_id, _, _ in pendientes])
+        stmt = insert_ignorando_duplicados(
+            db, InstanciaVuelo.__table__, ["vuelo_id", "fecha"]
+        ).returning(InstanciaVuelo.__table__.c.id)
+        insertadas = 0
+        lote = []
+
+        def volcar():
+            nonlocal insertadas
+            if lote:
+                insertadas += len(db.execute(stmt, lote).all())
+                lote.clear()
+
+        for vuelo_id, mascara, desde in pendientes:
+            asientos = {**CONFIGURACION_CABINA, **capacidades.get(vuelo_id, {})}
+            fecha = desde
+            while fecha <= hasta:
+                if mascara & (1 << fecha.weekday()):
+                    lote.append({
+                        "vuelo_id": vuelo_id,
+                        "fecha": fecha,
+                        "estado": "PROGRAMADO",
+                        "asientos_disponibles_economica": asientos["ECONOMICA"],
+                        "asientos_disponibles_ejecutiva": asientos["EJECUTIVA"],
+                        "asientos_disponibles_primera": asientos["PRIMERA"],
+                    })
+                    if len(lote) >= TAMANO_LOTE:
+                        volcar()
+                fecha += timedelta(days=1)
+        volcar()
+        db.commit()
+
+        for vuelo_id, mascara, _ in pendientes:
+            _materializado[vuelo_id] = (mascara, hasta)
+
+    if insertadas:
+        # Las inserciones en bloque no pasan por los eventos del ORM
+        cache_busquedas.invalidar_sin_instancia()
+    print(f"📅 Materializador: {insertadas} instancias nuevas hasta {hasta.isoformat()} ({len(pendientes)} vuelos revisados)")
+    return insertadas
+
+
+def ejecutar_materializador() -> dict:
+    """Ejecución programada con su propia sesión: instancias nuevas y sus asientos"""
+    db = SessionLocal()
+    try:
+        return {
+            "instancias": materializar_instancias(db),
+            "asientos": aprovisionar_asientos(db)
+        }
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
@@ -1,8 +1,16 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Date, Time, Numeric, ForeignKey, UniqueConstraint, Text, JSON
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Date, Time, Numeric, ForeignKey, UniqueConstraint, Index, Text, JSON, LargeBinary
+from sqlalchemy.orm import relationship, validates
 from sqlalchemy.sql import func
 from database import Base
 
+def calcular_mascara_dias(dias_operacion: str) -> int:
+    """Convertir 'LMMJVSD' (1=opera, 0=no opera) a máscara de bits (bit 0 = lunes)"""
+    mascara = 0
+    for dia, valor in enumerate((dias_operacion or "1111111")[:7]):
+        if valor == "1":
+            mascara |= 1 << dia
+    return mascara
+
 class Usuario(Base):
     __tablename__ = "usuarios"
     
@@ -70,6 +78,7 @@ class Vuelo(Base):
     hora_llegada = Column(Time, nullable=False)
     duracion_minutos = Column(Integer, nullable=False)
     dias_operacion = Column(String(7), default="1111111")
+    mascara_dias = Column(Integer, nullable=False, default=127)  # Bit 0 = lunes ... bit 6 = domingo
     activo = Column(Boolean, default=True)
     
     aerolinea = relationship("Aerolinea", back_populates="vuelos")
@@ -78,6 +87,12 @@ class Vuelo(Base):
     tarifas = relationship("Tarifa", back_populates="vuelo", cascade="all, delete-orphan")
     asientos = relationship("Asiento", back_populates="vuelo", cascade="all, delete-orphan")
     instancias = relationship("InstanciaVuelo", back_populates="vuelo")
+    
+    @validates("dias_operacion")
+    def _sincronizar_mascara(self, key, dias_operacion):
+        """Mantener mascara_dias sincronizada con dias_operacion"""
+        self.mascara_dias = calcular_mascara_dias(dias_operacion)
+        return dias_operacion
 
 class Tarifa(Base):
     __tablename__ = "tarifas"
@@ -123,8 +138,20 @@ class Asiento(Base):
     vuelo = relationship("Vuelo", back_populates="asientos")
     detalles_reserva = relationship("DetalleReserva", back_populates="asiento")
 
+class InventarioAsientos(Base):
+    __tablename__ = "inventario_asientos"
+    
+    instancia_vuelo_id = Column(Integer, ForeignKey("instancias_vuelo.id", ondelete="CASCADE"), primary_key=True)
+    ocupados = Column(LargeBinary, nullable=False)  # Bit i = asiento i del vuelo (ordenados por id)
+    total_asientos = Column(Integer, nullable=False)
+    version = Column(Integer, nullable=False, default=0)  # Aumenta con cada ocupación/liberación
+
 class Reserva(Base):
     __tablename__ = "reservas"
+    __table_args__ = (
+        Index("idx_reservas_estado_fecha", "estado", "fecha_reserva"),  # Expiración de pendientes
+        Index("idx_reservas_usuario_fecha", "usuario_id", "fecha_reserva", "id"),  # Mis reservas (paginado)
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     codigo_reserva = Column(String(10), unique=True, nullable=False, index=True)
@@ -206,3 +233,37 @@ class Notificacion(Base):
     
     usuario = relationship("Usuario", backref="notificaciones")
 
+
+class ClaveIdempotencia(Base):
+    __tablename__ = "claves_idempotencia"
+    __table_args__ = (UniqueConstraint("usuario_id", "ruta", "clave", name="uq_claves_idempotencia"),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    usuario_id = Column(Integer, ForeignKey("usuarios.id", ondelete="CASCADE"), nullable=False)
+    ruta = Column(String(100), nullable=False)  # Ej: "POST /reservas/"
+    clave = Column(String(255), nullable=False)  # Cabecera Idempotency-Key
+    huella = Column(String(64), nullable=False)  # SHA-256 del cuerpo de la solicitud
+    codigo_estado = Column(Integer)
+    respuesta = Column(JSON)
+    fecha_creacion = Column(DateTime, server_default=func.now())
+    expira_en = Column(DateTime, nullable=False, index=True)
+
+
+class ListaEspera(Base):
+    __tablename__ = "lista_espera"
+    __table_args__ = (
+        Index("idx_lista_espera_turno", "instancia_vuelo_id", "clase", "estado", "prioridad", "id"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    usuario_id = Column(Integer, ForeignKey("usuarios.id", ondelete="CASCADE"), nullable=False, index=True)
+    instancia_vuelo_id = Column(Integer, ForeignKey("instancias_vuelo.id"), nullable=False)
+    clase = Column(String(20), nullable=False)
+    cantidad = Column(Integer, nullable=False)  # Pasajeros del grupo
+    pasajeros = Column(JSON, nullable=False)  # [{"nombre", "apellido"}]
+    prioridad = Column(Integer, default=0, nullable=False)  # Mayor primero; a igual prioridad, orden de llegada
+    estado = Column(String(20), default="ESPERANDO", nullable=False)  # ESPERANDO, PROMOVIDA, CANCELADA
+    reserva_id = Column(Integer, ForeignKey("reservas.id"))  # Reserva creada al promoverla
+    fecha_creacion = Column(DateTime, server_default=func.now())
+    fecha_promocion = Column(DateTime)
+
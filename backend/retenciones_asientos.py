@@ -0,0 +1,280 @@
+"""
+Retenciones temporales de asientos durante el checkout.
+
+Cuando un usuario abre el checkout retiene los asientos elegidos durante
+RETENCION_SEGUNDOS; mientras la retención esté vigente nadie más puede
+retenerlos ni reservarlos y el mapa de asientos los muestra como no
+disponibles. La reserva del propio usuario consume sus retenciones.
+
+Hay dos almacenes:
+
+- AlmacenMemoria (por defecto): diccionarios del proceso; las retenciones
+  vencidas se eliminan con una rueda temporizadora (sin sondear la base de
+  datos ni recorrer todas las retenciones).
+- AlmacenRedis: compartido entre procesos, si se define RETENCIONES_REDIS_URL
+  (requiere el paquete `redis`). Cada asiento retenido es una clave con TTL.
+"""
+import os
+import threading
+import time
+from typing import Callable, Dict, Hashable, Iterable, List, Optional
+
+try:
+    import redis
+except ImportError:  # Solo es necesario con RETENCIONES_REDIS_URL
+    redis = None
+
+RETENCION_SEGUNDOS = int(os.getenv("RETENCION_ASIENTOS_SEGUNDOS", "600"))
+MAX_ASIENTOS_POR_RETENCION = int(os.getenv("RETENCION_MAX_ASIENTOS", "9"))
+REDIS_URL = os.getenv("RETENCIONES_REDIS_URL", "")
+
+_observadores: List[Callable[[int], None]] = []
+
+
+def al_cambiar_retenciones(funcion: Callable[[int], None]):
+    """Registrar una función que recibe el id de la instancia cuyas retenciones cambiaron"""
+    _observadores.append(funcion)
+    return funcion
+
+
+def _notificar(instancia_id: int):
+    for funcion in _observadores:
+        try:
+            funcion(instancia_id)
+        except Exception as e:
+            print(f"⚠️ Error notificando retenciones de la instancia {instancia_id}: {e}")
+
+
+class RuedaTemporizadora:
+    """
+    Rueda temporizadora: cada clave se programa en la ranura de su vencimiento
+    (con las vueltas completas que faltan). Cada tic solo revisa una ranura.
+    """
+
+    def __init__(self, al_expirar: Callable[[Hashable], None], ranuras: int = 512, resolucion: float = 1.0):
+        self.al_expirar = al_expirar
+        self.resolucion = resolucion
+        self._ranuras: List[Dict[Hashable, int]] = [{} for _ in range(ranuras)]
+        self._ubicacion: Dict[Hashable, int] = {}
+        self._cursor = 0
+        self._lock = threading.Lock()
+        self._hilo: Optional[threading.Thread] = None
+
+    def programar(self, clave: Hashable, segundos: float):
+        """Programar (o reprogramar) el vencimiento de una clave"""
+        tics = max(1, int(-(-segundos // self.resolucion)))  # Redondeo hacia arriba
+        with self._lock:
+            self._quitar(clave)
+            ranura = (self._cursor + tics) % len(self._ranuras)
+            self._ranuras[ranura][clave] = (tics - 1) // len(self._ranuras)
+            self._ubicacion[clave] = ranura
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._girar, name="rueda-retenciones", daemon=True)
+                self._hilo.start()
+
+    def cancelar(self, clave: Hashable):
+        with self._lock:
+            self._quitar(clave)
+
+    def _quitar(self, clave: Hashable):
+        ranura = self._ubicacion.pop(clave, None)
+        if ranura is not None:
+            self._ranuras[ranura].pop(clave, None)
+
+    def avanzar(self) -> List[Hashable]:
+        """Avanzar un tic y devolver las claves vencidas"""
+        vencidas = []
+        with self._lock:
+            self._cursor = (self._cursor + 1) % len(self._ranuras)
+            ranura = self._ranuras[self._cursor]
+            for clave, vueltas in list(ranura.items()):
+                if vueltas <= 0:
+                    del ranura[clave]
+                    del self._ubicacion[clave]
+                    vencidas.append(clave)
+                else:
+                    ranura[clave] = vueltas - 1
+        return vencidas
+
+    def _girar(self):
+        siguiente = time.monotonic() + self.resolucion
+        while True:
+            time.sleep(max(0.0, siguiente - time.monotonic()))
+            # Recuperar los tics perdidos si el hilo se retrasó
+            while time.monotonic() >= siguiente:
+                siguiente += self.resolucion
+                for clave in self.avanzar():
+                    try:
+                        self.al_expirar(clave)
+                    except Exception as e:
+                        print(f"⚠️ Error expirando retención {clave}: {e}")
+
+
+class AlmacenMemoria:
+    """Retenciones en memoria del proceso con vencimiento por rueda temporizadora"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._por_instancia: Dict[int, Dict[str, tuple]] = {}  # {numero: (usuario_id, expira)}
+        self._rueda = RuedaTemporizadora(self._expirar)
+        self.expiradas = 0
+
+    def retener(self, instancia_id: int, numeros: List[str], usuario_id: int, segundos: int) -> List[str]:
+        """Retener todos los asientos o ninguno; devuelve los retenidos por otros usuarios"""
+        ahora = time.monotonic()
+        with self._lock:
+            actuales = self._por_instancia.setdefault(instancia_id, {})
+            conflictos = [
+                numero for numero in numeros
+                if numero in actuales and actuales[numero][0] != usuario_id and actuales[numero][1] > ahora
+            ]
+            if conflictos:
+                return conflictos
+            for numero in numeros:
+                actuales[numero] = (usuario_id, ahora + segundos)
+                self._rueda.programar((instancia_id, numero), segundos)
+        _notificar(instancia_id)
+        return []
+
+    def liberar(self, instancia_id: int, usuario_id: int, numeros: Optional[Iterable[str]] = None) -> int:
+        """Liberar las retenciones del usuario (todas las de la instancia si no se indican asientos)"""
+        with self._lock:
+            actuales = self._por_instancia.get(instancia_id, {})
+            candidatos = list(actuales) if numeros is None else list(numeros)
+            liberados = 0
+            for numero in candidatos:
+                retencion = actuales.get(numero)
+                if retencion and retencion[0] == usuario_id:
+                    del actuales[numero]
+                    self._rueda.cancelar((instancia_id, numero))
+                    liberados += 1
+            if not actuales:
+                self._por_instancia.pop(instancia_id, None)
+        if liberados:
+            _notificar(instancia_id)
+        return liberados
+
+    def _expirar(self, clave):
+        instancia_id, numero = clave
+        with self._lock:
+            actuales = self._por_instancia.get(instancia_id, {})
+            retencion = actuales.get(numero)
+            if not retencion or retencion[1] > time.monotonic() + self._rueda.resolucion:
+                return
+            del actuales[numero]
+            if not actuales:
+                self._por_instancia.pop(instancia_id, None)
+            self.expiradas += 1
+        _notificar(instancia_id)
+
+    def retenidos(self, instancia_id: int) -> Dict[str, int]:
+        """Asientos retenidos vigentes: {numero_asiento: usuario_id}"""
+        ahora = time.monotonic()
+        with self._lock:
+            return {
+                numero: usuario_id
+                for numero, (usuario_id, expira) in self._por_instancia.get(instancia_id, {}).items()
+                if expira > ahora
+            }
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {
+                "almacen": "memoria",
+                "instancias": len(self._por_instancia),
+                "asientos_retenidos": sum(len(r) for r in self._por_instancia.values()),
+                "expiradas": self.expiradas
+            }
+
+
+class AlmacenRedis:
+    """Retenciones compartidas en Redis: una clave con TTL por asiento retenido"""
+
+    # Retener todos los asientos o ninguno de forma atómica. La última clave es el
+    # índice de la instancia: su TTL solo se alarga, para no acortar otras retenciones
+    _SCRIPT_RETENER = """
+    local indice = KEYS[#KEYS]
+    local conflictos = {}
+    for i = 1, #KEYS - 1 do
+        local actual = redis.call('GET', KEYS[i])
+        if actual and actual ~= ARGV[1] then
+            table.insert(conflictos, i)
+        end
+    end
+    if #conflictos > 0 then
+        return conflictos
+    end
+    for i = 1, #KEYS - 1 do
+        redis.call('SET', KEYS[i], ARGV[1], 'EX', ARGV[2])
+        redis.call('SADD', indice, ARGV[i + 2])
+    end
+    if redis.call('TTL', indice) < tonumber(ARGV[2]) then
+        redis.call('EXPIRE', indice, ARGV[2])
+    end
+    return conflictos
+    """
+
+    # Borrar solo los asientos que el usuario sigue reteniendo (comparar y borrar atómico)
+    _SCRIPT_LIBERAR = """
+    local indice = KEYS[#KEYS]
+    local liberados = 0
+    for i = 1, #KEYS - 1 do
+        if redis.call('GET', KEYS[i]) == ARGV[1] then
+            redis.call('DEL', KEYS[i])
+            redis.call('SREM', indice, ARGV[i + 1])
+            liberados = liberados + 1
+        end
+    end
+    return liberados
+    """
+
+    def __init__(self, url: str):
+        if redis is None:
+            raise RuntimeError("RETENCIONES_REDIS_URL requiere el paquete 'redis'")
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self._retener = self._redis.register_script(self._SCRIPT_RETENER)
+        self._liberar = self._redis.register_script(self._SCRIPT_LIBERAR)
+
+    @staticmethod
+    def _clave(instancia_id: int, numero: str) -> str:
+        return f"retencion:{instancia_id}:{numero}"
+
+    @staticmethod
+    def _indice(instancia_id: int) -> str:
+        return f"retenciones:{instancia_id}"
+
+    def retener(self, instancia_id: int, numeros: List[str], usuario_id: int, segundos: int) -> List[str]:
+        claves = [self._clave(instancia_id, numero) for numero in numeros] + [self._indice(instancia_id)]
+        conflictos = self._retener(keys=claves, args=[str(usuario_id), segundos, *numeros])
+        if conflictos:
+            return [numeros[i - 1] for i in conflictos]
+        _notificar(instancia_id)
+        return []
+
+    def liberar(self, instancia_id: int, usuario_id: int, numeros: Optional[Iterable[str]] = None) -> int:
+        if numeros is None:
+            numeros = self._redis.smembers(self._indice(instancia_id))
+        numeros = list(numeros)
+        if not numeros:
+            return 0
+        claves = [self._clave(instancia_id, numero) for numero in numeros] + [self._indice(instancia_id)]
+        liberados = self._liberar(keys=claves, args=[str(usuario_id), *numeros])
+        if liberados:
+            _notificar(instancia_id)
+        return liberados
+
+    def retenidos(self, instancia_id: int) -> Dict[str, int]:
+        numeros = list(self._redis.smembers(self._indice(instancia_id)))
+        if not numeros:
+            return {}
+        valores = self._redis.mget([self._clave(instancia_id, numero) for numero in numeros])
+        vencidos = [numero for numero, valor in zip(numeros, valores) if valor is None]
+        if vencidos:
+            self._redis.srem(self._indice(instancia_id), *vencidos)
+        return {numero: int(valor) for numero, valor in zip(numeros, valores) if valor is not None}
+
+    def estadisticas(self) -> dict:
+        return {"almacen": "redis"}
+
+
+retenciones = AlmacenRedis(REDIS_URL) if REDIS_URL else AlmacenMemoria()
@@ -15,12 +15,12 @@ from auth import (
     generate_verification_token,
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
-from email_config import send_verification_email, send_welcome_email
+from email_config import send_verification_email, send_welcome_email, send_password_reset_email, send_in_background
 
 router = APIRouter(prefix="/auth", tags=["Autenticación"])
 
 @router.post("/registro", status_code=status.HTTP_201_CREATED)
-async def registrar_usuario(usuario: UsuarioCreate, db: Session = Depends(get_db)):
+def registrar_usuario(usuario: UsuarioCreate, db: Session = Depends(get_db)):
     """Registrar un nuevo usuario en el sistema - Envía email de verificación"""
     
     # Validar formato de email
@@ -96,18 +96,14 @@ async def registrar_usuario(usuario: UsuarioCreate, db: Session = Depends(get_db
     db.commit()
     db.refresh(db_user)
     
-    # Enviar email de verificación
-    try:
-        send_verification_email(
-            email=db_user.email,
-            token=verification_token,
-            nombre=db_user.nombre
-        )
-        print(f"✅ Email de verificación enviado exitosamente a {db_user.email}")
-    except Exception as e:
-        # No eliminar el usuario, solo registrar el error
-        print(f"⚠️ Error al enviar email de verificación a {db_user.email}: {str(e)}")
-        # El usuario puede solicitar reenvío del email después
+    # Enviar email de verificación fuera de la petición
+    # (si falla, el usuario puede solicitar reenvío del email después)
+    send_in_background(
+        send_verification_email,
+        email=db_user.email,
+        token=verification_token,
+        nombre=db_user.nombre
+    )
     
     return {
         "message": "Usuario registrado exitosamente. Por favor, verifica tu correo electrónico.",
@@ -115,7 +111,7 @@ async def registrar_usuario(usuario: UsuarioCreate, db: Session = Depends(get_db
     }
 
 @router.get("/verificar-email/{token}")
-async def verificar_email(token: str, db: Session = Depends(get_db)):
+def verificar_email(token: str, db: Session = Depends(get_db)):
     """Verificar email del usuario con el token recibido"""
     
     # Buscar usuario por token
@@ -149,15 +145,12 @@ async def verificar_email(token: str, db: Session = Depends(get_db)):
     db.commit()
     db.refresh(user)
     
-    # Enviar email de bienvenida
-    try:
-        send_welcome_email(
-            email=user.email,
-            nombre=user.nombre
-        )
-    except Exception as e:
-        # No fallar si el email de bienvenida no se envía
-        print(f"Error enviando email de bienvenida: {str(e)}")
+    # Enviar email de bienvenida fuera de la petición (no es crítico)
+    send_in_background(
+        send_welcome_email,
+        email=user.email,
+        nombre=user.nombre
+    )
     
     return {
         "message": "Email verificado exitosamente. Ya puedes iniciar sesión.",
@@ -165,7 +158,7 @@ async def verificar_email(token: str, db: Session = Depends(get_db)):
     }
 
 @router.post("/reenviar-verificacion")
-async def reenviar_verificacion(data: ReenviarVerificacionRequest, db: Session = Depends(get_db)):
+def reenviar_verificacion(data: ReenviarVerificacionRequest, db: Session = Depends(get_db)):
     """Reenviar email de verificación"""
     
     user = db.query(Usuario).filter(Usuario.email == data.email.lower()).first()
@@ -347,7 +340,7 @@ def eliminar_cuenta(
     return {"message": "Cuenta desactivada exitosamente"}
 
 @router.post("/solicitar-recuperacion-password")
-async def solicitar_recuperacion_password(email: str, db: Session = Depends(get_db)):
+def solicitar_recuperacion_password(email: str, db: Session = Depends(get_db)):
     """Solicitar recuperación de contraseña - Envía email con token"""
     
     # Validar formato de email
@@ -385,17 +378,14 @@ async def solicitar_recuperacion_password(email: str, db: Session = Depends(get_
     
     db.commit()
     
-    # Enviar email de recuperación
-    try:
-        from email_config import send_password_reset_email
-        send_password_reset_email(
-            email=user.email,
-            token=recovery_token,
-            nombre=user.nombre
-        )
-    except Exception as e:
-        print(f"Error enviando email de recuperación: {str(e)}")
-        # No fallar, ya que esto es información sensible
+    # Enviar email de recuperación fuera de la petición
+    # (nunca se informa el resultado, ya que esto es información sensible)
+    send_in_background(
+        send_password_reset_email,
+        email=user.email,
+        token=recovery_token,
+        nombre=user.nombre
+    )
     
     return {
         "message": "Si existe una cuenta con ese email, recibirás un correo con instrucciones para recuperar tu contraseña",
@@ -403,7 +393,7 @@ async def solicitar_recuperacion_password(email: str, db: Session = Depends(get_
     }
 
 @router.post("/recuperar-password")
-async def recuperar_password(token: str, nueva_password: str, db: Session = Depends(get_db)):
+def recuperar_password(token: str, nueva_password: str, db: Session = Depends(get_db)):
     """Cambiar contraseña usando el token de recuperación"""
     
     # Validar nueva contraseña
@@ -1,12 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, status, Header
+from sqlalchemy.orm import Session, aliased
+from typing import List, Optional
 import random
 import string
 
 from database import get_db
 from models import (
-    Usuario, Reserva, Pago, TarjetaCredito, Billete, DetalleReserva
+    Usuario, Reserva, Pago, TarjetaCredito, Billete, DetalleReserva,
+    InstanciaVuelo, Vuelo, Ciudad, Aerolinea, Asiento, CheckIn
 )
 from schemas import (
     PagoCreate,
@@ -17,6 +18,7 @@ from schemas import (
 )
 from auth import get_current_active_user
 from email_config import send_ticket_email, MAIL_USERNAME
+from idempotencia import reclamar_clave
 import threading
 
 router = APIRouter(prefix="/pagos", tags=["Pagos y Billetes"])
@@ -93,10 +95,16 @@ def eliminar_tarjeta(
 def procesar_pago(
     pago_data: PagoCreate,
     current_user: Usuario = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
     """Procesar el pago de una reserva y generar billetes"""
     
+    # Un reintento con la misma Idempotency-Key devuelve el pago ya procesado (sin cobrar de nuevo)
+    reclamo = reclamar_clave(db, current_user.id, "POST /pagos/procesar", idempotency_key, pago_data)
+    if reclamo.repetida:
+        return reclamo.respuesta_previa()
+    
     # Verificar que la reserva existe y pertenece al usuario
     reserva = db.query(Reserva).filter(
         Reserva.id == pago_data.reserva_id,
@@ -142,7 +150,16 @@ def procesar_pago(
     
     db.add(pago)
     
-    # Actualizar estado de la reserva
+    # Actualizar estado de la reserva solo si sigue pendiente (dos pagos concurrentes no cobran dos veces)
+    confirmadas = db.query(Reserva).filter(
+        Reserva.id == reserva.id,
+        Reserva.estado == "PENDIENTE"
+    ).update({"estado": "CONFIRMADA"}, synchronize_session=False)
+    if confirmadas != 1:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="La reserva ya no está pendiente de pago"
+        )
     reserva.estado = "CONFIRMADA"
     
     # Agrupar detalles por vuelo (instancia_vuelo_id)
@@ -184,6 +201,8 @@ def procesar_pago(
                 except:
                     pass
     
+    db.flush()
+    reclamo.guardar(db, status.HTTP_201_CREATED, PagoResponse, pago)
     db.commit()
     db.refresh(pago)
     
@@ -207,40 +226,57 @@ def listar_billetes(
     db: Session = Depends(get_db)
 ):
     """Obtener todos los billetes del usuario con información del vuelo"""
-    billetes = db.query(Billete).join(
-        DetalleReserva
+    CiudadOrigen = aliased(Ciudad)
+    CiudadDestino = aliased(Ciudad)
+    
+    # Una sola consulta con todas las columnas necesarias (sin cargas perezosas por billete)
+    filas = db.query(
+        Billete.codigo_billete,
+        Billete.fecha_emision,
+        Billete.metodo_entrega,
+        Billete.estado,
+        DetalleReserva.pasajero_nombre,
+        DetalleReserva.pasajero_apellido,
+        CheckIn.id.label("check_in_id"),
+        Vuelo.numero_vuelo,
+        InstanciaVuelo.fecha,
+        CiudadOrigen.codigo_iata.label("origen"),
+        CiudadDestino.codigo_iata.label("destino")
+    ).join(
+        DetalleReserva, DetalleReserva.id == Billete.detalle_reserva_id
+    ).join(
+        Reserva, Reserva.id == DetalleReserva.reserva_id
+    ).join(
+        InstanciaVuelo, InstanciaVuelo.id == DetalleReserva.instancia_vuelo_id
+    ).join(
+        Vuelo, Vuelo.id == InstanciaVuelo.vuelo_id
     ).join(
-        Reserva
+        CiudadOrigen, CiudadOrigen.id == Vuelo.ciudad_origen_id
+    ).join(
+        CiudadDestino, CiudadDestino.id == Vuelo.ciudad_destino_id
+    ).outerjoin(
+        CheckIn, CheckIn.billete_id == Billete.id
     ).filter(
         Reserva.usuario_id == current_user.id
     ).order_by(Billete.fecha_emision.desc()).all()
     
-    # Enriquecer con información del vuelo para filtros
-    resultado = []
-    for billete in billetes:
-        detalle = billete.detalle_reserva
-        instancia = detalle.instancia_vuelo
-        vuelo = instancia.vuelo
-        
-        # Verificar si ya se realizó check-in
-        check_in_realizado = billete.check_in is not None
-        
-        resultado.append({
-            "codigo_billete": billete.codigo_billete,
-            "fecha_emision": str(billete.fecha_emision),
-            "metodo_entrega": billete.metodo_entrega,
-            "estado": billete.estado,
-            "pasajero": f"{detalle.pasajero_nombre} {detalle.pasajero_apellido}",
-            "check_in_realizado": check_in_realizado,
+    return [
+        {
+            "codigo_billete": fila.codigo_billete,
+            "fecha_emision": str(fila.fecha_emision),
+            "metodo_entrega": fila.metodo_entrega,
+            "estado": fila.estado,
+            "pasajero": f"{fila.pasajero_nombre} {fila.pasajero_apellido}",
+            "check_in_realizado": fila.check_in_id is not None,
             "vuelo": {
-                "numero_vuelo": vuelo.numero_vuelo,
-                "fecha": str(instancia.fecha),
-                "origen": vuelo.ciudad_origen.codigo_iata,
-                "destino": vuelo.ciudad_destino.codigo_iata
+                "numero_vuelo": fila.numero_vuelo,
+                "fecha": str(fila.fecha),
+                "origen": fila.origen,
+                "destino": fila.destino
             }
-        })
-    
-    return resultado
+        }
+        for fila in filas
+    ]
 
 @router.get("/billetes/{codigo_billete}")
 def obtener_billete(
@@ -249,51 +285,82 @@ def obtener_billete(
     db: Session = Depends(get_db)
 ):
     """Obtener detalles completos de un billete"""
-    billete = db.query(Billete).join(
-        DetalleReserva
+    CiudadOrigen = aliased(Ciudad)
+    CiudadDestino = aliased(Ciudad)
+    
+    fila = db.query(
+        Billete.codigo_billete,
+        Billete.fecha_emision,
+        Billete.metodo_entrega,
+        Billete.estado,
+        DetalleReserva.pasajero_nombre,
+        DetalleReserva.pasajero_apellido,
+        DetalleReserva.clase,
+        DetalleReserva.precio,
+        Reserva.codigo_reserva,
+        Vuelo.numero_vuelo,
+        Vuelo.hora_salida,
+        Vuelo.hora_llegada,
+        Aerolinea.nombre.label("aerolinea"),
+        InstanciaVuelo.fecha,
+        InstanciaVuelo.puerta,
+        CiudadOrigen.nombre.label("origen_nombre"),
+        CiudadOrigen.codigo_iata.label("origen_codigo"),
+        CiudadDestino.nombre.label("destino_nombre"),
+        CiudadDestino.codigo_iata.label("destino_codigo"),
+        Asiento.numero_asiento
+    ).join(
+        DetalleReserva, DetalleReserva.id == Billete.detalle_reserva_id
+    ).join(
+        Reserva, Reserva.id == DetalleReserva.reserva_id
     ).join(
-        Reserva
+        InstanciaVuelo, InstanciaVuelo.id == DetalleReserva.instancia_vuelo_id
+    ).join(
+        Vuelo, Vuelo.id == InstanciaVuelo.vuelo_id
+    ).join(
+        Aerolinea, Aerolinea.id == Vuelo.aerolinea_id
+    ).join(
+        CiudadOrigen, CiudadOrigen.id == Vuelo.ciudad_origen_id
+    ).join(
+        CiudadDestino, CiudadDestino.id == Vuelo.ciudad_destino_id
+    ).outerjoin(
+        Asiento, Asiento.id == DetalleReserva.asiento_id
     ).filter(
         Billete.codigo_billete == codigo_billete,
         Reserva.usuario_id == current_user.id
     ).first()
     
-    if not billete:
+    if not fila:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Billete no encontrado"
         )
     
-    detalle = billete.detalle_reserva
-    instancia = detalle.instancia_vuelo
-    vuelo = instancia.vuelo
-    reserva = detalle.reserva
-    
     return {
         "billete": {
-            "codigo": billete.codigo_billete,
-            "fecha_emision": str(billete.fecha_emision),
-            "metodo_entrega": billete.metodo_entrega,
-            "estado": billete.estado
+            "codigo": fila.codigo_billete,
+            "fecha_emision": str(fila.fecha_emision),
+            "metodo_entrega": fila.metodo_entrega,
+            "estado": fila.estado
         },
         "pasajero": {
-            "nombre": detalle.pasajero_nombre,
-            "apellido": detalle.pasajero_apellido
+            "nombre": fila.pasajero_nombre,
+            "apellido": fila.pasajero_apellido
         },
         "vuelo": {
-            "numero_vuelo": vuelo.numero_vuelo,
-            "aerolinea": vuelo.aerolinea.nombre,
-            "origen": f"{vuelo.ciudad_origen.nombre} ({vuelo.ciudad_origen.codigo_iata})",
-            "destino": f"{vuelo.ciudad_destino.nombre} ({vuelo.ciudad_destino.codigo_iata})",
-            "fecha": str(instancia.fecha),
-            "hora_salida": str(vuelo.hora_salida),
-            "hora_llegada": str(vuelo.hora_llegada),
-            "puerta": instancia.puerta
+            "numero_vuelo": fila.numero_vuelo,
+            "aerolinea": fila.aerolinea,
+            "origen": f"{fila.origen_nombre} ({fila.origen_codigo})",
+            "destino": f"{fila.destino_nombre} ({fila.destino_codigo})",
+            "fecha": str(fila.fecha),
+            "hora_salida": str(fila.hora_salida),
+            "hora_llegada": str(fila.hora_llegada),
+            "puerta": fila.puerta
         },
         "asiento": {
-            "numero": detalle.asiento.numero_asiento if detalle.asiento else "No asignado",
-            "clase": detalle.clase
+            "numero": fila.numero_asiento if fila.numero_asiento else "No asignado",
+            "clase": fila.clase
         },
-        "precio": float(detalle.precio),
-        "reserva_codigo": detalle.reserva.codigo_reserva
+        "precio": float(fila.precio),
+        "reserva_codigo": fila.codigo_reserva
     }
@@ -1,155 +1,376 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, status, Header, Query, Response
+from sqlalchemy import insert, tuple_
+from sqlalchemy.orm import Session, selectinload
+from typing import List, Optional
+import base64
+import json
 import random
 import string
-from datetime import datetime
+from datetime import datetime, timedelta
+from decimal import Decimal
 
-from database import get_db
+from database import get_db, insert_ignorando_duplicados
 from models import (
     Usuario, Reserva, DetalleReserva, InstanciaVuelo,
-    Asiento, Vuelo, Tarifa
+    Asiento, Vuelo, ListaEspera
 )
-from models import Billete
+from models import Billete, CheckIn
 from schemas import (
     ReservaCreate,
     ReservaResponse,
-    DetalleReservaCreate
+    DetalleReservaCreate,
+    RetencionAsientosRequest,
+    RetencionAsientosResponse,
+    ListaEsperaCreate,
+    ListaEsperaResponse
 )
-from auth import get_current_active_user
+from auth import get_current_active_user, get_current_admin_user
+from inventario_asientos import estado_inventario, ocupar_asientos, AsientosNoDisponibles
+from retenciones_asientos import retenciones, RETENCION_SEGUNDOS, MAX_ASIENTOS_POR_RETENCION
+from asignacion_asientos import asignar_grupo
+from disponibilidad_asientos import COLUMNAS, ESTADOS_SIN_VENTA, descontar_asientos, SinDisponibilidad
+from idempotencia import reclamar_clave
+from indice_vuelos import tarifas_de_tramos
+from cancelacion_reservas import cancelar_reservas, cancelar_reservas_de_instancia
+from lista_espera import promover, cerrar_lista
+from cache_busquedas import marcar_instancia_modificada
 
 router = APIRouter(prefix="/reservas", tags=["Reservas"])
 
+MAX_INTENTOS_ASIGNACION = 3
+LIMITE_RESERVAS = 20
+MAX_LIMITE_RESERVAS = 100
+ESTADOS_RESERVA = ("PENDIENTE", "CONFIRMADA", "PAGADA", "CANCELADA")
+
 def generar_codigo_reserva() -> str:
     """Generar código único de reserva"""
     return ''.join(random.choices(string.ascii_uppercase + string.digits, k=10))
 
+def _codificar_cursor_reservas(reserva: Reserva) -> str:
+    """Cursor opaco con la clave de orden (fecha_reserva, id) de la última reserva entregada"""
+    return base64.urlsafe_b64encode(json.dumps([reserva.fecha_reserva.isoformat(), reserva.id]).encode()).decode()
+
+def _decodificar_cursor_reservas(cursor: str) -> tuple:
+    try:
+        fecha, reserva_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return (datetime.fromisoformat(fecha), int(reserva_id))
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor de paginación inválido"
+        )
+
 @router.post("/", response_model=ReservaResponse, status_code=status.HTTP_201_CREATED)
 def crear_reserva(
     reserva_data: ReservaCreate,
     current_user: Usuario = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
-    """Crear una nueva reserva de vuelo(s)"""
+    """Crear una nueva reserva de vuelo(s) en una sola transacción"""
     
-    total = 0
-    detalles_lista = []
+    # Un reintento con la misma Idempotency-Key devuelve la reserva ya creada
+    reclamo = reclamar_clave(db, current_user.id, "POST /reservas/", idempotency_key, reserva_data)
+    if reclamo.repetida:
+        return reclamo.respuesta_previa()
     
-    # Procesar cada detalle de reserva
+    # Cargar de una vez las instancias y tarifas de todos los tramos
+    instancia_ids = {d.instancia_vuelo_id for d in reserva_data.detalles}
+    instancias = {
+        instancia.id: instancia
+        for instancia in db.query(InstanciaVuelo).filter(InstanciaVuelo.id.in_(instancia_ids)).all()
+    }
     for detalle_data in reserva_data.detalles:
-        # Verificar que la instancia de vuelo existe
-        instancia = db.query(InstanciaVuelo).filter(
-            InstanciaVuelo.id == detalle_data.instancia_vuelo_id
-        ).first()
-        
-        if not instancia:
+        if detalle_data.instancia_vuelo_id not in instancias:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Instancia de vuelo {detalle_data.instancia_vuelo_id} no encontrada"
             )
-        
-        # Obtener la tarifa para esa clase
-        tarifa = db.query(Tarifa).filter(
-            Tarifa.vuelo_id == instancia.vuelo_id,
-            Tarifa.clase == detalle_data.clase,
-            Tarifa.fecha_inicio <= instancia.fecha
-        ).first()
-        
-        if not tarifa:
+    for instancia in instancias.values():
+        if instancia.estado in ESTADOS_SIN_VENTA:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"El vuelo de la instancia {instancia.id} está {instancia.estado} y no admite reservas"
+            )
+    
+    tarifas = tarifas_de_tramos(db, [
+        (instancias[d.instancia_vuelo_id], d.clase) for d in reserva_data.detalles
+    ])
+    for detalle_data in reserva_data.detalles:
+        if (detalle_data.instancia_vuelo_id, detalle_data.clase) not in tarifas:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Tarifa no encontrada para clase {detalle_data.clase}"
             )
+    
+    # Los asientos retenidos por otro usuario durante su checkout no se pueden reservar
+    retenidos_por_instancia = {instancia_id: retenciones.retenidos(instancia_id) for instancia_id in instancia_ids}
+    for detalle_data in reserva_data.detalles:
+        retenidos = retenidos_por_instancia[detalle_data.instancia_vuelo_id]
+        for pasajero in detalle_data.pasajeros:
+            if pasajero.asiento_numero and retenidos.get(pasajero.asiento_numero, current_user.id) != current_user.id:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Asiento {pasajero.asiento_numero} retenido por otro usuario"
+                )
+    
+    total = Decimal("0")
+    detalles_lista = []
+    
+    # Procesar cada detalle de reserva
+    for detalle_data in reserva_data.detalles:
+        instancia = instancias[detalle_data.instancia_vuelo_id]
+        tarifa = tarifas[(instancia.id, detalle_data.clase)]
+        retenidos = retenidos_por_instancia[instancia.id]
         
-        # Verificar disponibilidad de asientos
-        if detalle_data.clase == "ECONOMICA":
-            asientos_disp = instancia.asientos_disponibles_economica
-        elif detalle_data.clase == "EJECUTIVA":
-            asientos_disp = instancia.asientos_disponibles_ejecutiva
-        else:
-            asientos_disp = instancia.asientos_disponibles_primera
-        
-        if asientos_disp < len(detalle_data.pasajeros):
+        # Descontar los asientos de la clase solo si alcanzan (UPDATE condicional atómico)
+        try:
+            descontar_asientos(db, instancia.id, detalle_data.clase, len(detalle_data.pasajeros))
+        except SinDisponibilidad as e:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"No hay suficientes asientos disponibles en clase {detalle_data.clase}"
+                detail=str(e)
             )
         
-        # Crear detalles para cada pasajero
-        for pasajero in detalle_data.pasajeros:
-            asiento_id = None
-            
-            # Si se especificó número de asiento, asignarlo
-            if pasajero.asiento_numero:
-                asiento = db.query(Asiento).filter(
-                    Asiento.vuelo_id == instancia.vuelo_id,
-                    Asiento.numero_asiento == pasajero.asiento_numero,
-                    Asiento.clase == detalle_data.clase,
-                    Asiento.disponible == True
-                ).first()
-                
-                if not asiento:
+        # Ocupar en el inventario de la instancia los asientos elegidos (todos o ninguno);
+        # a los pasajeros sin asiento se les asignan asientos juntos automáticamente
+        elegidos = [pasajero.asiento_numero for pasajero in detalle_data.pasajeros if pasajero.asiento_numero]
+        sin_asiento = len(detalle_data.pasajeros) - len(elegidos)
+        bloqueados = set(elegidos) | {n for n, usuario_id in retenidos.items() if usuario_id != current_user.id}
+        for intento in range(MAX_INTENTOS_ASIGNACION):
+            automaticos = []
+            inventario = None
+            if sin_asiento:
+                inventario = estado_inventario(db, instancia)
+                # Sin asientos suficientes en el mapa quedan sin asignar hasta el check-in
+                automaticos = asignar_grupo(
+                    inventario.disposicion, inventario.ocupados, detalle_data.clase, sin_asiento, bloqueados
+                ) or []
+            try:
+                asientos_asignados = ocupar_asientos(
+                    db, instancia, [(numero, detalle_data.clase) for numero in elegidos + automaticos], inventario
+                )
+                break
+            except AsientosNoDisponibles as e:
+                # Si el asiento tomado por otra reserva era automático, se elige otro
+                if e.numero in elegidos or intento == MAX_INTENTOS_ASIGNACION - 1:
                     raise HTTPException(
                         status_code=status.HTTP_400_BAD_REQUEST,
-                        detail=f"Asiento {pasajero.asiento_numero} no disponible en clase {detalle_data.clase}"
+                        detail=str(e)
                     )
-                
-                asiento.disponible = False
-                asiento_id = asiento.id
-            
-            # Crear detalle de reserva
-            detalle = DetalleReserva(
-                instancia_vuelo_id=instancia.id,
-                pasajero_nombre=pasajero.nombre,
-                pasajero_apellido=pasajero.apellido,
-                asiento_id=asiento_id,
-                clase=detalle_data.clase,
-                precio=tarifa.precio
-            )
-            
-            detalles_lista.append(detalle)
-            total += float(tarifa.precio)
+        automaticos = iter(automaticos)
         
-        # Actualizar asientos disponibles
-        if detalle_data.clase == "ECONOMICA":
-            instancia.asientos_disponibles_economica -= len(detalle_data.pasajeros)
-        elif detalle_data.clase == "EJECUTIVA":
-            instancia.asientos_disponibles_ejecutiva -= len(detalle_data.pasajeros)
-        else:
-            instancia.asientos_disponibles_primera -= len(detalle_data.pasajeros)
+        # Crear detalles para cada pasajero
+        for pasajero in detalle_data.pasajeros:
+            asiento_numero = pasajero.asiento_numero or next(automaticos, None)
+            detalles_lista.append({
+                "instancia_vuelo_id": instancia.id,
+                "pasajero_nombre": pasajero.nombre,
+                "pasajero_apellido": pasajero.apellido,
+                "asiento_id": asientos_asignados.get(asiento_numero),
+                "clase": detalle_data.clase,
+                "precio": tarifa.precio
+            })
+            total += tarifa.precio
     
-    # Crear la reserva
-    codigo_reserva = generar_codigo_reserva()
+    # Crear la reserva, insertar todos sus detalles en bloque y confirmar una sola vez
     reserva = Reserva(
-        codigo_reserva=codigo_reserva,
+        codigo_reserva=generar_codigo_reserva(),
         usuario_id=current_user.id,
         total=total,
         estado="PENDIENTE"
     )
-    
     db.add(reserva)
+    db.flush()
+    if detalles_lista:
+        for detalle in detalles_lista:
+            detalle["reserva_id"] = reserva.id
+        db.execute(insert(DetalleReserva), detalles_lista)
+    reclamo.guardar(db, status.HTTP_201_CREATED, ReservaResponse, reserva)
     db.commit()
-    db.refresh(reserva)
     
-    # Agregar detalles a la reserva
-    for detalle in detalles_lista:
-        detalle.reserva_id = reserva.id
-        db.add(detalle)
+    # Los asientos ya reservados dejan de estar retenidos
+    for detalle_data in reserva_data.detalles:
+        numeros = [p.asiento_numero for p in detalle_data.pasajeros if p.asiento_numero]
+        if numeros:
+            retenciones.liberar(detalle_data.instancia_vuelo_id, current_user.id, numeros)
+    
+    return reserva
+
+@router.post("/retenciones/{instancia_vuelo_id}", response_model=RetencionAsientosResponse)
+def retener_asientos(
+    instancia_vuelo_id: int,
+    retencion: RetencionAsientosRequest,
+    current_user: Usuario = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Retener temporalmente asientos de una instancia mientras se completa el checkout"""
+    numeros = list(dict.fromkeys(retencion.asientos))
+    if not numeros or len(numeros) > MAX_ASIENTOS_POR_RETENCION:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Se pueden retener entre 1 y {MAX_ASIENTOS_POR_RETENCION} asientos"
+        )
+    
+    instancia = db.query(InstanciaVuelo).filter(InstanciaVuelo.id == instancia_vuelo_id).first()
+    if not instancia:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Instancia de vuelo {instancia_vuelo_id} no encontrada"
+        )
     
+    inventario = estado_inventario(db, instancia, solo_lectura=True)
+    for numero in numeros:
+        posicion = inventario.disposicion.por_numero.get(numero)
+        if posicion is None or inventario.ocupado(posicion):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Asiento {numero} no disponible"
+            )
+    
+    conflictos = retenciones.retener(instancia.id, numeros, current_user.id, RETENCION_SEGUNDOS)
+    if conflictos:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Asientos retenidos por otro usuario: {', '.join(conflictos)}"
+        )
+    
+    return {
+        "instancia_vuelo_id": instancia.id,
+        "asientos": numeros,
+        "expira_en_segundos": RETENCION_SEGUNDOS
+    }
+
+@router.delete("/retenciones/{instancia_vuelo_id}")
+def liberar_retencion(
+    instancia_vuelo_id: int,
+    current_user: Usuario = Depends(get_current_active_user)
+):
+    """Liberar los asientos retenidos por el usuario en una instancia"""
+    liberados = retenciones.liberar(instancia_vuelo_id, current_user.id)
+    return {"message": "Retención liberada", "liberados": liberados}
+
+@router.post("/lista-espera", response_model=ListaEsperaResponse, status_code=status.HTTP_201_CREATED)
+def unirse_lista_espera(
+    solicitud: ListaEsperaCreate,
+    current_user: Usuario = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Anotar un grupo en la lista de espera de una clase agotada. Cuando se liberen
+    asientos se le crea una reserva PENDIENTE y se le notifica.
+    """
+    if not solicitud.pasajeros:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Debe indicar al menos un pasajero"
+        )
+    if solicitud.clase not in COLUMNAS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Clase debe ser una de: {', '.join(COLUMNAS)}"
+        )
+    instancia = db.query(InstanciaVuelo).filter(InstanciaVuelo.id == solicitud.instancia_vuelo_id).first()
+    if not instancia:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Instancia de vuelo {solicitud.instancia_vuelo_id} no encontrada"
+        )
+    if instancia.estado in ESTADOS_SIN_VENTA:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"El vuelo está {instancia.estado} y no admite lista de espera"
+        )
+    
+    entrada = ListaEspera(
+        usuario_id=current_user.id,
+        instancia_vuelo_id=instancia.id,
+        clase=solicitud.clase,
+        cantidad=len(solicitud.pasajeros),
+        pasajeros=[{"nombre": p.nombre, "apellido": p.apellido} for p in solicitud.pasajeros]
+    )
+    db.add(entrada)
+    db.flush()
+    # Si se liberaron asientos mientras tanto, el grupo se promueve ya (en su turno)
+    promover(db, instancia.id, solicitud.clase)
     db.commit()
-    db.refresh(reserva)
+    db.refresh(entrada)
     
-    return reserva
+    return entrada
+
+@router.get("/lista-espera", response_model=List[ListaEsperaResponse])
+def listar_lista_espera(
+    current_user: Usuario = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Obtener las entradas de lista de espera del usuario actual"""
+    return db.query(ListaEspera).filter(
+        ListaEspera.usuario_id == current_user.id
+    ).order_by(ListaEspera.id.desc()).all()
+
+@router.delete("/lista-espera/{lista_espera_id}")
+def salir_lista_espera(
+    lista_espera_id: int,
+    current_user: Usuario = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Salir de la lista de espera (solo mientras no se haya promovido)"""
+    canceladas = db.query(ListaEspera).filter(
+        ListaEspera.id == lista_espera_id,
+        ListaEspera.usuario_id == current_user.id,
+        ListaEspera.estado == "ESPERANDO"
+    ).update({"estado": "CANCELADA"}, synchronize_session=False)
+    if not canceladas:
+        existe = db.query(ListaEspera.estado).filter(
+            ListaEspera.id == lista_espera_id,
+            ListaEspera.usuario_id == current_user.id
+        ).first()
+        if not existe:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Entrada de lista de espera no encontrada"
+            )
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"La entrada ya está {existe.estado}"
+        )
+    db.commit()
+    
+    return {"message": "Salida de la lista de espera exitosa", "id": lista_espera_id}
 
 @router.get("/", response_model=List[ReservaResponse])
 def listar_reservas(
+    response: Response,
+    limite: int = Query(LIMITE_RESERVAS, ge=1, le=MAX_LIMITE_RESERVAS),
+    cursor: Optional[str] = None,
+    estado: Optional[str] = None,
     current_user: Usuario = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    """Obtener todas las reservas del usuario actual"""
-    reservas = db.query(Reserva).filter(
+    """
+    Obtener las reservas del usuario actual, de la más reciente a la más antigua.
+    Paginado por (fecha_reserva, id): si hay más, la cabecera X-Siguiente-Cursor trae
+    el cursor de la página siguiente. Opcionalmente filtra por estado.
+    """
+    consulta = db.query(Reserva).options(selectinload(Reserva.detalles)).filter(
         Reserva.usuario_id == current_user.id
-    ).order_by(Reserva.fecha_reserva.desc()).all()
+    )
+    if estado:
+        if estado not in ESTADOS_RESERVA:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Estado debe ser uno de: {', '.join(ESTADOS_RESERVA)}"
+            )
+        consulta = consulta.filter(Reserva.estado == estado)
+    if cursor:
+        consulta = consulta.filter(
+            tuple_(Reserva.fecha_reserva, Reserva.id) < _decodificar_cursor_reservas(cursor)
+        )
+    
+    reservas = consulta.order_by(Reserva.fecha_reserva.desc(), Reserva.id.desc()).limit(limite + 1).all()
+    if len(reservas) > limite:
+        reservas = reservas[:limite]
+        response.headers["X-Siguiente-Cursor"] = _codificar_cursor_reservas(reservas[-1])
     
     return reservas
 
@@ -180,53 +401,84 @@ def cancelar_reserva(
     db: Session = Depends(get_db)
 ):
     """Cancelar una reserva"""
-    reserva = db.query(Reserva).filter(
+    resultado = cancelar_reservas(
+        db,
         Reserva.codigo_reserva == codigo_reserva,
         Reserva.usuario_id == current_user.id
-    ).first()
+    )
+    if not resultado["reservas_canceladas"]:
+        # Nada que cancelar: o no existe o ya estaba cancelada
+        existe = db.query(Reserva.id).filter(
+            Reserva.codigo_reserva == codigo_reserva,
+            Reserva.usuario_id == current_user.id
+        ).first()
+        if not existe:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Reserva no encontrada"
+            )
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="La reserva ya está cancelada"
+        )
     
-    if not reserva:
+    db.commit()
+    
+    return {"message": "Reserva cancelada exitosamente", "codigo_reserva": codigo_reserva}
+
+@router.post("/instancias/{instancia_vuelo_id}/cancelar")
+def cancelar_reservas_instancia(
+    instancia_vuelo_id: int,
+    marcar_cancelada: bool = True,
+    current_user: Usuario = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Cancelar todas las reservas de una instancia de vuelo interrumpida (endpoint administrativo).
+    Las reservas con varios tramos se cancelan completas. Con marcar_cancelada la instancia
+    queda en estado CANCELADO, sale de las búsquedas y sus asientos no vuelven a la venta.
+    """
+    if marcar_cancelada:
+        actualizadas = db.query(InstanciaVuelo).filter(
+            InstanciaVuelo.id == instancia_vuelo_id
+        ).update({"estado": "CANCELADO"}, synchronize_session=False)
+    else:
+        actualizadas = db.query(InstanciaVuelo.id).filter(InstanciaVuelo.id == instancia_vuelo_id).count()
+    if not actualizadas:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="Reserva no encontrada"
+            detail="Instancia de vuelo no encontrada"
         )
     
-    if reserva.estado == "CANCELADA":
+    resultado = cancelar_reservas_de_instancia(db, instancia_vuelo_id, cerrada=marcar_cancelada)
+    if marcar_cancelada:
+        resultado["lista_espera_canceladas"] = cerrar_lista(db, instancia_vuelo_id)
+        marcar_instancia_modificada(db, instancia_vuelo_id)
+    db.commit()
+    print(f"🛑 Instancia {instancia_vuelo_id}: {resultado['reservas_canceladas']} reservas canceladas "
+          f"por {current_user.email}")
+    
+    return {"instancia_vuelo_id": instancia_vuelo_id, **resultado}
+
+def _validar_ventana_check_in(instancia: InstanciaVuelo, vuelo: Vuelo):
+    """Verificar ventana de check-in: 24 horas antes hasta 3 horas antes de la salida"""
+    fecha_vuelo = datetime.combine(instancia.fecha, vuelo.hora_salida)
+    ahora = datetime.now()
+    ventana_inicio = fecha_vuelo - timedelta(hours=24)
+    ventana_fin = fecha_vuelo - timedelta(hours=3)
+    
+    if ahora < ventana_inicio:
+        horas_faltantes = int((ventana_inicio - ahora).total_seconds() / 3600)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="La reserva ya está cancelada"
+            detail=f"El check-in estará disponible en {horas_faltantes} horas (24h antes del vuelo)"
         )
     
-    # Liberar asientos y actualizar disponibilidad
-    for detalle in reserva.detalles:
-        if detalle.asiento_id:
-            asiento = db.query(Asiento).filter(Asiento.id == detalle.asiento_id).first()
-            if asiento:
-                asiento.disponible = True
-        
-        # Actualizar disponibilidad en instancia de vuelo
-        instancia = detalle.instancia_vuelo
-        if detalle.clase == "ECONOMICA":
-            instancia.asientos_disponibles_economica += 1
-        elif detalle.clase == "EJECUTIVA":
-            instancia.asientos_disponibles_ejecutiva += 1
-        else:
-            instancia.asientos_disponibles_primera += 1
-
-        # Actualizar estado del billete asociado (si existe)
-        try:
-            billete = db.query(Billete).filter(Billete.detalle_reserva_id == detalle.id).first()
-            if billete:
-                billete.estado = "CANCELADO"
-                db.add(billete)
-        except Exception:
-            # No queremos que la cancelación de la reserva falle por un error al actualizar billetes
-            pass
-    
-    reserva.estado = "CANCELADA"
-    db.commit()
-    
-    return {"message": "Reserva cancelada exitosamente", "codigo_reserva": codigo_reserva}
+    if ahora > ventana_fin:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El check-in ya cerró. Debe realizarlo en el aeropuerto"
+        )
 
 @router.post("/check-in/{codigo_billete}")
 def hacer_check_in(
@@ -235,9 +487,6 @@ def hacer_check_in(
     db: Session = Depends(get_db)
 ):
     """Realizar check-in online para un billete (disponible 24-3 horas antes del vuelo)"""
-    from models import CheckIn
-    from datetime import datetime, timedelta
-    
     # Buscar el billete
     billete = db.query(Billete).join(
         DetalleReserva
@@ -274,26 +523,7 @@ def hacer_check_in(
     instancia = detalle.instancia_vuelo
     vuelo = instancia.vuelo
     
-    # Calcular fecha/hora del vuelo
-    fecha_vuelo = datetime.combine(instancia.fecha, vuelo.hora_salida)
-    ahora = datetime.now()
-    
-    # Verificar ventana de check-in: 24 horas antes hasta 3 horas antes
-    ventana_inicio = fecha_vuelo - timedelta(hours=24)
-    ventana_fin = fecha_vuelo - timedelta(hours=3)
-    
-    if ahora < ventana_inicio:
-        horas_faltantes = int((ventana_inicio - ahora).total_seconds() / 3600)
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"El check-in estará disponible en {horas_faltantes} horas (24h antes del vuelo)"
-        )
-    
-    if ahora > ventana_fin:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="El check-in ya cerró. Debe realizarlo en el aeropuerto"
-        )
+    _validar_ventana_check_in(instancia, vuelo)
     
     # Crear check-in
     check_in = CheckIn(
@@ -318,3 +548,118 @@ def hacer_check_in(
             "hora_salida": str(vuelo.hora_salida)
         }
     }
+
+@router.post("/{codigo_reserva}/check-in")
+def hacer_check_in_reserva(
+    codigo_reserva: str,
+    instancia_vuelo_id: Optional[int] = None,
+    current_user: Usuario = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Check-in online de todos los pasajeros de una reserva en un solo paso (24-3 horas antes
+    del vuelo). Con varios tramos se hace en los que tengan la ventana abierta, o solo en
+    instancia_vuelo_id si se indica. Los billetes no emitidos o ya registrados se omiten.
+    """
+    # Una consulta para billetes, pasajeros, vuelos, asientos y check-ins previos
+    consulta = db.query(
+        Billete, DetalleReserva, InstanciaVuelo, Vuelo, Asiento.numero_asiento, CheckIn.id
+    ).join(
+        DetalleReserva, Billete.detalle_reserva_id == DetalleReserva.id
+    ).join(
+        Reserva, DetalleReserva.reserva_id == Reserva.id
+    ).join(
+        InstanciaVuelo, DetalleReserva.instancia_vuelo_id == InstanciaVuelo.id
+    ).join(
+        Vuelo, InstanciaVuelo.vuelo_id == Vuelo.id
+    ).outerjoin(
+        Asiento, DetalleReserva.asiento_id == Asiento.id
+    ).outerjoin(
+        CheckIn, CheckIn.billete_id == Billete.id
+    ).filter(
+        Reserva.codigo_reserva == codigo_reserva,
+        Reserva.usuario_id == current_user.id
+    )
+    if instancia_vuelo_id is not None:
+        consulta = consulta.filter(DetalleReserva.instancia_vuelo_id == instancia_vuelo_id)
+    filas = consulta.order_by(InstanciaVuelo.fecha, Vuelo.hora_salida, DetalleReserva.id).all()
+    
+    if not filas:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Reserva no encontrada o sin billetes emitidos"
+        )
+    
+    # La ventana se valida una vez por tramo; si ninguno está abierto se informa el primero
+    abiertas = set()
+    primer_error = None
+    for _, _, instancia, vuelo, _, _ in filas:
+        if instancia.id in abiertas:
+            continue
+        try:
+            _validar_ventana_check_in(instancia, vuelo)
+            abiertas.add(instancia.id)
+        except HTTPException as e:
+            primer_error = primer_error or e
+    if not abiertas:
+        raise primer_error
+    
+    pendientes = []
+    omitidos = []
+    for billete, detalle, instancia, vuelo, asiento_numero, check_in_id in filas:
+        if instancia.id not in abiertas:
+            continue
+        if billete.estado != "EMITIDO":
+            omitidos.append({"billete_codigo": billete.codigo_billete, "motivo": f"Billete en estado {billete.estado}"})
+        elif check_in_id is not None:
+            omitidos.append({"billete_codigo": billete.codigo_billete, "motivo": "Ya se realizó check-in"})
+        else:
+            pendientes.append((billete, detalle, instancia, vuelo, asiento_numero))
+    
+    if not pendientes:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Ya se realizó check-in para todos los billetes de la reserva"
+        )
+    
+    # Todos los check-ins en un solo INSERT; uno concurrente para el mismo billete se ignora
+    registrados = {
+        billete_id: fecha
+        for billete_id, fecha in db.execute(
+            insert_ignorando_duplicados(db, CheckIn.__table__, ["billete_id"]).values([
+                {
+                    "billete_id": billete.id,
+                    "asiento_asignado": asiento_numero,
+                    "puerta_embarque": instancia.puerta
+                }
+                for billete, _, instancia, _, asiento_numero in pendientes
+            ]).returning(CheckIn.__table__.c.billete_id, CheckIn.__table__.c.fecha_check_in)
+        ).all()
+    }
+    
+    check_ins = []
+    for billete, detalle, instancia, vuelo, asiento_numero in pendientes:
+        if billete.id not in registrados:
+            omitidos.append({"billete_codigo": billete.codigo_billete, "motivo": "Ya se realizó check-in"})
+            continue
+        check_ins.append({
+            "billete_codigo": billete.codigo_billete,
+            "pasajero": f"{detalle.pasajero_nombre} {detalle.pasajero_apellido}",
+            "fecha_check_in": str(registrados[billete.id]),
+            "asiento": asiento_numero,
+            "puerta": instancia.puerta,
+            "vuelo": {
+                "numero": vuelo.numero_vuelo,
+                "fecha": str(instancia.fecha),
+                "hora_salida": str(vuelo.hora_salida)
+            }
+        })
+    db.commit()
+    
+    return {
+        "message": f"Check-in realizado para {len(check_ins)} pasajero(s)",
+        "codigo_reserva": codigo_reserva,
+        "check_ins": check_ins,
+        "omitidos": omitidos
+    }
+
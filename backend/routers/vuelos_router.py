@@ -1,20 +1,116 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_, or_
-from typing import List, Optional
+from sqlalchemy import and_, or_, func, tuple_
+from typing import List, Optional, Tuple
 from datetime import date, datetime, timedelta, time
+from decimal import Decimal
+import asyncio
+import base64
+import heapq
+import json
 
-from database import get_db
+from database import get_db, SessionLocal
+from indice_vuelos import indice_vuelos, VueloIndexado, TarifaIndexada
+from cache_busquedas import cache_busquedas
+from itinerarios import buscar_itinerarios, MAX_ESCALAS
+from inventario_asientos import estado_inventario, cambios_desde
+from cache_mapas_asientos import cache_mapas_asientos, calcular_etag
+from retenciones_asientos import retenciones
+from disponibilidad_asientos import ESTADOS_SIN_VENTA
+from difusion_asientos import difusion_asientos, LATIDO_SEGUNDOS
 from models import Vuelo, Ciudad, Aerolinea, InstanciaVuelo, Tarifa
 from schemas import (
     BusquedaVuelosRequest,
+    BusquedaCalendarioRequest,
+    DiaCalendario,
     VueloDisponible,
+    ItinerarioDisponible,
+    BusquedaLoteRequest,
+    ResultadoBusquedaLote,
     CiudadResponse,
     AerolineaResponse
 )
 
 router = APIRouter(prefix="/vuelos", tags=["Vuelos"])
 
+MAX_DIAS_CALENDARIO = 62
+MAX_LIMITE_BUSQUEDA = 200
+MAX_BUSQUEDAS_LOTE = 50
+
+def _columna_asientos(clase: str):
+    """Columna de InstanciaVuelo con los asientos disponibles de la clase"""
+    if clase == "ECONOMICA":
+        return InstanciaVuelo.asientos_disponibles_economica
+    elif clase == "EJECUTIVA":
+        return InstanciaVuelo.asientos_disponibles_ejecutiva
+    else:
+        return InstanciaVuelo.asientos_disponibles_primera
+
+def _en_venta(instancia: Optional[InstanciaVuelo]) -> bool:
+    """Las instancias canceladas o completadas no se ofrecen"""
+    return instancia is None or instancia.estado not in ESTADOS_SIN_VENTA
+
+def _asientos_disponibles(instancia: Optional[InstanciaVuelo], clase: str) -> int:
+    """Asientos disponibles de una instancia para la clase indicada (0 si ya no se vende)"""
+    if instancia and not _en_venta(instancia):
+        return 0
+    if instancia:
+        return getattr(instancia, _columna_asientos(clase).key)
+    # Valores por defecto si no hay instancia creada
+    return 150 if clase == "ECONOMICA" else 30
+
+def _coincide_horario(hora: int, horario_salida: Optional[str]) -> bool:
+    """Verificar si una hora de salida cae en la franja morning/afternoon/evening"""
+    if not horario_salida or horario_salida == 'all':
+        return True
+    if horario_salida == 'morning':
+        return 6 <= hora < 12
+    if horario_salida == 'afternoon':
+        return 12 <= hora < 18
+    if horario_salida == 'evening':
+        return 18 <= hora or hora < 6
+    return False
+
+def _clave_busqueda(busqueda: BusquedaVuelosRequest, clase: str, orden: str) -> tuple:
+    """Clave normalizada de una búsqueda para la caché de resultados"""
+    horario = busqueda.horario_salida if busqueda.horario_salida and busqueda.horario_salida != 'all' else None
+    return (
+        busqueda.origen,
+        busqueda.destino,
+        busqueda.fecha,
+        clase,
+        busqueda.aerolinea_codigo or None,
+        horario,
+        busqueda.precio_maximo or None,
+        orden,
+        busqueda.limite,
+        busqueda.cursor
+    )
+
+def _orden_por_horario(vuelo: VueloIndexado, tarifa: TarifaIndexada) -> tuple:
+    return (vuelo.hora_salida.isoformat(), vuelo.vuelo_id, tarifa.tarifa_id)
+
+def _orden_por_precio(vuelo: VueloIndexado, tarifa: TarifaIndexada) -> tuple:
+    return (tarifa.precio, vuelo.hora_salida.isoformat(), vuelo.vuelo_id, tarifa.tarifa_id)
+
+def _codificar_cursor(clave: tuple) -> str:
+    """Cursor opaco con la clave de orden de la última fila entregada"""
+    return base64.urlsafe_b64encode(json.dumps([str(v) for v in clave]).encode()).decode()
+
+def _decodificar_cursor(cursor: str, orden: str) -> tuple:
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if orden == "precio":
+            return (Decimal(valores[0]), valores[1], int(valores[2]), int(valores[3]))
+        return (valores[0], int(valores[1]), int(valores[2]))
+    except (ValueError, TypeError, IndexError, ArithmeticError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor de paginación inválido"
+        )
+
 @router.get("/ciudades", response_model=List[CiudadResponse])
 def listar_ciudades(db: Session = Depends(get_db)):
     """Obtener lista de todas las ciudades disponibles"""
@@ -27,28 +123,53 @@ def listar_aerolineas(db: Session = Depends(get_db)):
     aerolineas = db.query(Aerolinea).filter(Aerolinea.activa == True).all()
     return aerolineas
 
-@router.post("/buscar/horarios", response_model=List[VueloDisponible])
-def buscar_vuelos_por_horarios(
+class _PaginaBusqueda:
+    """Página de una búsqueda directa resuelta en memoria, pendiente de asientos"""
+    __slots__ = (
+        "busqueda", "clase", "ciudad_origen", "ciudad_destino", "filas",
+        "siguiente_cursor", "clave_cache", "marca_cache", "version_indice", "en_cache"
+    )
+
+def _instancias_por_vuelo_fecha(db: Session, pares) -> dict:
+    """Una sola consulta para las instancias de varios pares (vuelo_id, fecha)"""
+    instancias = {}
+    if pares:
+        for instancia in db.query(InstanciaVuelo).filter(
+            tuple_(InstanciaVuelo.vuelo_id, InstanciaVuelo.fecha).in_(list(pares))
+        ).all():
+            instancias[(instancia.vuelo_id, instancia.fecha)] = instancia
+    return instancias
+
+def _preparar_pagina(
     busqueda: BusquedaVuelosRequest,
-    db: Session = Depends(get_db)
-):
-    """Buscar vuelos por horarios entre dos ciudades"""
-    # DEBUG: Ver qué está llegando
-    print(f"\n{'='*60}")
-    print(f"🔍 BÚSQUEDA RECIBIDA:")
-    print(f"   Origen: {busqueda.origen}")
-    print(f"   Destino: {busqueda.destino}")
-    print(f"   Fecha: {busqueda.fecha} (tipo: {type(busqueda.fecha)})")
-    print(f"   Clase: {busqueda.clase}")
-    print(f"   Día de semana: {busqueda.fecha.weekday()} (0=Lunes, 6=Domingo)")
-    print(f"{'='*60}\n")
-    
-    # Obtener ciudades
-    ciudad_origen = db.query(Ciudad).filter(Ciudad.codigo_iata == busqueda.origen).first()
-    ciudad_destino = db.query(Ciudad).filter(Ciudad.codigo_iata == busqueda.destino).first()
-    
-    print(f"🏙️ Ciudad origen: {ciudad_origen.nombre if ciudad_origen else 'NO ENCONTRADA'}")
-    print(f"🏙️ Ciudad destino: {ciudad_destino.nombre if ciudad_destino else 'NO ENCONTRADA'}\n")
+    orden: str,
+    detalle: bool = True
+) -> _PaginaBusqueda:
+    """
+    Resolver desde el índice (ya sincronizado) la página de vuelos directos ordenada
+    por hora de salida ("horario") o por precio ("precio"), sin consultar asientos.
+    """
+    if detalle:
+        # DEBUG: Ver qué está llegando
+        print(f"\n{'='*60}")
+        print(f"🔍 BÚSQUEDA RECIBIDA:")
+        print(f"   Origen: {busqueda.origen}")
+        print(f"   Destino: {busqueda.destino}")
+        print(f"   Fecha: {busqueda.fecha} (tipo: {type(busqueda.fecha)})")
+        print(f"   Clase: {busqueda.clase}")
+        print(f"   Día de semana: {busqueda.fecha.weekday()} (0=Lunes, 6=Domingo)")
+        print(f"   Orden: {orden} | Límite: {busqueda.limite} | Cursor: {busqueda.cursor}")
+        print(f"{'='*60}\n")
+    
+    # Solo vuelos directos: solo_directos se ignora aquí, las escalas son de /vuelos/buscar/itinerarios
+    
+    # Resolver ciudades y vuelos de la ruta desde el índice en memoria
+    ciudad_origen = indice_vuelos.ciudad(busqueda.origen)
+    ciudad_destino = indice_vuelos.ciudad(busqueda.destino)
+    
+    if detalle:
+        print(f"🏙️ Ciudad origen: {ciudad_origen[1] if ciudad_origen else 'NO ENCONTRADA'}")
+        print(f"🏙️ Ciudad destino: {ciudad_destino[1] if ciudad_destino else 'NO ENCONTRADA'}\n")
     
     if not ciudad_origen or not ciudad_destino:
         raise HTTPException(
@@ -56,69 +177,72 @@ def buscar_vuelos_por_horarios(
             detail="Ciudad no encontrada"
         )
     
-    # Normalizar clase a mayúsculas
-    clase_normalizada = busqueda.clase.upper() if busqueda.clase else "ECONOMICA"
-    print(f"✈️ Clase normalizada: '{busqueda.clase}' → '{clase_normalizada}'\n")
-    
-    # Determinar día de la semana (0=Lunes, 6=Domingo)
-    dia_semana = busqueda.fecha.weekday()
-    
-    # Construir query base
-    query = db.query(Vuelo, Tarifa, InstanciaVuelo).join(
-        Tarifa, Vuelo.id == Tarifa.vuelo_id
-    ).outerjoin(
-        InstanciaVuelo,
-        and_(
-            InstanciaVuelo.vuelo_id == Vuelo.id,
-            InstanciaVuelo.fecha == busqueda.fecha
+    if busqueda.limite is not None and not 1 <= busqueda.limite <= MAX_LIMITE_BUSQUEDA:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"El límite debe estar entre 1 y {MAX_LIMITE_BUSQUEDA}"
         )
-    ).filter(
-        Vuelo.ciudad_origen_id == ciudad_origen.id,
-        Vuelo.ciudad_destino_id == ciudad_destino.id,
-        Vuelo.activo == True,
-        Tarifa.clase == clase_normalizada,
-        Tarifa.fecha_inicio <= busqueda.fecha,
-        or_(Tarifa.fecha_fin >= busqueda.fecha, Tarifa.fecha_fin == None)
-    )
-    
-    # Filtrar por aerolínea si se especifica
-    if busqueda.aerolinea_codigo:
-        query = query.join(Aerolinea).filter(Aerolinea.codigo_iata == busqueda.aerolinea_codigo)
     
-    resultados = query.all()
+    despues_de = _decodificar_cursor(busqueda.cursor, orden) if busqueda.cursor else None
     
-    print(f"📊 Resultados de la query inicial: {len(resultados)} registros\n")
+    # Normalizar clase a mayúsculas
+    clase_normalizada = busqueda.clase.upper() if busqueda.clase else "ECONOMICA"
+    if detalle:
+        print(f"✈️ Clase normalizada: '{busqueda.clase}' → '{clase_normalizada}'\n")
+    
+    pagina = _PaginaBusqueda()
+    pagina.busqueda = busqueda
+    pagina.clase = clase_normalizada
+    pagina.ciudad_origen = ciudad_origen
+    pagina.ciudad_destino = ciudad_destino
+    pagina.version_indice = indice_vuelos.version
+    pagina.clave_cache = None
+    pagina.en_cache = None
+    
+    # Consultar la caché (las búsquedas para hoy dependen de la hora actual y no se guardan)
+    if busqueda.fecha != date.today():
+        pagina.clave_cache = _clave_busqueda(busqueda, clase_normalizada, orden)
+        pagina.en_cache = cache_busquedas.obtener(pagina.clave_cache, pagina.version_indice)
+        if pagina.en_cache is not None:
+            if detalle:
+                print(f"⚡ Resultado servido desde caché: {len(pagina.en_cache[0])} vuelos\n")
+            return pagina
+    pagina.marca_cache = cache_busquedas.marca()
+    
+    # Solo los vuelos que operan ese día de la semana (0=Lunes, 6=Domingo)
+    vuelos_ruta = indice_vuelos.vuelos_ruta(busqueda.origen, busqueda.destino)
+    vuelos_del_dia = indice_vuelos.vuelos_ruta(busqueda.origen, busqueda.destino, busqueda.fecha.weekday())
     
     # Obtener hora actual para filtrar vuelos si es para hoy
     hora_actual = datetime.now().time()
     es_hoy = busqueda.fecha == date.today()
     margen_minutos = 30  # Minutos mínimos antes del vuelo para poder reservar
     
-    print(f"⏰ Es para hoy: {es_hoy}")
-    if es_hoy:
-        print(f"⏰ Hora actual: {hora_actual}")
-        print(f"⏰ Margen de minutos: {margen_minutos}\n")
+    if detalle:
+        print(f"⏰ Es para hoy: {es_hoy}")
+        if es_hoy:
+            print(f"⏰ Hora actual: {hora_actual}")
+            print(f"⏰ Margen de minutos: {margen_minutos}\n")
+    
+    precio_maximo = Decimal(str(busqueda.precio_maximo)) if busqueda.precio_maximo else None
+    clave_orden = _orden_por_precio if orden == "precio" else _orden_por_horario
     
-    # Filtrar por día de operación y formatear resultados
-    vuelos_disponibles = []
-    vuelos_filtrados_por_dia = 0
+    # Aplicar todos los filtros sobre el índice antes de tocar la base de datos
+    candidatos = []
+    vuelos_filtrados_por_dia = len(vuelos_ruta) - len(vuelos_del_dia)
     vuelos_filtrados_por_hora = 0
+    vuelos_filtrados_horario = 0
+    vuelos_filtrados_precio = 0
     
-    for vuelo, tarifa, instancia in resultados:
-        # Verificar si el vuelo opera ese día
-        if vuelo.dias_operacion[dia_semana] == '0':
-            vuelos_filtrados_por_dia += 1
+    for vuelo in vuelos_del_dia:
+        # Filtrar por aerolínea si se especifica
+        if busqueda.aerolinea_codigo and vuelo.aerolinea_codigo != busqueda.aerolinea_codigo:
             continue
         
         # Si es para hoy, verificar que el vuelo aún no haya salido
         if es_hoy:
-            # Convertir hora de salida del vuelo a datetime para comparación
-            hora_salida = vuelo.hora_salida
-            if isinstance(hora_salida, str):
-                hora_salida = datetime.strptime(hora_salida, "%H:%M").time()
-            
             # Calcular hora límite de reserva (hora_salida - margen_minutos)
-            hora_salida_dt = datetime.combine(date.today(), hora_salida)
+            hora_salida_dt = datetime.combine(date.today(), vuelo.hora_salida)
             hora_limite_reserva = (hora_salida_dt - timedelta(minutes=margen_minutos)).time()
             
             # Si ya pasó la hora límite, no mostrar este vuelo
@@ -126,95 +250,340 @@ def buscar_vuelos_por_horarios(
                 vuelos_filtrados_por_hora += 1
                 continue
         
-        # Determinar asientos disponibles
-        if instancia:
-            if clase_normalizada == "ECONOMICA":
-                asientos_disp = instancia.asientos_disponibles_economica
-            elif clase_normalizada == "EJECUTIVA":
-                asientos_disp = instancia.asientos_disponibles_ejecutiva
-            else:
-                asientos_disp = instancia.asientos_disponibles_primera
-        else:
-            # Valores por defecto si no hay instancia creada
-            asientos_disp = 150 if clase_normalizada == "ECONOMICA" else 30
+        # Filtrar por horario de salida si se especifica
+        if not _coincide_horario(vuelo.hora_salida.hour, busqueda.horario_salida):
+            vuelos_filtrados_horario += 1
+            continue
+        
+        for tarifa in vuelo.tarifas_vigentes(clase_normalizada, busqueda.fecha):
+            # Filtrar por precio máximo si se especifica
+            if precio_maximo is not None and tarifa.precio > precio_maximo:
+                vuelos_filtrados_precio += 1
+                continue
+            
+            # Paginación por cursor: solo lo que viene después de la última fila entregada
+            if despues_de is not None and clave_orden(vuelo, tarifa) <= despues_de:
+                continue
+            
+            candidatos.append((vuelo, tarifa))
+    
+    # Top-K en lugar de ordenar todo el resultado
+    if busqueda.limite:
+        filas = heapq.nsmallest(busqueda.limite + 1, candidatos, key=lambda c: clave_orden(*c))
+        hay_mas = len(filas) > busqueda.limite
+        filas = filas[:busqueda.limite]
+    else:
+        filas = sorted(candidatos, key=lambda c: clave_orden(*c))
+        hay_mas = False
+    
+    pagina.filas = filas
+    pagina.siguiente_cursor = _codificar_cursor(clave_orden(*filas[-1])) if hay_mas else None
+    
+    if detalle:
+        print(f"📈 RESUMEN:")
+        print(f"   Vuelos de la ruta: {len(vuelos_ruta)}")
+        print(f"   Filtrados por día: {vuelos_filtrados_por_dia}")
+        print(f"   Filtrados por hora reserva: {vuelos_filtrados_por_hora}")
+        print(f"   Filtrados por horario salida: {vuelos_filtrados_horario}")
+        print(f"   Filtrados por precio: {vuelos_filtrados_precio}")
+        print(f"   ✅ Vuelos en esta página: {len(filas)} (hay más: {hay_mas})")
+        print(f"{'='*60}\n")
+    
+    return pagina
+
+def _completar_pagina(pagina: _PaginaBusqueda, instancias: dict) -> Tuple[Tuple[VueloDisponible, ...], Optional[str]]:
+    """Armar la respuesta con los asientos de cada instancia y guardarla en la caché"""
+    busqueda = pagina.busqueda
+    vuelos_disponibles = []
+    for vuelo, tarifa in pagina.filas:
+        instancia = instancias.get((vuelo.vuelo_id, busqueda.fecha))
+        if not _en_venta(instancia):
+            continue
         
         vuelos_disponibles.append(VueloDisponible(
-            vuelo_id=vuelo.id,
+            vuelo_id=vuelo.vuelo_id,
             instancia_vuelo_id=instancia.id if instancia else None,
             numero_vuelo=vuelo.numero_vuelo,
-            aerolinea=vuelo.aerolinea.nombre,
-            origen=f"{ciudad_origen.nombre} ({ciudad_origen.codigo_iata})",
-            destino=f"{ciudad_destino.nombre} ({ciudad_destino.codigo_iata})",
+            aerolinea=vuelo.aerolinea,
+            origen=f"{pagina.ciudad_origen[1]} ({busqueda.origen})",
+            destino=f"{pagina.ciudad_destino[1]} ({busqueda.destino})",
             fecha=busqueda.fecha,
             hora_salida=str(vuelo.hora_salida),
             hora_llegada=str(vuelo.hora_llegada),
             duracion_minutos=vuelo.duracion_minutos,
-            clase=clase_normalizada,
+            clase=pagina.clase,
             precio=tarifa.precio,
-            asientos_disponibles=asientos_disp
+            asientos_disponibles=_asientos_disponibles(instancia, pagina.clase)
         ))
     
-    # Ordenar por hora de salida
-    vuelos_disponibles.sort(key=lambda x: x.hora_salida)
-    
-    # Filtrar por horario de salida si se especifica
-    vuelos_filtrados_horario = 0
-    if busqueda.horario_salida and busqueda.horario_salida != 'all':
-        vuelos_temp = []
-        for v in vuelos_disponibles:
-            hora_parts = v.hora_salida.split(':')
-            hora = int(hora_parts[0])
-            
-            incluir = False
-            if busqueda.horario_salida == 'morning' and 6 <= hora < 12:
-                incluir = True
-            elif busqueda.horario_salida == 'afternoon' and 12 <= hora < 18:
-                incluir = True
-            elif busqueda.horario_salida == 'evening' and (18 <= hora or hora < 6):
-                incluir = True
-            
-            if incluir:
-                vuelos_temp.append(v)
-            else:
-                vuelos_filtrados_horario += 1
-        
-        vuelos_disponibles = vuelos_temp
+    resultado = (tuple(vuelos_disponibles), pagina.siguiente_cursor)
+    if pagina.clave_cache is not None:
+        cache_busquedas.guardar(
+            pagina.clave_cache,
+            resultado,
+            [v.instancia_vuelo_id for v in vuelos_disponibles],
+            pagina.marca_cache,
+            pagina.version_indice,
+            tamano=sum(len(v.model_dump_json()) for v in vuelos_disponibles) + 256
+        )
     
-    # Filtrar por precio máximo si se especifica
-    vuelos_filtrados_precio = 0
-    if busqueda.precio_maximo:
-        vuelos_temp = []
-        for v in vuelos_disponibles:
-            if float(v.precio) <= busqueda.precio_maximo:
-                vuelos_temp.append(v)
-            else:
-                vuelos_filtrados_precio += 1
-        
-        vuelos_disponibles = vuelos_temp
-    
-    print(f"📈 RESUMEN:")
-    print(f"   Query inicial: {len(resultados)} resultados")
-    print(f"   Filtrados por día: {vuelos_filtrados_por_dia}")
-    print(f"   Filtrados por hora reserva: {vuelos_filtrados_por_hora}")
-    print(f"   Filtrados por horario salida: {vuelos_filtrados_horario}")
-    print(f"   Filtrados por precio: {vuelos_filtrados_precio}")
-    print(f"   ✅ Vuelos disponibles finales: {len(vuelos_disponibles)}")
-    print(f"{'='*60}\n")
-    
-    return vuelos_disponibles
+    return resultado
+
+def _buscar_vuelos_directos(
+    busqueda: BusquedaVuelosRequest,
+    db: Session,
+    orden: str
+) -> Tuple[Tuple[VueloDisponible, ...], Optional[str]]:
+    """
+    Buscar vuelos directos ordenados por hora de salida ("horario") o por precio ("precio").
+    Devuelve la página solicitada y el cursor de la siguiente (None si no hay más).
+    """
+    indice_vuelos.sincronizar(db)
+    pagina = _preparar_pagina(busqueda, orden)
+    if pagina.en_cache is not None:
+        return pagina.en_cache
+    
+    # Única consulta a la base de datos: asientos disponibles de las instancias de la página
+    instancias = _instancias_por_vuelo_fecha(db, {(vuelo.vuelo_id, busqueda.fecha) for vuelo, _ in pagina.filas})
+    return _completar_pagina(pagina, instancias)
+
+@router.post("/buscar/horarios", response_model=List[VueloDisponible])
+def buscar_vuelos_por_horarios(
+    busqueda: BusquedaVuelosRequest,
+    response: Response,
+    db: Session = Depends(get_db)
+):
+    """Buscar vuelos por horarios entre dos ciudades (paginado con limite/cursor)"""
+    vuelos, siguiente_cursor = _buscar_vuelos_directos(busqueda, db, orden="horario")
+    if siguiente_cursor:
+        response.headers["X-Siguiente-Cursor"] = siguiente_cursor
+    return list(vuelos)
 
 @router.post("/buscar/tarifas", response_model=List[VueloDisponible])
 def buscar_vuelos_por_tarifas(
     busqueda: BusquedaVuelosRequest,
+    response: Response,
+    db: Session = Depends(get_db)
+):
+    """Buscar vuelos ordenados por precio (tarifa) entre dos ciudades (paginado con limite/cursor)"""
+    vuelos, siguiente_cursor = _buscar_vuelos_directos(busqueda, db, orden="precio")
+    if siguiente_cursor:
+        response.headers["X-Siguiente-Cursor"] = siguiente_cursor
+    return list(vuelos)
+
+@router.post("/buscar/lote", response_model=List[ResultadoBusquedaLote])
+def buscar_vuelos_en_lote(
+    lote: BusquedaLoteRequest,
+    db: Session = Depends(get_db)
+):
+    """Resolver varias búsquedas de vuelos directos con una sola consulta de asientos"""
+    if not 1 <= len(lote.busquedas) <= MAX_BUSQUEDAS_LOTE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"El lote debe tener entre 1 y {MAX_BUSQUEDAS_LOTE} búsquedas"
+        )
+    if lote.orden not in ("horario", "precio"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El orden debe ser 'horario' o 'precio'"
+        )
+    
+    indice_vuelos.sincronizar(db)
+    
+    # Fase en memoria: filtros, orden y paginación de cada búsqueda sobre el índice
+    paginas = {}
+    errores = {}
+    for i, busqueda in enumerate(lote.busquedas):
+        try:
+            paginas[i] = _preparar_pagina(busqueda, lote.orden, detalle=False)
+        except HTTPException as e:
+            errores[i] = e.detail
+    
+    # Una sola consulta para las instancias de todas las páginas que no están en caché
+    pendientes = [p for p in paginas.values() if p.en_cache is None]
+    instancias = _instancias_por_vuelo_fecha(
+        db, {(vuelo.vuelo_id, p.busqueda.fecha) for p in pendientes for vuelo, _ in p.filas}
+    )
+    
+    resultados = []
+    for i in range(len(lote.busquedas)):
+        if i in errores:
+            resultados.append(ResultadoBusquedaLote(indice=i, error=errores[i]))
+            continue
+        pagina = paginas[i]
+        vuelos, siguiente_cursor = pagina.en_cache if pagina.en_cache is not None else _completar_pagina(pagina, instancias)
+        resultados.append(ResultadoBusquedaLote(indice=i, vuelos=list(vuelos), siguiente_cursor=siguiente_cursor))
+    
+    print(f"📦 Búsqueda en lote: {len(lote.busquedas)} búsquedas, {len(pendientes)} fuera de caché, {len(errores)} con error")
+    return resultados
+
+@router.post("/buscar/itinerarios", response_model=List[ItinerarioDisponible])
+def buscar_itinerarios_con_conexiones(
+    busqueda: BusquedaVuelosRequest,
+    db: Session = Depends(get_db)
+):
+    """Buscar itinerarios directos y, si solo_directos=False, con 1 o 2 escalas"""
+    indice_vuelos.sincronizar(db)
+    if not indice_vuelos.ciudad(busqueda.origen) or not indice_vuelos.ciudad(busqueda.destino):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Ciudad no encontrada"
+        )
+    
+    clase_normalizada = busqueda.clase.upper() if busqueda.clase else "ECONOMICA"
+    
+    # Si es para hoy, solo itinerarios cuyo primer vuelo sale en 30 minutos o más
+    salida_minima = None
+    if busqueda.fecha == date.today():
+        salida_minima = datetime.now() + timedelta(minutes=30)
+    
+    itinerarios = buscar_itinerarios(
+        busqueda.origen,
+        busqueda.destino,
+        busqueda.fecha,
+        clase_normalizada,
+        max_escalas=0 if busqueda.solo_directos else MAX_ESCALAS,
+        aerolinea_codigo=busqueda.aerolinea_codigo,
+        salida_minima=salida_minima
+    )
+    itinerarios = [
+        i for i in itinerarios
+        if _coincide_horario(i.tramos[0].salida.hour, busqueda.horario_salida)
+        and (not busqueda.precio_maximo or float(i.precio_total) <= busqueda.precio_maximo)
+    ]
+    
+    # Una sola consulta para las instancias de todos los tramos
+    instancias = _instancias_por_vuelo_fecha(
+        db, {(t.vuelo.vuelo_id, t.salida.date()) for i in itinerarios for t in i.tramos}
+    )
+    
+    resultado = []
+    for itinerario in itinerarios:
+        segmentos = []
+        for tramo in itinerario.tramos:
+            vuelo = tramo.vuelo
+            instancia = instancias.get((vuelo.vuelo_id, tramo.salida.date()))
+            segmentos.append(VueloDisponible(
+                vuelo_id=vuelo.vuelo_id,
+                instancia_vuelo_id=instancia.id if instancia else None,
+                numero_vuelo=vuelo.numero_vuelo,
+                aerolinea=vuelo.aerolinea,
+                origen=f"{indice_vuelos.ciudad(vuelo.origen)[1]} ({vuelo.origen})",
+                destino=f"{indice_vuelos.ciudad(vuelo.destino)[1]} ({vuelo.destino})",
+                fecha=tramo.salida.date(),
+                hora_salida=str(vuelo.hora_salida),
+                hora_llegada=str(vuelo.hora_llegada),
+                duracion_minutos=vuelo.duracion_minutos,
+                clase=clase_normalizada,
+                precio=tramo.tarifa.precio,
+                asientos_disponibles=_asientos_disponibles(instancia, clase_normalizada)
+            ))
+        
+        asientos_disp = min(s.asientos_disponibles for s in segmentos)
+        if asientos_disp <= 0:
+            continue
+        
+        resultado.append(ItinerarioDisponible(
+            escalas=itinerario.escalas,
+            salida=itinerario.tramos[0].salida,
+            llegada=itinerario.tramos[-1].llegada,
+            duracion_total_minutos=itinerario.duracion_minutos,
+            precio_total=itinerario.precio_total,
+            asientos_disponibles=asientos_disp,
+            segmentos=segmentos
+        ))
+    
+    return resultado
+
+@router.post("/buscar/calendario", response_model=List[DiaCalendario])
+def buscar_calendario_tarifas(
+    busqueda: BusquedaCalendarioRequest,
     db: Session = Depends(get_db)
 ):
-    """Buscar vuelos ordenados por precio (tarifa) entre dos ciudades"""
-    vuelos = buscar_vuelos_por_horarios(busqueda, db)
+    """Tarifa más baja y asientos disponibles por día en una ventana de fechas"""
+    indice_vuelos.sincronizar(db)
+    ciudad_origen = indice_vuelos.ciudad(busqueda.origen)
+    ciudad_destino = indice_vuelos.ciudad(busqueda.destino)
+    
+    if not ciudad_origen or not ciudad_destino:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Ciudad no encontrada"
+        )
+    
+    if busqueda.dias_antes < 0 or busqueda.dias_despues < 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="dias_antes y dias_despues no pueden ser negativos"
+        )
     
-    # Ordenar por precio
-    vuelos.sort(key=lambda x: x.precio)
+    if busqueda.dias_antes + busqueda.dias_despues + 1 > MAX_DIAS_CALENDARIO:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"La ventana no puede superar {MAX_DIAS_CALENDARIO} días"
+        )
     
-    return vuelos
+    clase_normalizada = busqueda.clase.upper() if busqueda.clase else "ECONOMICA"
+    desde = max(busqueda.fecha - timedelta(days=busqueda.dias_antes), date.today())
+    hasta = busqueda.fecha + timedelta(days=busqueda.dias_despues)
+    if desde > hasta:
+        return []
+    
+    columna = _columna_asientos(clase_normalizada)
+    
+    # Tarifa vigente más baja de cada instancia con asientos en la ventana
+    por_instancia = db.query(
+        InstanciaVuelo.id.label("instancia_id"),
+        InstanciaVuelo.fecha.label("fecha"),
+        columna.label("asientos"),
+        func.min(Tarifa.precio).label("precio")
+    ).join(
+        Vuelo, Vuelo.id == InstanciaVuelo.vuelo_id
+    ).join(
+        Tarifa,
+        and_(
+            Tarifa.vuelo_id == Vuelo.id,
+            Tarifa.clase == clase_normalizada,
+            Tarifa.fecha_inicio <= InstanciaVuelo.fecha,
+            or_(Tarifa.fecha_fin >= InstanciaVuelo.fecha, Tarifa.fecha_fin == None)
+        )
+    ).filter(
+        Vuelo.ciudad_origen_id == ciudad_origen[0],
+        Vuelo.ciudad_destino_id == ciudad_destino[0],
+        Vuelo.activo == True,
+        InstanciaVuelo.fecha.between(desde, hasta),
+        or_(InstanciaVuelo.estado == None, InstanciaVuelo.estado.notin_(ESTADOS_SIN_VENTA)),
+        columna > 0
+    ).group_by(
+        InstanciaVuelo.id, InstanciaVuelo.fecha, columna
+    ).subquery()
+    
+    # Agregado por día en la misma consulta
+    filas = db.query(
+        por_instancia.c.fecha,
+        func.min(por_instancia.c.precio),
+        func.sum(por_instancia.c.asientos),
+        func.count(por_instancia.c.instancia_id)
+    ).group_by(por_instancia.c.fecha).all()
+    
+    por_fecha = {fila[0]: fila for fila in filas}
+    
+    calendario = []
+    dia = desde
+    while dia <= hasta:
+        fila = por_fecha.get(dia)
+        if fila:
+            calendario.append(DiaCalendario(
+                fecha=dia,
+                precio_minimo=fila[1],
+                asientos_disponibles=int(fila[2]),
+                vuelos=fila[3]
+            ))
+        else:
+            calendario.append(DiaCalendario(fecha=dia))
+        dia += timedelta(days=1)
+    
+    return calendario
 
 @router.get("/informacion/{numero_vuelo}")
 def obtener_informacion_vuelo(
@@ -282,15 +651,46 @@ def obtener_informacion_vuelo(
     
     return response
 
+def _cabeceras_mapa(etag: str) -> dict:
+    # no-cache: el cliente puede guardar la respuesta pero debe revalidarla con If-None-Match
+    return {"ETag": etag, "Cache-Control": "no-cache"}
+
 @router.get("/asientos/{vuelo_id}/{fecha}")
 def obtener_mapa_asientos(
     vuelo_id: int,
     fecha: date,
+    request: Request,
+    response: Response,
     clase: Optional[str] = Query(None, description="Filtrar por clase: ECONOMICA, EJECUTIVA, PRIMERA"),
+    desde_version: Optional[int] = Query(None, alias="since", ge=0, description="Solo los asientos que cambiaron desde esta versión"),
     db: Session = Depends(get_db)
 ):
-    """Obtener mapa de asientos disponibles para un vuelo en una fecha específica"""
-    from models import Asiento, DetalleReserva, Reserva
+    """
+    Obtener mapa de asientos disponibles para un vuelo en una fecha específica (con ETag).
+    Con ?since=<version> devuelve solo los asientos que cambiaron desde esa versión
+    (delta=true), o el mapa completo si el historial ya no la cubre.
+    """
+    # Normalizar clase si se proporciona
+    clase_filtro = None
+    if clase:
+        clase_normalizada = clase.upper().strip().replace('_', ' ').replace('-', ' ')
+        # Mapear variantes de nombre
+        if clase_normalizada in ["ECONOMICA", "ECONÓMICA", "ECONOMY", "ECONOMÍA"]:
+            clase_filtro = "ECONOMICA"
+        elif clase_normalizada in ["EJECUTIVA", "BUSINESS", "BUSSINESS", "CLASE EJECUTIVA"]:
+            clase_filtro = "EJECUTIVA"
+        elif clase_normalizada in ["PRIMERA", "PRIMERA CLASE", "PRIMERACLASE", "FIRST", "FIRST CLASS"]:
+            clase_filtro = "PRIMERA"
+    
+    # Responder desde la caché si nada cambió (304 si el cliente ya tiene esta versión)
+    en_cache = cache_mapas_asientos.obtener(vuelo_id, fecha, clase_filtro) if desde_version is None else None
+    if en_cache is not None:
+        if request.headers.get("if-none-match") == en_cache.etag:
+            cache_mapas_asientos.registrar_no_modificado()
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=_cabeceras_mapa(en_cache.etag))
+        response.headers.update(_cabeceras_mapa(en_cache.etag))
+        return en_cache.respuesta
+    marca_cache = cache_mapas_asientos.marca()
     
     # Verificar que el vuelo existe y cargar las relaciones necesarias
     vuelo = db.query(Vuelo).options(
@@ -316,205 +716,58 @@ def obtener_mapa_asientos(
             detail="No hay vuelos programados para esta fecha"
         )
     
-    # Obtener todos los asientos del vuelo
-    asientos = db.query(Asiento).filter(Asiento.vuelo_id == vuelo_id).order_by(
-        Asiento.numero_asiento
-    ).all()
-    
-    # Obtener capacidades configuradas en la instancia
-    cap_primera = instancia.asientos_disponibles_primera if instancia.asientos_disponibles_primera else 0
-    cap_ejecutiva = instancia.asientos_disponibles_ejecutiva if instancia.asientos_disponibles_ejecutiva else 30
-    cap_economica = instancia.asientos_disponibles_economica if instancia.asientos_disponibles_economica else 120
-    
-    # Calcular asientos existentes por clase
-    if asientos:
-        asientos_por_clase = {
-            'PRIMERA': len([a for a in asientos if a.clase == 'PRIMERA']),
-            'EJECUTIVA': len([a for a in asientos if a.clase == 'EJECUTIVA']),
-            'ECONOMICA': len([a for a in asientos if a.clase == 'ECONOMICA'])
-        }
-        
-        # Verificar si coinciden con la configuración de la instancia
-        if (asientos_por_clase['PRIMERA'] != cap_primera or 
-            asientos_por_clase['EJECUTIVA'] != cap_ejecutiva or 
-            asientos_por_clase['ECONOMICA'] != cap_economica):
-            
-            print(f"⚠️ Capacidad no coincide para vuelo {vuelo_id}.")
-            print(f"   Existente - P:{asientos_por_clase['PRIMERA']} E:{asientos_por_clase['EJECUTIVA']} Ec:{asientos_por_clase['ECONOMICA']}")
-            print(f"   Esperado  - P:{cap_primera} E:{cap_ejecutiva} Ec:{cap_economica}")
-            
-            # Primero, liberar asientos de reservas canceladas
-            from models import DetalleReserva, Reserva
-            
-            # Encontrar detalles de reservas canceladas que tienen asientos asignados
-            detalles_cancelados = db.query(DetalleReserva).join(
-                Reserva
-            ).filter(
-                Reserva.estado == "CANCELADA",
-                DetalleReserva.asiento_id.isnot(None)
-            ).all()
-            
-            # Liberar esos asientos
-            for detalle in detalles_cancelados:
-                detalle.asiento_id = None
-            
-            db.commit()
-            print(f"   🔓 Liberados asientos de {len(detalles_cancelados)} reservas canceladas")
-            
-            # Ahora eliminar asientos que NO están asignados a reservas activas
-            asientos_sin_usar = db.query(Asiento).filter(
-                Asiento.vuelo_id == vuelo_id,
-                Asiento.disponible == True
-            ).all()
-            
-            # Borrar solo los asientos sin usar
-            for asiento in asientos_sin_usar:
-                db.delete(asiento)
-            
-            db.commit()
-            print(f"   ✅ Eliminados {len(asientos_sin_usar)} asientos disponibles")
-            
-            # Recargar asientos actuales
-            asientos = db.query(Asiento).filter(Asiento.vuelo_id == vuelo_id).all()
-    
-    # Verificar cuántos asientos faltan por crear
-    asientos_por_clase_actuales = {
-        'PRIMERA': len([a for a in asientos if a.clase == 'PRIMERA']),
-        'EJECUTIVA': len([a for a in asientos if a.clase == 'EJECUTIVA']),
-        'ECONOMICA': len([a for a in asientos if a.clase == 'ECONOMICA'])
-    }
-    
-    asientos_faltantes = {
-        'PRIMERA': cap_primera - asientos_por_clase_actuales['PRIMERA'],
-        'EJECUTIVA': cap_ejecutiva - asientos_por_clase_actuales['EJECUTIVA'],
-        'ECONOMICA': cap_economica - asientos_por_clase_actuales['ECONOMICA']
-    }
+    # Disposición del vuelo (en memoria) y ocupación de la instancia (una sola fila).
+    # Solo lectura: los asientos se crean en aprovisionamiento_asientos.
+    inventario = estado_inventario(db, instancia, solo_lectura=True)
+    asientos = sorted(inventario.disposicion.asientos, key=lambda a: a[1])
     
-    # Si faltan asientos, generarlos
-    if any(cant > 0 for cant in asientos_faltantes.values()):
-        print(f"🔧 Generando asientos faltantes para vuelo {vuelo_id}...")
-        print(f"   Faltan - P:{asientos_faltantes['PRIMERA']} E:{asientos_faltantes['EJECUTIVA']} Ec:{asientos_faltantes['ECONOMICA']}")
-        
-        asientos_a_crear = []
-        letras = ['A', 'B', 'C', 'D', 'E', 'F']
-        
-        # Obtener el número de fila más alto existente
-        numeros_existentes = [a.numero_asiento for a in asientos]
-        fila_actual = 1
-        if numeros_existentes:
-            # Extraer números de fila de los asientos existentes
-            filas_existentes = []
-            for num in numeros_existentes:
-                try:
-                    fila = int(''.join(filter(str.isdigit, num)))
-                    filas_existentes.append(fila)
-                except:
-                    pass
-            if filas_existentes:
-                fila_actual = max(filas_existentes) + 1
-        
-        # Primera Clase
-        asientos_primera_necesarios = asientos_faltantes['PRIMERA']
-        while asientos_primera_necesarios > 0:
-            for letra in letras:
-                if asientos_primera_necesarios <= 0:
-                    break
-                asientos_a_crear.append(
-                    Asiento(
-                        vuelo_id=vuelo_id,
-                        numero_asiento=f"{fila_actual}{letra}",
-                        clase="PRIMERA"
-                    )
-                )
-                asientos_primera_necesarios -= 1
-            fila_actual += 1
-        
-        # Ejecutiva
-        asientos_ejecutiva_necesarios = asientos_faltantes['EJECUTIVA']
-        while asientos_ejecutiva_necesarios > 0:
-            for letra in letras:
-                if asientos_ejecutiva_necesarios <= 0:
-                    break
-                asientos_a_crear.append(
-                    Asiento(
-                        vuelo_id=vuelo_id,
-                        numero_asiento=f"{fila_actual}{letra}",
-                        clase="EJECUTIVA"
-                    )
-                )
-                asientos_ejecutiva_necesarios -= 1
-            fila_actual += 1
-        
-        # Económica
-        asientos_economica_necesarios = asientos_faltantes['ECONOMICA']
-        while asientos_economica_necesarios > 0:
-            for letra in letras:
-                if asientos_economica_necesarios <= 0:
-                    break
-                asientos_a_crear.append(
-                    Asiento(
-                        vuelo_id=vuelo_id,
-                        numero_asiento=f"{fila_actual}{letra}",
-                        clase="ECONOMICA"
-                    )
-                )
-                asientos_economica_necesarios -= 1
-            fila_actual += 1
-        
-        # Insertar todos los asientos faltantes
-        if asientos_a_crear:
-            db.add_all(asientos_a_crear)
-            db.commit()
-            print(f"✅ Creados {len(asientos_a_crear)} asientos faltantes")
-        
-        # Recargar asientos
-        asientos = db.query(Asiento).filter(Asiento.vuelo_id == vuelo_id).order_by(
-            Asiento.numero_asiento
-        ).all()
-    
-    # Obtener asientos ocupados (reservados y pagados para esta fecha)
-    asientos_ocupados = db.query(Asiento.numero_asiento).join(
-        DetalleReserva, DetalleReserva.asiento_id == Asiento.id
-    ).join(
-        Reserva, Reserva.id == DetalleReserva.reserva_id
-    ).filter(
-        Asiento.vuelo_id == vuelo_id,
-        DetalleReserva.instancia_vuelo_id == instancia.id,
-        or_(Reserva.estado == "CONFIRMADA", Reserva.estado == "PAGADA")
-    ).all()
+    # Los asientos retenidos por otro checkout tampoco están disponibles
+    retenidos = retenciones.retenidos(instancia.id)
     
-    asientos_ocupados_set = {a[0] for a in asientos_ocupados}
-    
-    # Normalizar clase si se proporciona
-    clase_filtro = None
-    if clase:
-        clase_normalizada = clase.upper().strip().replace('_', ' ').replace('-', ' ')
-        # Mapear variantes de nombre
-        if clase_normalizada in ["ECONOMICA", "ECONÓMICA", "ECONOMY", "ECONOMÍA"]:
-            clase_filtro = "ECONOMICA"
-        elif clase_normalizada in ["EJECUTIVA", "BUSINESS", "BUSSINESS", "CLASE EJECUTIVA"]:
-            clase_filtro = "EJECUTIVA"
-        elif clase_normalizada in ["PRIMERA", "PRIMERA CLASE", "PRIMERACLASE", "FIRST", "FIRST CLASS"]:
-            clase_filtro = "PRIMERA"
+    # Con ?since solo interesan los asientos que cambiaron (si el historial cubre esa versión)
+    cambiados = None
+    if desde_version is not None:
+        cambiados = cambios_desde(instancia.id, desde_version, inventario.version)
     
     # Construir mapa de asientos (filtrado por clase si se especifica)
     mapa_asientos = []
-    for asiento in asientos:
+    for asiento_id, numero_asiento, clase_asiento in asientos:
         # Si hay filtro de clase, solo incluir asientos de esa clase
-        if clase_filtro and asiento.clase != clase_filtro:
+        if clase_filtro and clase_asiento != clase_filtro:
+            continue
+        if cambiados is not None and asiento_id not in cambiados:
             continue
             
         mapa_asientos.append({
-            "numero_asiento": asiento.numero_asiento,
-            "clase": asiento.clase,
-            "disponible": asiento.numero_asiento not in asientos_ocupados_set
+            "numero_asiento": numero_asiento,
+            "clase": clase_asiento,
+            "disponible": not inventario.asiento_ocupado(asiento_id) and numero_asiento not in retenidos
         })
     
+    if cambiados is not None:
+        # Las retenciones no tienen versión: se envían todas las vigentes
+        clase_por_numero = {numero_asiento: clase_asiento for _, numero_asiento, clase_asiento in asientos}
+        return {
+            "delta": True,
+            "version": inventario.version,
+            "desde_version": desde_version,
+            "asientos": mapa_asientos,
+            "retenidos": sorted(
+                numero for numero in retenidos
+                if not clase_filtro or clase_por_numero.get(numero) == clase_filtro
+            ),
+            "resumen": {
+                "total": len(asientos),
+                "ocupados": inventario.cantidad_ocupados(),
+                "retenidos": len(retenidos)
+            }
+        }
+    
     # Obtener las ciudades para origen y destino
     origen = vuelo.ciudad_origen.codigo_iata if vuelo.ciudad_origen else "N/A"
     destino = vuelo.ciudad_destino.codigo_iata if vuelo.ciudad_destino else "N/A"
     
-    return {
+    respuesta = {
         "vuelo": {
             "id": vuelo.id,
             "numero_vuelo": vuelo.numero_vuelo,
@@ -522,11 +775,76 @@ def obtener_mapa_asientos(
             "destino": destino,
             "fecha": str(fecha)
         },
+        "delta": False,
+        "version": inventario.version,
         "asientos": mapa_asientos,
         "resumen": {
             "total": len(asientos),
             "disponibles": len([a for a in mapa_asientos if a["disponible"]]),
-            "ocupados": len(asientos_ocupados_set)
+            "ocupados": inventario.cantidad_ocupados(),
+            "retenidos": len(retenidos)
         }
     }
+    
+    etag = calcular_etag(instancia.id, inventario.version, clase_filtro, retenidos)
+    cache_mapas_asientos.guardar(vuelo_id, fecha, clase_filtro, instancia.id, etag, respuesta, marca_cache)
+    if request.headers.get("if-none-match") == etag:
+        cache_mapas_asientos.registrar_no_modificado()
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=_cabeceras_mapa(etag))
+    response.headers.update(_cabeceras_mapa(etag))
+    return respuesta
 
+def _abrir_canal_asientos(vuelo_id: int, fecha: date, loop: asyncio.AbstractEventLoop):
+    """Suscripción al canal de la instancia (con su propia sesión, que no queda abierta durante el stream)"""
+    db = SessionLocal()
+    try:
+        instancia = db.query(InstanciaVuelo).filter(
+            InstanciaVuelo.vuelo_id == vuelo_id,
+            InstanciaVuelo.fecha == fecha
+        ).first()
+        if not instancia:
+            return None
+        return difusion_asientos.abrir(db, instancia, loop)
+    finally:
+        db.close()
+
+def _evento_sse(evento: dict) -> str:
+    return f"event: {evento['tipo']}\ndata: {json.dumps(evento)}\n\n"
+
+@router.get("/asientos/{vuelo_id}/{fecha}/eventos")
+async def suscribir_mapa_asientos(vuelo_id: int, fecha: date):
+    """
+    Cambios del mapa de asientos en tiempo real (Server-Sent Events).
+    Envía primero un evento "estado" y luego "asientos" (ocupados/liberados) y
+    "retenciones", cada uno con la disponibilidad por clase. Ante "resincronizar"
+    el cliente debe volver a suscribirse.
+    """
+    suscripcion = await run_in_threadpool(_abrir_canal_asientos, vuelo_id, fecha, asyncio.get_running_loop())
+    if suscripcion is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No hay vuelos programados para esta fecha"
+        )
+    canal, estado, suscriptor = suscripcion
+    
+    async def eventos():
+        try:
+            yield _evento_sse(estado)
+            while True:
+                evento = await suscriptor.siguiente(LATIDO_SEGUNDOS)
+                if evento is None:
+                    # Mantener viva la conexión a través de proxies
+                    yield ": latido\n\n"
+                elif evento["tipo"] == "cerrar":
+                    yield _evento_sse({"tipo": "resincronizar"})
+                    break
+                else:
+                    yield _evento_sse(evento)
+        finally:
+            canal.desuscribir(suscriptor)
+    
+    return StreamingResponse(
+        eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
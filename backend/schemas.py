@@ -69,9 +69,25 @@ class BusquedaVuelosRequest(BaseModel):
     fecha: date
     clase: Optional[str] = "ECONOMICA"
     aerolinea_codigo: Optional[str] = None
-    solo_directos: bool = True
+    solo_directos: bool = True  # False: incluir itinerarios con 1 y 2 escalas (solo /vuelos/buscar/itinerarios; las demás búsquedas lo ignoran)
     horario_salida: Optional[str] = None  # morning, afternoon, evening, all
     precio_maximo: Optional[float] = None
+    limite: Optional[int] = None  # Tamaño de página (None = todos)
+    cursor: Optional[str] = None  # Valor de la cabecera X-Siguiente-Cursor de la página anterior
+
+class BusquedaCalendarioRequest(BaseModel):
+    origen: str  # Código IATA
+    destino: str  # Código IATA
+    fecha: date  # Fecha central de la ventana
+    clase: Optional[str] = "ECONOMICA"
+    dias_antes: int = 3
+    dias_despues: int = 3
+
+class DiaCalendario(BaseModel):
+    fecha: date
+    precio_minimo: Optional[Decimal] = None  # None si no hay vuelos con asientos ese día
+    asientos_disponibles: int = 0
+    vuelos: int = 0
 
 class VueloDisponible(BaseModel):
     vuelo_id: int
@@ -91,6 +107,25 @@ class VueloDisponible(BaseModel):
     class Config:
         from_attributes = True
 
+class ItinerarioDisponible(BaseModel):
+    escalas: int
+    salida: datetime
+    llegada: datetime
+    duracion_total_minutos: int
+    precio_total: Decimal
+    asientos_disponibles: int  # Mínimo entre todos los tramos
+    segmentos: List[VueloDisponible]
+
+class BusquedaLoteRequest(BaseModel):
+    busquedas: List[BusquedaVuelosRequest]
+    orden: str = "horario"  # horario, precio
+
+class ResultadoBusquedaLote(BaseModel):
+    indice: int  # Posición de la búsqueda en la solicitud
+    vuelos: List[VueloDisponible] = []
+    siguiente_cursor: Optional[str] = None
+    error: Optional[str] = None  # Detalle si esta búsqueda no se pudo resolver
+
 # Schemas de Reserva
 class PasajeroInfo(BaseModel):
     nombre: str
@@ -105,6 +140,33 @@ class DetalleReservaCreate(BaseModel):
 class ReservaCreate(BaseModel):
     detalles: List[DetalleReservaCreate]
 
+class RetencionAsientosRequest(BaseModel):
+    asientos: List[str]  # Números de asiento (ej: 12A)
+
+class RetencionAsientosResponse(BaseModel):
+    instancia_vuelo_id: int
+    asientos: List[str]
+    expira_en_segundos: int
+
+class ListaEsperaCreate(BaseModel):
+    instancia_vuelo_id: int
+    clase: str
+    pasajeros: List[PasajeroInfo]  # El asiento se asigna al promoverla
+
+class ListaEsperaResponse(BaseModel):
+    id: int
+    instancia_vuelo_id: int
+    clase: str
+    cantidad: int
+    prioridad: int
+    estado: str
+    reserva_id: Optional[int] = None
+    fecha_creacion: datetime
+    fecha_promocion: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
 class DetalleReservaResponse(BaseModel):
     id: int
     pasajero_nombre: str
@@ -0,0 +1,69 @@
+"""
+Tareas periódicas en segundo plano.
+
+Cada tarea corre en un hilo daemon propio que la ejecuta al iniciar y luego
+cada `intervalo_segundos`. Los errores se registran y no detienen el hilo.
+El resultado de la última ejecución queda disponible en /metricas.
+"""
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict
+
+_tareas: Dict[str, dict] = {}
+_detener = threading.Event()
+_lock = threading.Lock()
+
+
+def _ejecutar(nombre: str, funcion: Callable[[], object]):
+    inicio = time.monotonic()
+    try:
+        resultado = funcion()
+        error = None
+    except Exception as e:
+        resultado = None
+        error = str(e)
+        print(f"❌ Error en tarea programada '{nombre}': {e}")
+
+    with _lock:
+        estado = _tareas[nombre]
+        estado["ejecuciones"] += 1
+        estado["ultima_ejecucion"] = datetime.now().isoformat(timespec="seconds")
+        estado["duracion_ms"] = round((time.monotonic() - inicio) * 1000, 1)
+        estado["ultimo_resultado"] = resultado
+        estado["ultimo_error"] = error
+        if error:
+            estado["errores"] += 1
+
+
+def programar_tarea(nombre: str, funcion: Callable[[], object], intervalo_segundos: float):
+    """Ejecutar `funcion` en segundo plano ahora y luego cada `intervalo_segundos`"""
+    with _lock:
+        if nombre in _tareas:
+            return
+        _tareas[nombre] = {
+            "intervalo_segundos": intervalo_segundos,
+            "ejecuciones": 0,
+            "errores": 0,
+            "ultima_ejecucion": None,
+            "duracion_ms": None,
+            "ultimo_resultado": None,
+            "ultimo_error": None
+        }
+
+    def bucle():
+        while not _detener.is_set():
+            _ejecutar(nombre, funcion)
+            _detener.wait(intervalo_segundos)
+
+    threading.Thread(target=bucle, name=f"tarea-{nombre}", daemon=True).start()
+
+
+def detener_tareas():
+    """Pedir a todas las tareas que terminen tras la ejecución en curso"""
+    _detener.set()
+
+
+def estado_tareas() -> Dict[str, dict]:
+    with _lock:
+        return {nombre: dict(estado) for nombre, estado in _tareas.items()}
@@ -0,0 +1,113 @@
+"""
+Fixtures de pruebas: una base SQLite temporal para toda la sesión y datos
+nuevos (usuario, vuelo, instancia) para cada prueba, así las cachés en memoria
+de la aplicación nunca ven ids repetidos.
+"""
+import itertools
+import os
+import tempfile
+from contextlib import contextmanager
+from datetime import date, time, timedelta
+
+# Antes de importar la aplicación: base desechable y sin tareas en segundo plano
+_directorio = tempfile.mkdtemp(prefix="boleteria_pruebas_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_directorio, 'pruebas.db')}"
+os.environ["MATERIALIZADOR_ACTIVO"] = "false"
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from database import Base, engine, SessionLocal
+from models import Ciudad, Aerolinea, Vuelo, Tarifa, InstanciaVuelo, Usuario
+from auth import get_password_hash, create_access_token
+from aprovisionamiento_asientos import aprovisionar_asientos
+import main
+
+Base.metadata.create_all(engine)
+_secuencia = itertools.count(1)
+
+
+@pytest.fixture
+def db():
+    sesion = SessionLocal()
+    try:
+        yield sesion
+    finally:
+        sesion.close()
+
+
+@pytest.fixture(scope="session")
+def cliente():
+    return TestClient(main.app)
+
+
+@pytest.fixture(scope="session")
+def ruta():
+    """Aerolínea y par de ciudades compartidos por todas las pruebas"""
+    sesion = SessionLocal()
+    origen = Ciudad(nombre="Quito", codigo_iata="UIO", pais="Ecuador")
+    destino = Ciudad(nombre="Guayaquil", codigo_iata="GYE", pais="Ecuador")
+    aerolinea = Aerolinea(nombre="AeroAndes", codigo_iata="AA", activa=True)
+    sesion.add_all([origen, destino, aerolinea])
+    sesion.commit()
+    ids = {"origen_id": origen.id, "destino_id": destino.id, "aerolinea_id": aerolinea.id}
+    sesion.close()
+    return ids
+
+
+@pytest.fixture
+def usuario(db):
+    n = next(_secuencia)
+    u = Usuario(email=f"pasajero{n}@pruebas.com", password_hash=get_password_hash("secreto1"),
+                nombre="Ana", apellido="Pérez", activo=True, email_verificado=True)
+    db.add(u)
+    db.commit()
+    return u
+
+
+@pytest.fixture
+def headers(usuario):
+    return {"Authorization": f"Bearer {create_access_token({'sub': usuario.email})}"}
+
+
+@pytest.fixture
+def crear_instancia(db, ruta):
+    """Fábrica de instancias de vuelo nuevas (un vuelo distinto por llamada)"""
+    def crear(fecha: date = None, economica: int = 150, ejecutiva: int = 30, primera: int = 10,
+              hora_salida: time = time(8, 0), precio: int = 100) -> InstanciaVuelo:
+        fecha = fecha or date.today() + timedelta(days=7)
+        vuelo = Vuelo(numero_vuelo=f"AA{next(_secuencia)}", aerolinea_id=ruta["aerolinea_id"],
+                      ciudad_origen_id=ruta["origen_id"], ciudad_destino_id=ruta["destino_id"],
+                      hora_salida=hora_salida, hora_llegada=time(9, 0), duracion_minutos=60,
+                      dias_operacion="1111111", activo=True)
+        db.add(vuelo)
+        db.flush()
+        for clase, factor in (("ECONOMICA", 1), ("EJECUTIVA", 3), ("PRIMERA", 5)):
+            db.add(Tarifa(vuelo_id=vuelo.id, clase=clase, precio=precio * factor,
+                          fecha_inicio=date.today() - timedelta(days=30)))
+        instancia = InstanciaVuelo(vuelo_id=vuelo.id, fecha=fecha, asientos_disponibles_economica=economica,
+                                   asientos_disponibles_ejecutiva=ejecutiva, asientos_disponibles_primera=primera)
+        db.add(instancia)
+        db.flush()
+        # Asientos aprovisionados ya, no en el hilo que se lanza al confirmar
+        db.info.pop("aprovisionamiento_vuelos", None)
+        db.commit()
+        aprovisionar_asientos(db, [vuelo.id])
+        return instancia
+    return crear
+
+
+@contextmanager
+def contar_consultas():
+    """Cuenta las sentencias SQL ejecutadas dentro del bloque: `with contar_consultas() as n: ...; n[0]`"""
+    contador = [0]
+
+    def _contar(*args):
+        contador[0] += 1
+
+    event.listen(engine, "before_cursor_execute", _contar)
+    try:
+        yield contador
+    finally:
+        event.remove(engine, "before_cursor_execute", _contar)
@@ -0,0 +1,26 @@
+"""La cabina se aprovisiona según su configuración, no según lo que queda por vender"""
+from models import Asiento
+from aprovisionamiento_asientos import CONFIGURACION_CABINA, ORDEN_CLASES, aprovisionar_asientos
+
+
+def _fila(numero: str) -> int:
+    return int(numero[:-1])
+
+
+def test_vuelo_agotado_recibe_cabina_completa_en_bloques(db, crear_instancia):
+    instancia = crear_instancia(economica=0, ejecutiva=0, primera=0)
+
+    asientos = db.query(Asiento.numero_asiento, Asiento.clase).filter(
+        Asiento.vuelo_id == instancia.vuelo_id
+    ).all()
+
+    por_clase = {clase: [numero for numero, c in asientos if c == clase] for clase in ORDEN_CLASES}
+    assert {clase: len(numeros) for clase, numeros in por_clase.items()} == CONFIGURACION_CABINA
+    # Cada clase ocupa un bloque de filas propio, en el orden de la cabina
+    filas = [{_fila(numero) for numero in por_clase[clase]} for clase in ORDEN_CLASES]
+    for anterior, siguiente in zip(filas, filas[1:]):
+        assert max(anterior) < min(siguiente)
+    for bloque in filas:
+        assert bloque == set(range(min(bloque), max(bloque) + 1))
+
+    assert aprovisionar_asientos(db, [instancia.vuelo_id]) == 0
@@ -0,0 +1,52 @@
+"""Asignación automática de grupos: misma fila, luego cruzando el pasillo, luego de adelante hacia atrás"""
+from asignacion_asientos import asignar_grupo
+from inventario_asientos import estado_inventario
+from models import Asiento
+
+
+def _economica(db, instancia):
+    disp = estado_inventario(db, instancia, solo_lectura=True).disposicion
+    return disp, [numero for _, numero, clase in disp.asientos if clase == "ECONOMICA"]
+
+
+def _fuera_de(numeros, letras):
+    """Bloquear en todas las filas las letras que no están en `letras`"""
+    return [numero for numero in numeros if numero[-1] not in letras]
+
+
+def test_grupo_en_la_misma_fila_sin_cruzar_el_pasillo(db, crear_instancia):
+    disp, _ = _economica(db, crear_instancia())
+
+    assert asignar_grupo(disp, 0, "ECONOMICA", 3) == ["8A", "8B", "8C"]
+    # En la fila 8 solo quedan pares separados por el pasillo: se prefiere la fila 9
+    assert asignar_grupo(disp, 0, "ECONOMICA", 2, ["8A", "8B", "8E"]) == ["9A", "9B"]
+
+
+def test_grupo_cruzando_el_pasillo(db, crear_instancia):
+    disp, numeros = _economica(db, crear_instancia())
+
+    assert asignar_grupo(disp, 0, "ECONOMICA", 4) == ["8A", "8B", "8C", "8D"]
+    assert asignar_grupo(disp, 0, "ECONOMICA", 2, _fuera_de(numeros, "CD")) == ["8C", "8D"]
+
+
+def test_grupo_separado_en_una_fila_y_luego_de_adelante_hacia_atras(db, crear_instancia):
+    disp, numeros = _economica(db, crear_instancia())
+
+    assert asignar_grupo(disp, 0, "ECONOMICA", 3, _fuera_de(numeros, "ACE")) == ["8A", "8C", "8E"]
+    assert asignar_grupo(disp, 0, "ECONOMICA", 3, _fuera_de(numeros, "A")) == ["8A", "9A", "10A"]
+    assert asignar_grupo(disp, 0, "ECONOMICA", len(numeros) + 1) is None
+
+
+def test_reserva_sin_asientos_los_asigna_juntos(cliente, db, headers, crear_instancia):
+    instancia = crear_instancia()
+
+    respuesta = cliente.post("/reservas/", headers=headers, json={"detalles": [{
+        "instancia_vuelo_id": instancia.id,
+        "clase": "ECONOMICA",
+        "pasajeros": [{"nombre": f"Pasajero{i}", "apellido": "Pérez"} for i in range(3)]
+    }]})
+
+    assert respuesta.status_code == 201
+    asiento_ids = [d["asiento_id"] for d in respuesta.json()["detalles"]]
+    numeros = db.query(Asiento.numero_asiento).filter(Asiento.id.in_(asiento_ids)).all()
+    assert sorted(numero for (numero,) in numeros) == ["8A", "8B", "8C"]
@@ -0,0 +1,13 @@
+"""Las búsquedas de vuelos directos ignoran solo_directos"""
+
+
+def test_horarios_ignora_solo_directos(cliente, crear_instancia):
+    instancia = crear_instancia()
+    cuerpo = {"origen": "UIO", "destino": "GYE", "fecha": instancia.fecha.isoformat()}
+
+    directos = cliente.post("/vuelos/buscar/horarios", json=cuerpo)
+    con_escalas = cliente.post("/vuelos/buscar/horarios", json={**cuerpo, "solo_directos": False})
+
+    assert directos.status_code == con_escalas.status_code == 200
+    assert instancia.id in {v["instancia_vuelo_id"] for v in directos.json()}
+    assert con_escalas.json() == directos.json()
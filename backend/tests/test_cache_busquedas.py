@@ -0,0 +1,28 @@
+"""Las marcas de instancia de la caché de búsquedas no crecen sin límite"""
+from cache_busquedas import CacheBusquedas
+
+
+def test_marcas_podadas_sin_perder_invalidaciones():
+    cache = CacheBusquedas(max_entradas=10, ttl=60)
+    marca = cache.marca()
+    cache.invalidar_instancias([1])
+    # Calculada antes del cambio de la instancia 1: ya no es vigente
+    cache.guardar("vieja", "resultado", [1], marca, 0, 10)
+    cache.guardar("viva", "resultado", [2], cache.marca(), 0, 10)
+
+    for instancia_id in range(3, 1000):
+        cache.invalidar_instancias([instancia_id])
+
+    assert cache.estadisticas()["marcas_instancia"] <= cache.max_entradas
+    assert cache.obtener("vieja", 0) is None
+    assert cache.obtener("viva", 0) == "resultado"
+
+    # Un resultado que empezó antes de la poda ya no puede verificarse
+    cache.guardar("anterior", "resultado", [5], marca, 0, 10)
+    assert cache.obtener("anterior", 0) is None
+
+    cache.invalidar_instancias([2])
+    assert cache.obtener("viva", 0) is None
+
+    cache.limpiar()
+    assert cache.estadisticas()["marcas_instancia"] == 0
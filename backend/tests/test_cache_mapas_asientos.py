@@ -0,0 +1,32 @@
+"""Las marcas de invalidación de la caché de mapas no crecen sin límite"""
+from datetime import date
+
+from cache_mapas_asientos import CacheMapasAsientos
+
+FECHA = date(2030, 1, 1)
+
+
+def test_marcas_podadas_sin_perder_invalidaciones():
+    cache = CacheMapasAsientos(max_entradas=10, ttl=60)
+    marca = cache.marca()
+    cache.invalidar_instancia(1)
+    # Calculada antes del cambio de la instancia 1: no se guarda
+    cache.guardar(1, FECHA, None, 1, '"vieja"', {}, marca)
+    assert cache.obtener(1, FECHA, None) is None
+    cache.guardar(2, FECHA, None, 2, '"viva"', {}, cache.marca())
+
+    for instancia_id in range(3, 1000):
+        cache.invalidar_instancia(instancia_id)
+
+    assert cache.estadisticas()["marcas_instancia"] <= cache.max_entradas
+    assert cache.obtener(2, FECHA, None).etag == '"viva"'
+
+    # Una respuesta que empezó antes de la poda ya no puede verificarse
+    cache.guardar(5, FECHA, None, 5, '"anterior"', {}, marca)
+    assert cache.obtener(5, FECHA, None) is None
+
+    cache.invalidar_instancia(2)
+    assert cache.obtener(2, FECHA, None) is None
+
+    cache.limpiar()
+    assert cache.estadisticas()["marcas_instancia"] == 0
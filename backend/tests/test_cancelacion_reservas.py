@@ -0,0 +1,69 @@
+"""Cancelación de una reserva y de todas las reservas de una instancia"""
+import auth
+from models import InstanciaVuelo, Reserva
+
+
+def _reservar(cliente, headers, instancia, asientos):
+    respuesta = cliente.post("/reservas/", headers=headers, json={"detalles": [{
+        "instancia_vuelo_id": instancia.id,
+        "clase": "ECONOMICA",
+        "pasajeros": [{"nombre": "Ana", "apellido": "Pérez", "asiento_numero": a} for a in asientos]
+    }]})
+    assert respuesta.status_code == 201
+    return respuesta.json()
+
+
+def _ocupados(cliente, instancia):
+    mapa = cliente.get(f"/vuelos/asientos/{instancia.vuelo_id}/{instancia.fecha.isoformat()}").json()
+    return {a["numero_asiento"] for a in mapa["asientos"] if not a["disponible"]}
+
+
+def test_cancelar_reserva_devuelve_sus_asientos(cliente, db, headers, crear_instancia):
+    instancia = crear_instancia()
+    reserva = _reservar(cliente, headers, instancia, ["8A", "8B"])
+    _reservar(cliente, headers, instancia, ["8C"])
+
+    respuesta = cliente.delete(f"/reservas/{reserva['codigo_reserva']}", headers=headers)
+
+    assert respuesta.status_code == 200
+    db.expire_all()
+    assert db.get(Reserva, reserva["id"]).estado == "CANCELADA"
+    assert db.get(InstanciaVuelo, instancia.id).asientos_disponibles_economica == 149
+    assert _ocupados(cliente, instancia) == {"8C"}
+    assert cliente.delete(f"/reservas/{reserva['codigo_reserva']}", headers=headers).status_code == 400
+    assert cliente.delete("/reservas/NOEXISTE", headers=headers).status_code == 404
+
+
+def test_cancelar_todas_las_reservas_de_una_instancia(cliente, db, usuario, headers, crear_instancia, monkeypatch):
+    interrumpida = crear_instancia()
+    reabierta = crear_instancia()
+    otra = crear_instancia()
+    reservas = [_reservar(cliente, headers, interrumpida, ["8A", "8B"]),
+                _reservar(cliente, headers, interrumpida, ["8C"])]
+    _reservar(cliente, headers, reabierta, ["8A"])
+    intacta = _reservar(cliente, headers, otra, ["8A"])
+
+    url = f"/reservas/instancias/{interrumpida.id}/cancelar"
+    assert cliente.post(url, headers=headers).status_code == 403
+
+    monkeypatch.setattr(auth, "ADMIN_EMAILS", {usuario.email})
+    respuesta = cliente.post(url, headers=headers)
+
+    assert respuesta.status_code == 200
+    assert respuesta.json()["reservas_canceladas"] == 2
+    db.expire_all()
+    assert {db.get(Reserva, r["id"]).estado for r in reservas} == {"CANCELADA"}
+    instancia = db.get(InstanciaVuelo, interrumpida.id)
+    # La instancia cerrada no vuelve a vender sus asientos
+    assert instancia.estado == "CANCELADO"
+    assert instancia.asientos_disponibles_economica == 147
+    assert db.get(Reserva, intacta["id"]).estado == "PENDIENTE"
+
+    # Sin cerrar la instancia, sus asientos vuelven a la venta
+    respuesta = cliente.post(f"/reservas/instancias/{reabierta.id}/cancelar",
+                             headers=headers, params={"marcar_cancelada": False})
+    assert respuesta.json()["reservas_canceladas"] == 1
+    db.expire_all()
+    assert db.get(InstanciaVuelo, reabierta.id).asientos_disponibles_economica == 150
+    assert _ocupados(cliente, reabierta) == set()
+    assert cliente.post("/reservas/instancias/999999/cancelar", headers=headers).status_code == 404
@@ -0,0 +1,66 @@
+"""Check-in de toda una reserva en un paso: omite billetes ya registrados o no emitidos"""
+from datetime import datetime, timedelta
+
+from models import Asiento, Billete, CheckIn, DetalleReserva, Reserva
+
+
+def _reserva_con_billetes(db, usuario, instancia, estados):
+    """Reserva pagada con un billete por estado; "REGISTRADO" es un EMITIDO con check-in previo"""
+    reserva = Reserva(codigo_reserva=f"C{instancia.id:09d}", usuario_id=usuario.id, total=100 * len(estados),
+                      estado="PAGADA")
+    db.add(reserva)
+    db.flush()
+    asientos = dict(db.query(Asiento.numero_asiento, Asiento.id).filter(Asiento.vuelo_id == instancia.vuelo_id))
+    codigos = []
+    for i, estado in enumerate(estados):
+        detalle = DetalleReserva(reserva_id=reserva.id, instancia_vuelo_id=instancia.id, pasajero_nombre="Pasajero",
+                                 pasajero_apellido=str(i), clase="ECONOMICA", precio=100,
+                                 asiento_id=asientos[f"8{'ABCDEF'[i]}"])
+        db.add(detalle)
+        db.flush()
+        billete = Billete(codigo_billete=f"K{instancia.id:05d}{i:04d}", detalle_reserva_id=detalle.id,
+                          estado="EMITIDO" if estado == "REGISTRADO" else estado)
+        db.add(billete)
+        db.flush()
+        if estado == "REGISTRADO":
+            db.add(CheckIn(billete_id=billete.id, asiento_asignado=f"8{'ABCDEF'[i]}"))
+        codigos.append(billete.codigo_billete)
+    db.commit()
+    return reserva.codigo_reserva, codigos
+
+
+def _saliendo_en(crear_instancia, horas):
+    salida = datetime.now() + timedelta(hours=horas)
+    return crear_instancia(fecha=salida.date(), hora_salida=salida.time().replace(microsecond=0))
+
+
+def test_check_in_de_la_reserva_completa(cliente, db, usuario, headers, crear_instancia):
+    instancia = _saliendo_en(crear_instancia, 12)
+    codigo, billetes = _reserva_con_billetes(db, usuario, instancia, ["EMITIDO", "EMITIDO", "REGISTRADO", "CANCELADO"])
+
+    respuesta = cliente.post(f"/reservas/{codigo}/check-in", headers=headers)
+
+    assert respuesta.status_code == 200
+    datos = respuesta.json()
+    assert [(c["billete_codigo"], c["asiento"]) for c in datos["check_ins"]] == [(billetes[0], "8A"), (billetes[1], "8B")]
+    assert {o["billete_codigo"]: o["motivo"] for o in datos["omitidos"]} == {
+        billetes[2]: "Ya se realizó check-in",
+        billetes[3]: "Billete en estado CANCELADO"
+    }
+    assert db.query(CheckIn).join(Billete).filter(Billete.codigo_billete.in_(billetes)).count() == 3
+
+    # Repetirlo no registra nada nuevo
+    assert cliente.post(f"/reservas/{codigo}/check-in", headers=headers).status_code == 400
+
+
+def test_check_in_fuera_de_ventana_o_sin_reserva(cliente, db, usuario, headers, crear_instancia):
+    instancia = _saliendo_en(crear_instancia, 48)
+    codigo, _ = _reserva_con_billetes(db, usuario, instancia, ["EMITIDO"])
+
+    respuesta = cliente.post(f"/reservas/{codigo}/check-in", headers=headers)
+    assert respuesta.status_code == 400
+    assert "24h antes del vuelo" in respuesta.json()["detail"]
+    assert db.query(CheckIn).join(Billete).join(DetalleReserva).join(Reserva).filter(
+        Reserva.codigo_reserva == codigo
+    ).count() == 0
+    assert cliente.post("/reservas/NOEXISTE/check-in", headers=headers).status_code == 404
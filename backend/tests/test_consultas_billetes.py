@@ -0,0 +1,47 @@
+"""Las consultas de billetes cuestan lo mismo con 1 billete que con muchos"""
+import pytest
+
+from models import Reserva, DetalleReserva, Billete, CheckIn
+from conftest import contar_consultas
+
+
+def _emitir_billetes(db, usuario, instancia, cantidad):
+    reserva = Reserva(codigo_reserva=f"R{instancia.id:09d}", usuario_id=usuario.id, total=100 * cantidad,
+                      estado="CONFIRMADA")
+    db.add(reserva)
+    db.flush()
+    codigos = []
+    for i in range(cantidad):
+        detalle = DetalleReserva(reserva_id=reserva.id, instancia_vuelo_id=instancia.id, pasajero_nombre="Pasajero",
+                                 pasajero_apellido=str(i), clase="ECONOMICA", precio=100)
+        db.add(detalle)
+        db.flush()
+        billete = Billete(codigo_billete=f"B{instancia.id:05d}{i:04d}", detalle_reserva_id=detalle.id)
+        db.add(billete)
+        db.flush()
+        if i % 2:
+            db.add(CheckIn(billete_id=billete.id, asiento_asignado=f"{i + 1}A"))
+        codigos.append(billete.codigo_billete)
+    db.commit()
+    return codigos
+
+
+def _consultas(cliente, url, headers):
+    with contar_consultas() as n:
+        respuesta = cliente.get(url, headers=headers)
+    assert respuesta.status_code == 200
+    return n[0], respuesta.json()
+
+
+@pytest.mark.parametrize("url", ["/pagos/billetes", "/pagos/billetes/{codigo}"])
+def test_consultas_constantes_por_billete(cliente, db, usuario, headers, crear_instancia, url):
+    codigos = _emitir_billetes(db, usuario, crear_instancia(), 1)
+    uno, datos_uno = _consultas(cliente, url.format(codigo=codigos[0]), headers)
+
+    codigos += _emitir_billetes(db, usuario, crear_instancia(), 12)
+    muchos, datos_muchos = _consultas(cliente, url.format(codigo=codigos[-1]), headers)
+
+    assert uno == muchos
+    if url == "/pagos/billetes":
+        assert len(datos_uno) == 1 and len(datos_muchos) == 13
+        assert sum(b["check_in_realizado"] for b in datos_muchos) == 6
@@ -0,0 +1,70 @@
+"""Difusión de cambios del mapa de asientos a los suscriptores"""
+import asyncio
+
+from aprovisionamiento_asientos import CONFIGURACION_CABINA
+from difusion_asientos import CanalAsientos, difusion_asientos
+
+
+def _reservar(cliente, headers, instancia, asiento):
+    return cliente.post("/reservas/", headers=headers, json={"detalles": [{
+        "instancia_vuelo_id": instancia.id,
+        "clase": "ECONOMICA",
+        "pasajeros": [{"nombre": "Ana", "apellido": "Pérez", "asiento_numero": asiento}]
+    }]})
+
+
+def test_suscriptor_recibe_estado_y_cambios(cliente, db, headers, crear_instancia):
+    instancia = crear_instancia()
+
+    async def escuchar():
+        canal, estado, suscriptor = difusion_asientos.abrir(db, instancia, asyncio.get_running_loop())
+        try:
+            assert estado["tipo"] == "estado"
+            assert estado["ocupados"] == []
+            assert _reservar(cliente, headers, instancia, "8A").status_code == 201
+            return await suscriptor.siguiente(2)
+        finally:
+            canal.desuscribir(suscriptor)
+
+    evento = asyncio.run(escuchar())
+
+    assert evento["tipo"] == "asientos"
+    assert evento["ocupados"] == ["8A"]
+    assert evento["disponibles"]["ECONOMICA"] == CONFIGURACION_CABINA["ECONOMICA"] - 1
+    # Sin suscriptores el canal se cierra
+    assert difusion_asientos.canal(instancia.id) is None
+
+
+def test_suscripcion_mientras_se_va_el_ultimo_suscriptor(cliente, db, headers, crear_instancia, monkeypatch):
+    instancia = crear_instancia()
+
+    async def escuchar():
+        loop = asyncio.get_running_loop()
+        canal_a, _, suscriptor_a = difusion_asientos.abrir(db, instancia, loop)
+
+        # El único suscriptor se va justo después de que el segundo encuentra su canal
+        cargado = CanalAsientos.cargado
+        pendiente = [True]
+
+        def cargado_y_se_va(canal):
+            if pendiente and canal is canal_a:
+                pendiente.clear()
+                canal_a.desuscribir(suscriptor_a)
+            return cargado.fget(canal)
+
+        monkeypatch.setattr(CanalAsientos, "cargado", property(cargado_y_se_va))
+        canal_b, _, suscriptor_b = difusion_asientos.abrir(db, instancia, loop)
+        monkeypatch.undo()
+        try:
+            assert not pendiente
+            assert canal_b is not canal_a
+            assert difusion_asientos.canal(instancia.id) is canal_b
+            assert _reservar(cliente, headers, instancia, "8B").status_code == 201
+            return await suscriptor_b.siguiente(2)
+        finally:
+            canal_b.desuscribir(suscriptor_b)
+
+    evento = asyncio.run(escuchar())
+
+    assert evento["tipo"] == "asientos"
+    assert evento["ocupados"] == ["8B"]
@@ -0,0 +1,8 @@
+"""Reservas concurrentes por el endpoint real sin sobreventa"""
+from estres_reservas import ejecutar
+
+
+def test_reservas_concurrentes_sin_sobreventa(cliente, headers, crear_instancia):
+    instancia = crear_instancia(economica=40)
+
+    assert ejecutar(cliente, headers, instancia.id, "ECONOMICA", hilos=8, reservas=60, grupo_max=3)
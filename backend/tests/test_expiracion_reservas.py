@@ -0,0 +1,43 @@
+"""Las reservas pendientes vencidas se cancelan y devuelven sus asientos"""
+from datetime import timedelta
+
+from sqlalchemy import func, select
+
+from expiracion_reservas import expirar_reservas
+from models import InstanciaVuelo, Reserva
+
+
+def _reservar(cliente, headers, instancia, asientos):
+    respuesta = cliente.post("/reservas/", headers=headers, json={"detalles": [{
+        "instancia_vuelo_id": instancia.id,
+        "clase": "ECONOMICA",
+        "pasajeros": [{"nombre": "Ana", "apellido": "Pérez", "asiento_numero": a} for a in asientos]
+    }]})
+    assert respuesta.status_code == 201
+    return respuesta.json()["id"]
+
+
+def test_expira_solo_las_vencidas_y_devuelve_su_inventario(cliente, db, headers, crear_instancia):
+    instancia = crear_instancia()
+    vencida = _reservar(cliente, headers, instancia, ["8A", "8B"])
+    vigente = _reservar(cliente, headers, instancia, ["8C"])
+    hace_una_hora = db.scalar(select(func.now())) - timedelta(hours=1)
+    db.query(Reserva).filter(Reserva.id == vencida).update({"fecha_reserva": hace_una_hora})
+    db.commit()
+
+    resumen = expirar_reservas(db, ttl_minutos=30)
+
+    assert resumen["reservas_expiradas"] == 1
+    assert resumen["asientos_devueltos"] == 2
+    assert resumen["asientos_liberados"] == 2
+    db.expire_all()
+    assert db.get(Reserva, vencida).estado == "CANCELADA"
+    assert db.get(Reserva, vigente).estado == "PENDIENTE"
+    assert db.get(InstanciaVuelo, instancia.id).asientos_disponibles_economica == 149
+
+    mapa = cliente.get(f"/vuelos/asientos/{instancia.vuelo_id}/{instancia.fecha.isoformat()}").json()
+    ocupados = {a["numero_asiento"] for a in mapa["asientos"] if not a["disponible"]}
+    assert ocupados == {"8C"}
+
+    # Una segunda pasada no encuentra nada
+    assert expirar_reservas(db, ttl_minutos=30)["reservas_expiradas"] == 0
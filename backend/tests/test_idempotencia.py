@@ -0,0 +1,33 @@
+"""Idempotency-Key en POST /reservas/: el reintento repite la respuesta, otro cuerpo se rechaza"""
+from models import DetalleReserva
+
+
+def _cuerpo(instancia, asiento):
+    return {"detalles": [{
+        "instancia_vuelo_id": instancia.id,
+        "clase": "ECONOMICA",
+        "pasajeros": [{"nombre": "Ana", "apellido": "Pérez", "asiento_numero": asiento}]
+    }]}
+
+
+def test_reintento_repite_la_reserva_y_otro_cuerpo_da_422(cliente, db, headers, crear_instancia):
+    instancia = crear_instancia()
+    con_clave = {**headers, "Idempotency-Key": "reserva-1"}
+
+    primera = cliente.post("/reservas/", headers=con_clave, json=_cuerpo(instancia, "8A"))
+    repetida = cliente.post("/reservas/", headers=con_clave, json=_cuerpo(instancia, "8A"))
+
+    assert primera.status_code == repetida.status_code == 201
+    assert "Idempotent-Replayed" not in primera.headers
+    assert repetida.headers["Idempotent-Replayed"] == "true"
+    assert repetida.json() == primera.json()
+    assert db.query(DetalleReserva).filter(DetalleReserva.instancia_vuelo_id == instancia.id).count() == 1
+
+    distinta = cliente.post("/reservas/", headers=con_clave, json=_cuerpo(instancia, "8B"))
+    assert distinta.status_code == 422
+
+    # Otra clave es otra operación
+    otra = cliente.post("/reservas/", headers={**headers, "Idempotency-Key": "reserva-2"},
+                        json=_cuerpo(instancia, "8B"))
+    assert otra.status_code == 201
+    assert otra.json()["id"] != primera.json()["id"]
@@ -0,0 +1,44 @@
+"""La disposición en memoria detecta asientos agregados por otro proceso"""
+import inventario_asientos
+from inventario_asientos import disposicion, estado_inventario
+from models import Asiento
+
+
+def _agregar_por_fuera(db, vuelo_id, numero):
+    # Inserción sin ORM: no pasa por los eventos de sesión, como si fuera otro proceso
+    db.execute(Asiento.__table__.insert().values(vuelo_id=vuelo_id, numero_asiento=numero,
+                                                 clase="ECONOMICA", disponible=True))
+    db.commit()
+
+
+def test_disposicion_vencida_se_valida_contra_el_vuelo(db, crear_instancia, monkeypatch):
+    instancia = crear_instancia()
+    inicial = disposicion(db, instancia.vuelo_id)
+
+    _agregar_por_fuera(db, instancia.vuelo_id, "99A")
+    assert disposicion(db, instancia.vuelo_id) is inicial
+
+    monkeypatch.setattr(inventario_asientos, "DISPOSICION_TTL_SEGUNDOS", 0)
+    nueva = disposicion(db, instancia.vuelo_id)
+    assert nueva.total == inicial.total + 1
+    assert "99A" in nueva.por_numero
+    # Sin cambios, la validación conserva la misma disposición
+    assert disposicion(db, instancia.vuelo_id) is nueva
+
+
+def test_fila_con_mas_asientos_recarga_la_disposicion(db, crear_instancia):
+    instancia = crear_instancia()
+    inicial = disposicion(db, instancia.vuelo_id)
+    estado_inventario(db, instancia)
+    db.commit()
+
+    _agregar_por_fuera(db, instancia.vuelo_id, "99A")
+    # Otro proceso ya reconstruyó la fila con la disposición nueva
+    inventario_asientos._disposiciones.pop(instancia.vuelo_id)
+    estado_inventario(db, instancia)
+    db.commit()
+    inventario_asientos._disposiciones[instancia.vuelo_id] = inicial
+
+    estado = estado_inventario(db, instancia)
+    assert estado.disposicion.total == inicial.total + 1
+    assert "99A" in estado.disposicion.por_numero
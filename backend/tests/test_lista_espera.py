@@ -0,0 +1,57 @@
+"""Los asientos de una cancelación pasan al siguiente grupo en espera que quepa, con aviso"""
+from auth import create_access_token, get_password_hash
+from models import InstanciaVuelo, ListaEspera, Notificacion, Reserva, Usuario
+
+
+def _otro_usuario(db, email):
+    usuario = Usuario(email=email, password_hash=get_password_hash("secreto1"), nombre="Luis",
+                      apellido="Gómez", activo=True, email_verificado=True)
+    db.add(usuario)
+    db.commit()
+    return usuario, {"Authorization": f"Bearer {create_access_token({'sub': email})}"}
+
+
+def _esperar(cliente, headers, instancia, cantidad):
+    respuesta = cliente.post("/reservas/lista-espera", headers=headers, json={
+        "instancia_vuelo_id": instancia.id,
+        "clase": "ECONOMICA",
+        "pasajeros": [{"nombre": f"Pasajero{i}", "apellido": "Gómez"} for i in range(cantidad)]
+    })
+    assert respuesta.status_code == 201
+    assert respuesta.json()["estado"] == "ESPERANDO"
+    return respuesta.json()["id"]
+
+
+def test_cancelacion_promueve_al_siguiente_que_quepa(cliente, db, headers, crear_instancia):
+    instancia = crear_instancia(economica=2)
+    reserva = cliente.post("/reservas/", headers=headers, json={"detalles": [{
+        "instancia_vuelo_id": instancia.id,
+        "clase": "ECONOMICA",
+        "pasajeros": [{"nombre": "Ana", "apellido": "Pérez"}, {"nombre": "Eva", "apellido": "Pérez"}]
+    }]}).json()
+
+    en_espera, headers_espera = _otro_usuario(db, f"espera{instancia.id}@pruebas.com")
+    grande = _esperar(cliente, headers_espera, instancia, 3)
+    pareja = _esperar(cliente, headers_espera, instancia, 2)
+    prioritaria = _esperar(cliente, headers_espera, instancia, 2)
+    db.query(ListaEspera).filter(ListaEspera.id == prioritaria).update({"prioridad": 1})
+    db.commit()
+
+    assert cliente.delete(f"/reservas/{reserva['codigo_reserva']}", headers=headers).status_code == 200
+
+    db.expire_all()
+    # El grupo de 3 no cabe y la pareja prioritaria pasa delante de la que llegó antes
+    assert db.get(ListaEspera, grande).estado == "ESPERANDO"
+    assert db.get(ListaEspera, pareja).estado == "ESPERANDO"
+    promovida = db.get(ListaEspera, prioritaria)
+    assert promovida.estado == "PROMOVIDA"
+    assert db.get(InstanciaVuelo, instancia.id).asientos_disponibles_economica == 0
+
+    nueva = db.get(Reserva, promovida.reserva_id)
+    assert nueva.usuario_id == en_espera.id
+    assert nueva.estado == "PENDIENTE"
+    assert len(nueva.detalles) == 2 and all(d.asiento_id for d in nueva.detalles)
+
+    aviso = db.query(Notificacion).filter(Notificacion.usuario_id == en_espera.id).one()
+    assert aviso.datos_extra["reserva_codigo"] == nueva.codigo_reserva
+    assert aviso.datos_extra["lista_espera_id"] == prioritaria
@@ -0,0 +1,65 @@
+"""Mis reservas: paginación por (fecha_reserva, id), filtro de estado y consultas constantes"""
+from datetime import datetime, timedelta
+
+from models import Reserva, DetalleReserva
+from conftest import contar_consultas
+
+
+def _crear_reservas(db, usuario, instancia):
+    """Seis reservas con dos pasajeros; dos comparten fecha para desempatar por id"""
+    base = datetime(2030, 1, 1, 12, 0)
+    fechas = [base, base + timedelta(hours=1), base + timedelta(hours=1),
+              base + timedelta(hours=2), base + timedelta(hours=3), base + timedelta(hours=4)]
+    claves = []
+    for i, fecha in enumerate(fechas):
+        reserva = Reserva(codigo_reserva=f"L{instancia.id:06d}{i:03d}", usuario_id=usuario.id, total=200,
+                          estado="CONFIRMADA" if i % 2 else "PENDIENTE", fecha_reserva=fecha)
+        db.add(reserva)
+        db.flush()
+        for apellido in ("Pérez", "Gómez"):
+            db.add(DetalleReserva(reserva_id=reserva.id, instancia_vuelo_id=instancia.id, pasajero_nombre="Ana",
+                                  pasajero_apellido=apellido, clase="ECONOMICA", precio=100))
+        claves.append((fecha, reserva.id))
+    db.commit()
+    # De la más reciente a la más antigua; con la misma fecha, mayor id primero
+    return [reserva_id for _, reserva_id in sorted(claves, reverse=True)]
+
+
+def test_paginas_por_cursor_sin_repetir_ni_saltar(cliente, db, usuario, headers, crear_instancia):
+    esperadas = _crear_reservas(db, usuario, crear_instancia())
+
+    vistas, cursor, paginas = [], None, 0
+    while True:
+        params = {"limite": 4}
+        if cursor:
+            params["cursor"] = cursor
+        respuesta = cliente.get("/reservas/", headers=headers, params=params)
+        assert respuesta.status_code == 200
+        vistas += [r["id"] for r in respuesta.json()]
+        assert all(len(r["detalles"]) == 2 for r in respuesta.json())
+        paginas += 1
+        cursor = respuesta.headers.get("X-Siguiente-Cursor")
+        if not cursor:
+            break
+
+    assert paginas == 2
+    assert vistas == esperadas
+
+
+def test_filtro_de_estado(cliente, db, usuario, headers, crear_instancia):
+    _crear_reservas(db, usuario, crear_instancia())
+
+    confirmadas = cliente.get("/reservas/", headers=headers, params={"estado": "CONFIRMADA"}).json()
+    assert len(confirmadas) == 3
+    assert {r["estado"] for r in confirmadas} == {"CONFIRMADA"}
+    assert cliente.get("/reservas/", headers=headers, params={"estado": "OTRO"}).status_code == 400
+
+
+def test_consultas_constantes_por_pagina(cliente, db, usuario, headers, crear_instancia):
+    _crear_reservas(db, usuario, crear_instancia())
+
+    with contar_consultas() as una:
+        assert len(cliente.get("/reservas/", headers=headers, params={"limite": 1}).json()) == 1
+    with contar_consultas() as todas:
+        assert len(cliente.get("/reservas/", headers=headers, params={"limite": 6}).json()) == 6
+    assert una[0] == todas[0]
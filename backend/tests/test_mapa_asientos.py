@@ -0,0 +1,41 @@
+"""Mapa de asientos con ?since=: solo los cambios, o el mapa completo si el historial no alcanza"""
+import inventario_asientos
+from aprovisionamiento_asientos import CONFIGURACION_CABINA
+
+
+def _reservar(cliente, headers, instancia, asiento):
+    return cliente.post("/reservas/", headers=headers, json={"detalles": [{
+        "instancia_vuelo_id": instancia.id,
+        "clase": "ECONOMICA",
+        "pasajeros": [{"nombre": "Ana", "apellido": "Pérez", "asiento_numero": asiento}]
+    }]})
+
+
+def test_delta_desde_version_y_mapa_completo_si_no_alcanza(cliente, headers, crear_instancia, monkeypatch):
+    monkeypatch.setattr(inventario_asientos, "HISTORIAL_CAMBIOS_POR_INSTANCIA", 2)
+    instancia = crear_instancia()
+    url = f"/vuelos/asientos/{instancia.vuelo_id}/{instancia.fecha.isoformat()}"
+
+    inicial = cliente.get(url).json()
+    assert inicial["delta"] is False
+    versiones = [inicial["version"]]
+    for asiento in ("8A", "8B", "8C"):
+        assert _reservar(cliente, headers, instancia, asiento).status_code == 201
+        versiones.append(cliente.get(url).json()["version"])
+    assert versiones == sorted(set(versiones))
+
+    delta = cliente.get(url, params={"since": versiones[1]}).json()
+    assert delta["delta"] is True
+    assert delta["version"] == versiones[-1]
+    assert [(a["numero_asiento"], a["disponible"]) for a in delta["asientos"]] == [("8B", False), ("8C", False)]
+
+    al_dia = cliente.get(url, params={"since": versiones[-1]}).json()
+    assert al_dia["delta"] is True
+    assert al_dia["asientos"] == []
+
+    # El historial solo guarda los dos últimos cambios: desde la versión inicial va el mapa completo
+    completo = cliente.get(url, params={"since": versiones[0]}).json()
+    assert completo["delta"] is False
+    assert len(completo["asientos"]) == sum(CONFIGURACION_CABINA.values())
+    ocupados = {a["numero_asiento"] for a in completo["asientos"] if not a["disponible"]}
+    assert ocupados == {"8A", "8B", "8C"}
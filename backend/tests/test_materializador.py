@@ -0,0 +1,23 @@
+"""Las instancias materializadas toman su capacidad de la cabina del vuelo"""
+from datetime import date, timedelta
+
+from models import InstanciaVuelo
+from aprovisionamiento_asientos import CONFIGURACION_CABINA
+from materializador import materializar_instancias
+
+
+def test_instancias_nuevas_con_la_capacidad_de_la_cabina(db, crear_instancia):
+    instancia = crear_instancia(fecha=date.today() + timedelta(days=20))
+
+    materializar_instancias(db, horizonte_dias=3)
+
+    nuevas = db.query(InstanciaVuelo).filter(
+        InstanciaVuelo.vuelo_id == instancia.vuelo_id,
+        InstanciaVuelo.fecha < date.today() + timedelta(days=3)
+    ).all()
+    assert len(nuevas) == 3
+    for nueva in nuevas:
+        assert nueva.estado == "PROGRAMADO"
+        assert (nueva.asientos_disponibles_primera, nueva.asientos_disponibles_ejecutiva,
+                nueva.asientos_disponibles_economica) == (
+            CONFIGURACION_CABINA["PRIMERA"], CONFIGURACION_CABINA["EJECUTIVA"], CONFIGURACION_CABINA["ECONOMICA"])
@@ -0,0 +1,31 @@
+"""La reserva cobra la misma tarifa que muestra la búsqueda"""
+from datetime import date, timedelta
+
+from models import Tarifa
+
+
+def test_reserva_cobra_tarifa_vigente_mas_baja(cliente, db, headers, crear_instancia):
+    instancia = crear_instancia(precio=100)
+    hoy = date.today()
+    db.add_all([
+        # Vencida antes del vuelo: no se cobra aunque sea más reciente y más barata
+        Tarifa(vuelo_id=instancia.vuelo_id, clase="ECONOMICA", precio=40,
+               fecha_inicio=hoy - timedelta(days=1), fecha_fin=hoy + timedelta(days=1)),
+        # Vigente, más reciente pero más cara
+        Tarifa(vuelo_id=instancia.vuelo_id, clase="ECONOMICA", precio=180, fecha_inicio=hoy),
+        # Vigente y la más baja
+        Tarifa(vuelo_id=instancia.vuelo_id, clase="ECONOMICA", precio=90,
+               fecha_inicio=hoy - timedelta(days=60), fecha_fin=instancia.fecha),
+    ])
+    db.commit()
+
+    respuesta = cliente.post("/reservas/", headers=headers, json={"detalles": [{
+        "instancia_vuelo_id": instancia.id,
+        "clase": "ECONOMICA",
+        "pasajeros": [{"nombre": "Ana", "apellido": "Pérez"}, {"nombre": "Luis", "apellido": "Pérez"}]
+    }]})
+
+    assert respuesta.status_code == 201
+    reserva = respuesta.json()
+    assert [float(d["precio"]) for d in reserva["detalles"]] == [90.0, 90.0]
+    assert float(reserva["total"]) == 180.0
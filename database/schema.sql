@@ -119,6 +119,7 @@ CREATE TABLE IF NOT EXISTS vuelos (
     hora_llegada TIME NOT NULL,
     duracion_minutos INTEGER NOT NULL,
     dias_operacion VARCHAR(7) DEFAULT '1111111', -- LMMJVSD (1=opera, 0=no opera)
+    mascara_dias INTEGER NOT NULL DEFAULT 127, -- Bit 0 = lunes ... bit 6 = domingo
     activo BOOLEAN DEFAULT TRUE,
     FOREIGN KEY (aerolinea_id) REFERENCES aerolineas(id),
     FOREIGN KEY (ciudad_origen_id) REFERENCES ciudades(id),
@@ -136,6 +137,21 @@ COMMENT ON TABLE vuelos IS 'Definición de vuelos (plantilla de ruta)';
 COMMENT ON COLUMN vuelos.dias_operacion IS 'Días de la semana que opera: LMMJVSD (1=sí, 0=no)';
 COMMENT ON COLUMN vuelos.duracion_minutos IS 'Duración estimada del vuelo en minutos';
 
+-- Migración: máscara de bits de días de operación (bases de datos existentes)
+ALTER TABLE vuelos ADD COLUMN IF NOT EXISTS mascara_dias INTEGER NOT NULL DEFAULT 127;
+
+UPDATE vuelos SET mascara_dias =
+      (CASE WHEN SUBSTRING(dias_operacion FROM 1 FOR 1) = '1' THEN 1 ELSE 0 END)
+    + (CASE WHEN SUBSTRING(dias_operacion FROM 2 FOR 1) = '1' THEN 2 ELSE 0 END)
+    + (CASE WHEN SUBSTRING(dias_operacion FROM 3 FOR 1) = '1' THEN 4 ELSE 0 END)
+    + (CASE WHEN SUBSTRING(dias_operacion FROM 4 FOR 1) = '1' THEN 8 ELSE 0 END)
+    + (CASE WHEN SUBSTRING(dias_operacion FROM 5 FOR 1) = '1' THEN 16 ELSE 0 END)
+    + (CASE WHEN SUBSTRING(dias_operacion FROM 6 FOR 1) = '1' THEN 32 ELSE 0 END)
+    + (CASE WHEN SUBSTRING(dias_operacion FROM 7 FOR 1) = '1' THEN 64 ELSE 0 END)
+WHERE dias_operacion IS NOT NULL;
+
+COMMENT ON COLUMN vuelos.mascara_dias IS 'Días de operación como máscara de bits (bit 0 = lunes); se mantiene desde dias_operacion';
+
 -- ============================================================================
 -- TABLA: TARIFAS
 -- Precios por clase de servicio para cada vuelo
@@ -213,6 +229,21 @@ CREATE INDEX IF NOT EXISTS idx_asientos_clase ON asientos(clase);
 COMMENT ON TABLE asientos IS 'Configuración de asientos por vuelo';
 COMMENT ON COLUMN asientos.numero_asiento IS 'Identificador del asiento (ej: 12A, 5B)';
 
+-- ============================================================================
+-- TABLA: INVENTARIO_ASIENTOS
+-- Ocupación de asientos por instancia de vuelo (mapa de bits)
+-- ============================================================================
+CREATE TABLE IF NOT EXISTS inventario_asientos (
+    instancia_vuelo_id INTEGER PRIMARY KEY,
+    ocupados BYTEA NOT NULL, -- Bit i = i-ésimo asiento del vuelo ordenado por id
+    total_asientos INTEGER NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0,
+    FOREIGN KEY (instancia_vuelo_id) REFERENCES instancias_vuelo(id) ON DELETE CASCADE
+);
+
+COMMENT ON TABLE inventario_asientos IS 'Ocupación de asientos por instancia de vuelo';
+COMMENT ON COLUMN inventario_asientos.version IS 'Aumenta con cada ocupación o liberación (control de concurrencia optimista)';
+
 -- ============================================================================
 -- TABLA: RESERVAS
 -- Reservas de vuelos realizadas por usuarios
@@ -232,6 +263,8 @@ CREATE INDEX IF NOT EXISTS idx_reservas_codigo ON reservas(codigo_reserva);
 CREATE INDEX IF NOT EXISTS idx_reservas_usuario ON reservas(usuario_id);
 CREATE INDEX IF NOT EXISTS idx_reservas_estado ON reservas(estado);
 CREATE INDEX IF NOT EXISTS idx_reservas_fecha ON reservas(fecha_reserva);
+CREATE INDEX IF NOT EXISTS idx_reservas_estado_fecha ON reservas(estado, fecha_reserva); -- Expiración de reservas pendientes
+CREATE INDEX IF NOT EXISTS idx_reservas_usuario_fecha ON reservas(usuario_id, fecha_reserva DESC, id DESC); -- Mis reservas (paginado por cursor)
 
 COMMENT ON TABLE reservas IS 'Reservas de vuelos realizadas por usuarios';
 COMMENT ON COLUMN reservas.codigo_reserva IS 'Código único de reserva (ej: ABC123XYZ)';
@@ -363,6 +396,56 @@ COMMENT ON TABLE notificaciones IS 'Notificaciones del sistema para usuarios';
 COMMENT ON COLUMN notificaciones.tipo IS 'Tipo de notificación: CAMBIO_VUELO (cambios en vuelos reservados), RECORDATORIO (recordatorios de check-in/vuelo), OFERTA (promociones), CONFIRMACION (confirmaciones de reserva/pago), ALERTA (alertas importantes)';
 COMMENT ON COLUMN notificaciones.metadata IS 'Datos adicionales en formato JSON (ej: {"vuelo_id": 123, "reserva_codigo": "ABC123"})';
 
+-- ============================================================================
+-- TABLA: CLAVES_IDEMPOTENCIA
+-- Respuestas guardadas de POST /reservas/ y /pagos/procesar por Idempotency-Key
+-- ============================================================================
+CREATE TABLE IF NOT EXISTS claves_idempotencia (
+    id SERIAL PRIMARY KEY,
+    usuario_id INTEGER NOT NULL,
+    ruta VARCHAR(100) NOT NULL,
+    clave VARCHAR(255) NOT NULL,
+    huella VARCHAR(64) NOT NULL, -- SHA-256 del cuerpo de la solicitud
+    codigo_estado INTEGER,
+    respuesta JSONB,
+    fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    expira_en TIMESTAMP NOT NULL,
+    FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE,
+    CONSTRAINT uq_claves_idempotencia UNIQUE (usuario_id, ruta, clave)
+);
+
+CREATE INDEX IF NOT EXISTS idx_claves_idempotencia_expira ON claves_idempotencia(expira_en);
+
+COMMENT ON TABLE claves_idempotencia IS 'Respuestas de operaciones con Idempotency-Key para repetirlas sin volver a ejecutarlas';
+COMMENT ON COLUMN claves_idempotencia.huella IS 'Hash del cuerpo: la misma clave con otro cuerpo se rechaza';
+
+-- ============================================================================
+-- TABLA: LISTA_ESPERA
+-- Grupos esperando asientos de una clase en una instancia agotada
+-- ============================================================================
+CREATE TABLE IF NOT EXISTS lista_espera (
+    id SERIAL PRIMARY KEY,
+    usuario_id INTEGER NOT NULL,
+    instancia_vuelo_id INTEGER NOT NULL,
+    clase VARCHAR(20) NOT NULL CHECK (clase IN ('ECONOMICA', 'EJECUTIVA', 'PRIMERA')),
+    cantidad INTEGER NOT NULL CHECK (cantidad > 0),
+    pasajeros JSONB NOT NULL,
+    prioridad INTEGER NOT NULL DEFAULT 0,
+    estado VARCHAR(20) NOT NULL DEFAULT 'ESPERANDO' CHECK (estado IN ('ESPERANDO', 'PROMOVIDA', 'CANCELADA')),
+    reserva_id INTEGER,
+    fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    fecha_promocion TIMESTAMP,
+    FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE,
+    FOREIGN KEY (instancia_vuelo_id) REFERENCES instancias_vuelo(id),
+    FOREIGN KEY (reserva_id) REFERENCES reservas(id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_lista_espera_usuario ON lista_espera(usuario_id);
+CREATE INDEX IF NOT EXISTS idx_lista_espera_turno ON lista_espera(instancia_vuelo_id, clase, estado, prioridad DESC, id);
+
+COMMENT ON TABLE lista_espera IS 'Lista de espera FIFO por instancia y clase; al liberarse asientos se promueve a reserva PENDIENTE';
+COMMENT ON COLUMN lista_espera.prioridad IS 'Mayor primero; a igual prioridad, orden de llegada';
+
 -- ============================================================================
 -- FUNCIÓN: Generar código de reserva único
 -- ============================================================================
@@ -410,46 +493,41 @@ END;
 $$ LANGUAGE plpgsql;
 
 -- ============================================================================
--- FUNCIÓN: Actualizar disponibilidad de asientos
+-- DISPONIBILIDAD DE ASIENTOS
+-- Los contadores asientos_disponibles_* de instancias_vuelo los actualiza solo
+-- la aplicación con un UPDATE condicional (x = x - n WHERE x >= n RETURNING x),
+-- en la misma transacción que la reserva. El trigger que los descontaba por
+-- cada detalle los contaba dos veces; se elimina en bases ya creadas.
+-- ============================================================================
+DROP TRIGGER IF EXISTS trg_actualizar_disponibilidad ON detalles_reserva;
+DROP FUNCTION IF EXISTS actualizar_disponibilidad_asientos();
+
+-- ============================================================================
+-- FUNCIÓN: Mantener mascara_dias sincronizada con dias_operacion
 -- ============================================================================
-CREATE OR REPLACE FUNCTION actualizar_disponibilidad_asientos()
+CREATE OR REPLACE FUNCTION sincronizar_mascara_dias()
 RETURNS TRIGGER AS $$
+DECLARE
+    dia INTEGER;
 BEGIN
-    IF TG_OP = 'INSERT' THEN
-        -- Reducir asientos disponibles al crear reserva
-        UPDATE instancias_vuelo
-        SET 
-            asientos_disponibles_economica = CASE 
-                WHEN NEW.clase = 'ECONOMICA' THEN asientos_disponibles_economica - 1 
-                ELSE asientos_disponibles_economica 
-            END,
-            asientos_disponibles_ejecutiva = CASE 
-                WHEN NEW.clase = 'EJECUTIVA' THEN asientos_disponibles_ejecutiva - 1 
-                ELSE asientos_disponibles_ejecutiva 
-            END,
-            asientos_disponibles_primera = CASE 
-                WHEN NEW.clase = 'PRIMERA_CLASE' THEN asientos_disponibles_primera - 1 
-                ELSE asientos_disponibles_primera 
-            END
-        WHERE id = NEW.instancia_vuelo_id;
-        
-        -- Marcar asiento como no disponible si fue asignado
-        IF NEW.asiento_id IS NOT NULL THEN
-            UPDATE asientos SET disponible = FALSE WHERE id = NEW.asiento_id;
+    NEW.mascara_dias := 0;
+    FOR dia IN 1..7 LOOP
+        IF SUBSTRING(COALESCE(NEW.dias_operacion, '1111111') FROM dia FOR 1) = '1' THEN
+            NEW.mascara_dias := NEW.mascara_dias | (1 << (dia - 1));
         END IF;
-    END IF;
-    
+    END LOOP;
     RETURN NEW;
 END;
 $$ LANGUAGE plpgsql;
 
 -- ============================================================================
--- TRIGGER: Actualizar disponibilidad al crear detalle de reserva
+-- TRIGGER: Calcular mascara_dias al insertar o cambiar dias_operacion
 -- ============================================================================
-CREATE TRIGGER trg_actualizar_disponibilidad
-    AFTER INSERT ON detalles_reserva
+DROP TRIGGER IF EXISTS trg_sincronizar_mascara_dias ON vuelos;
+CREATE TRIGGER trg_sincronizar_mascara_dias
+    BEFORE INSERT OR UPDATE OF dias_operacion ON vuelos
     FOR EACH ROW
-    EXECUTE FUNCTION actualizar_disponibilidad_asientos();
+    EXECUTE FUNCTION sincronizar_mascara_dias();
 
 -- ============================================================================
 -- VISTAS ÚTILES
@@ -537,14 +615,17 @@ LEFT JOIN asientos ast ON dr.asiento_id = ast.id;
 -- 12. pagos - Transacciones de pago
 -- 13. check_ins - Check-ins realizados (24-3h antes)
 -- 14. notificaciones - Sistema de notificaciones
+-- 15. inventario_asientos - Ocupación de asientos por instancia
+-- 16. claves_idempotencia - Respuestas guardadas por Idempotency-Key
+-- 17. lista_espera - Grupos esperando asientos de una instancia agotada
 --
 -- FUNCIONES:
 -- - generar_codigo_reserva() - Genera códigos únicos de reserva
 -- - generar_codigo_billete() - Genera códigos únicos de billete
--- - actualizar_disponibilidad_asientos() - Gestiona disponibilidad automática
+-- - sincronizar_mascara_dias() - Calcula la máscara de días de operación
 --
 -- TRIGGERS:
--- - trg_actualizar_disponibilidad - Actualiza asientos al reservar
+-- - trg_sincronizar_mascara_dias - Mantiene vuelos.mascara_dias
 --
 -- VISTAS:
 -- - vista_vuelos_disponibles - Vuelos con información completa
@@ -555,7 +636,7 @@ LEFT JOIN asientos ast ON dr.asiento_id = ast.id;
 DO $$
 BEGIN
     RAISE NOTICE '✅ Schema completo creado exitosamente';
-    RAISE NOTICE '📊 14 tablas principales';
+    RAISE NOTICE '📊 17 tablas principales';
     RAISE NOTICE '🔧 3 funciones auxiliares';
     RAISE NOTICE '⚡ 1 trigger automático';
     RAISE NOTICE '👁️  2 vistas de consulta';
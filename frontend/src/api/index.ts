@@ -76,7 +76,8 @@ export const vuelosAPI = {
 export const reservasAPI = {
   crear: (data: ReservaCreate) => api.post<Reserva>('/reservas/', data),
   
-  listar: () => api.get<Reserva[]>('/reservas/'),
+  listar: (params?: { limite?: number; cursor?: string; estado?: string }) =>
+    api.get<Reserva[]>('/reservas/', { params }),
   
   obtener: (codigoReserva: string) => api.get<Reserva>(`/reservas/${codigoReserva}`),
   
@@ -84,6 +85,11 @@ export const reservasAPI = {
   
   hacerCheckIn: (codigoBillete: string) => 
     api.post(`/reservas/check-in/${codigoBillete}`),
+  
+  hacerCheckInReserva: (codigoReserva: string, instanciaVueloId?: number) =>
+    api.post(`/reservas/${codigoReserva}/check-in`, null, {
+      params: instanciaVueloId ? { instancia_vuelo_id: instanciaVueloId } : {},
+    }),
 };
 
 // Pagos y Billetes
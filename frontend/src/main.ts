@@ -1085,16 +1085,6 @@ class AppState {
                       <option value="">Todas las aerolíneas</option>
                     </select>
                   </div>
-
-                  <div class="form-group">
-                    <label>Escalas</label>
-                    <select name="escalas">
-                      <option value="all">Cualquier número de escalas</option>
-                      <option value="direct">Solo vuelos directos</option>
-                      <option value="1">Máximo 1 escala</option>
-                      <option value="2">Máximo 2 escalas</option>
-                    </select>
-                  </div>
                 </div>
 
                 <div class="form-row">
@@ -2198,7 +2188,6 @@ class AppState {
         const searchType = (document.querySelector('input[name="search_type"]:checked') as HTMLInputElement)?.value || 'tarifas';
         const horarioSalida = formData.get('horario_salida') as string;
         const precioMaximoStr = formData.get('precio_max') as string;
-        const escalas = formData.get('escalas') as string;
         
         const busquedaParams: any = {
           origen,
@@ -2220,12 +2209,6 @@ class AppState {
           }
         }
 
-        // Filtro de escalas (solo directos está implementado en backend)
-        if (escalas === 'direct') {
-          busquedaParams.solo_directos = true;
-        } else {
-          busquedaParams.solo_directos = false;
-        }
         
         // Usar el endpoint correcto según el tipo de búsqueda
         const response = searchType === 'horarios' 
@@ -2521,9 +2504,6 @@ class AppState {
           }
         }
         
-        const escalas = formData?.get('escalas') as string;
-        busquedaRegreso.solo_directos = escalas === 'direct';
-        
         try {
           const searchType = (document.querySelector('input[name="search_type"]:checked') as HTMLInputElement)?.value || 'tarifas';
           const response = searchType === 'horarios' 
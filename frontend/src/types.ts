@@ -48,7 +48,6 @@ export interface BusquedaVuelos {
   fecha: string;
   clase?: string;
   aerolinea_codigo?: string;
-  solo_directos?: boolean;
   horario_salida?: string;
   precio_maximo?: number;
 }